@@ -0,0 +1,363 @@
+"""Компьютерный противник: перебор с альфа-бета отсечением.
+
+Поиск работает по движку ``engine`` и ничего не знает о Tk. Для игры в окне
+используется ``BackgroundSearch``: поиск идет в отдельном потоке, а окно
+забирает результат через ``poll``.
+"""
+
+import queue
+import threading
+import time
+
+from tablebase import WIN, LOSS
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+WIN_SCORE = 100000  # Оценка выигрыша (уменьшается с глубиной)
+INFINITY = 10 ** 9
+MAX_PLY = 128
+QUIESCENCE_DEPTH = 4  # Сколько взятий подряд досчитывается после основной глубины
+TIME_CHECK_INTERVAL = 1024  # Как часто (в узлах) проверяется время
+
+
+class SearchTimeout(Exception):
+    """Время на ход истекло"""
+
+
+def material_evaluation(position, player):
+    """Оценка по материалу: камни на поле и еще не поставленные камни"""
+    stones = [position.stones_count[p] + 2 * position.remaining_pairs[p] for p in (0, 1)]
+    if position.stones_to_place == 1:
+        # Первый камень пары уже на поле, а пара еще не списана
+        stones[position.current_player] -= 1
+    return 100 * (stones[player] - stones[1 - player])
+
+
+def mobility_evaluation(position, player):
+    """Материал плюс подвижность обоих игроков на этапе перемещения"""
+    score = material_evaluation(position, player)
+    if position.stage == 2:
+        side = position.current_player
+        mobility = len(position.legal_moves())
+        position.current_player = 1 - side
+        other_mobility = len(position.legal_moves())
+        position.current_player = side
+        if side != player:
+            mobility, other_mobility = other_mobility, mobility
+        score += 3 * (mobility - other_mobility)
+        # Игрок с тремя камнями в шаге от поражения
+        last_stones = position.geometry.min_stones + 1
+        if position.stones_count[1 - player] == last_stones:
+            score += 50
+        if position.stones_count[player] == last_stones:
+            score -= 50
+    return score
+
+
+class SearchResult:
+    """Итог поиска: лучший ход и статистика для настройки лимита времени"""
+
+    def __init__(self, move, score, depth, nodes, elapsed, tt_hit_rate=0.0):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.tt_hit_rate = tt_hit_rate
+
+    @property
+    def nodes_per_second(self):
+        return int(self.nodes / self.elapsed) if self.elapsed > 0 else 0
+
+    def __repr__(self):
+        return (f"SearchResult(move={self.move}, score={self.score}, depth={self.depth}, "
+                f"nodes={self.nodes}, nps={self.nodes_per_second}, tt_hit_rate={self.tt_hit_rate:.2f})")
+
+
+class Searcher:
+    """Итеративное углубление с альфа-бета отсечением и лимитом времени.
+
+    Порядок ходов: ход из таблицы транспозиций, взятия, ходы-убийцы текущего
+    уровня, затем по таблице истории. Функция оценки ``evaluate(position, player)``
+    возвращает оценку с точки зрения игрока ``player``. Таблица транспозиций
+    сохраняется между вызовами ``search``; повторение позиции считается ничьей.
+    Одновременно на одном ``Searcher`` идет только один поиск: следующий ждет,
+    пока прежний вернется (таблицы и счетчики у них общие).
+    Позиции из эндшпильной базы ``tablebase`` не перебираются, а берутся из нее;
+    первые ходы расстановки берутся из дебютной книги ``book``.
+    """
+
+    def __init__(self, evaluate=mobility_evaluation, max_depth=64, tt=None, tablebase=None,
+                 book=None):
+        self.evaluate = evaluate
+        self.max_depth = max_depth
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.tablebase = tablebase
+        self.book = book
+        self.lock = threading.Lock()  # Занят, пока идет поиск
+        self.stop_event = threading.Event()  # Флаг остановки текущего поиска
+        self.nodes = 0
+        self.deadline = None
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [{}, {}]
+
+    def stop(self):
+        """Прерывает текущий поиск (можно вызывать из другого потока)"""
+        self.stop_event.set()
+
+    def search(self, position, time_limit=1.0, max_depth=None, stop_event=None):
+        """Ищет лучший ход для текущего игрока позиции.
+
+        Позиция изменяется во время поиска и восстанавливается по его окончании.
+        Глубина 1 досчитывается всегда, даже если время уже вышло. stop_event -
+        флаг остановки только этого поиска (threading.Event).
+        """
+        with self.lock:
+            self.stop_event = stop_event if stop_event is not None else threading.Event()
+            return self._search(position, time_limit, max_depth)
+
+    def _search(self, position, time_limit, max_depth):
+        max_depth = max_depth or self.max_depth
+        start = time.perf_counter()
+        self.deadline = start + time_limit if time_limit else None
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [{}, {}]
+        self.tt.hits = self.tt.misses = 0
+        history_length = len(position.history)
+
+        moves = position.legal_moves()
+        if not moves:
+            return SearchResult(None, -WIN_SCORE, 0, 0, 0.0)
+        if self.book is not None:
+            found = self.book.lookup(position)
+            if found is not None:
+                return SearchResult(found[0], found[1], 0, 0, time.perf_counter() - start)
+        if self.tablebase is not None:
+            found = self.tablebase.best_move(position)
+            if found is not None:
+                move, result, plies = found
+                return SearchResult(move, _tablebase_score(result, plies, 0), 0, 0,
+                                    time.perf_counter() - start)
+        best = SearchResult(moves[0], 0, 0, 0, 0.0)
+
+        for depth in range(1, max_depth + 1):
+            try:
+                score, move = self._root(position, moves, depth)
+            except SearchTimeout:
+                while len(position.history) > history_length:
+                    position.unmake_move()
+                break
+            best = SearchResult(move, score, depth, self.nodes, time.perf_counter() - start)
+            # Лучший ход предыдущей итерации смотрим первым
+            moves.remove(move)
+            moves.insert(0, move)
+            if abs(score) >= WIN_SCORE - MAX_PLY:
+                break
+        best.nodes = self.nodes
+        best.elapsed = time.perf_counter() - start
+        best.tt_hit_rate = self.tt.hit_rate
+        return best
+
+    def _root(self, position, moves, depth):
+        side = position.current_player
+        alpha, beta = -INFINITY, INFINITY
+        best_move = moves[0]
+        for move in moves:
+            position.make_move(move)
+            if position.current_player == side:
+                score = self._alpha_beta(position, depth - 1, alpha, beta, 1, depth > 1)
+            else:
+                score = -self._alpha_beta(position, depth - 1, -beta, -alpha, 1, depth > 1)
+            position.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return alpha, best_move
+
+    def _check_time(self, can_stop):
+        if not can_stop:
+            return
+        if self.stop_event.is_set() or (self.deadline is not None and time.perf_counter() >= self.deadline):
+            raise SearchTimeout()
+
+    def _terminal_score(self, position, ply):
+        winner = position.winner
+        if winner is None:
+            return None
+        return WIN_SCORE - ply if winner == position.current_player else -(WIN_SCORE - ply)
+
+    def _order(self, position, moves, ply, tt_move=None):
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        history = self.history[position.current_player]
+
+        def key(move):
+            if move == tt_move:
+                return -4 * INFINITY
+            if position.capture_of(move) >= 0:
+                return -3 * INFINITY
+            if move == killers[0]:
+                return -2 * INFINITY
+            if move == killers[1]:
+                return -INFINITY
+            return -history.get(move, 0)
+
+        moves.sort(key=key)
+        return moves
+
+    def _alpha_beta(self, position, depth, alpha, beta, ply, can_stop):
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0:
+            self._check_time(can_stop)
+
+        terminal = self._terminal_score(position, ply)
+        if terminal is not None:
+            return terminal
+        if position.stage == 2 and position.repetition_count() > 1:
+            return 0
+        if self.tablebase is not None and self.tablebase.covers(position):
+            result, plies = self.tablebase.probe(position)
+            return _tablebase_score(result, plies, ply)
+        if depth <= 0:
+            return self._quiescence(position, alpha, beta, ply, QUIESCENCE_DEPTH, can_stop)
+
+        key = position.hash
+        entry = self.tt.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                score = _score_from_tt(entry[2], ply)
+                flag = entry[3]
+                if flag == EXACT:
+                    return score
+                if flag == LOWER and score >= beta:
+                    return score
+                if flag == UPPER and score <= alpha:
+                    return score
+
+        moves = position.legal_moves()
+        if not moves:
+            # Некуда ходить - поражение
+            return -(WIN_SCORE - ply)
+
+        side = position.current_player
+        alpha_start = alpha
+        best = -INFINITY
+        best_move = moves[0]
+        for move in self._order(position, moves, ply, tt_move):
+            position.make_move(move)
+            if position.current_player == side:
+                score = self._alpha_beta(position, depth - 1, alpha, beta, ply + 1, can_stop)
+            else:
+                score = -self._alpha_beta(position, depth - 1, -beta, -alpha, ply + 1, can_stop)
+            position.unmake_move()
+            if score > best:
+                best = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self._store_cutoff(position, move, depth, ply)
+                break
+
+        if best <= alpha_start:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, _score_to_tt(best, ply), flag, best_move)
+        return best
+
+    def _quiescence(self, position, alpha, beta, ply, depth, can_stop):
+        """Досчет взятий, чтобы не оценивать позицию посреди размена"""
+        side = position.current_player
+        stand_pat = self.evaluate(position, side)
+        if position.stage != 2 or depth <= 0 or stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        for move in position.legal_moves():
+            if position.capture_of(move) < 0:
+                continue
+            self.nodes += 1
+            position.make_move(move)
+            terminal = self._terminal_score(position, ply + 1)
+            if terminal is not None:
+                score = -terminal
+            else:
+                score = -self._quiescence(position, -beta, -alpha, ply + 1, depth - 1, can_stop)
+            position.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _store_cutoff(self, position, move, depth, ply):
+        if position.capture_of(move) >= 0:
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        history = self.history[position.current_player]
+        history[move] = history.get(move, 0) + depth * depth
+
+
+def _tablebase_score(result, plies, ply):
+    """Оценка по результату эндшпильной базы: выигрыш тем выше, чем он ближе"""
+    if result == WIN:
+        return WIN_SCORE - ply - plies
+    if result == LOSS:
+        return -(WIN_SCORE - ply - plies)
+    return 0
+
+
+def _score_to_tt(score, ply):
+    """Оценки выигрыша храним относительно текущего узла, а не корня"""
+    if score >= WIN_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -(WIN_SCORE - MAX_PLY):
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score >= WIN_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -(WIN_SCORE - MAX_PLY):
+        return score + ply
+    return score
+
+
+class BackgroundSearch:
+    """Поиск хода в отдельном потоке, чтобы окно продолжало перерисовываться.
+
+    Если передан ``searcher``, его таблица транспозиций используется между ходами.
+    Отмена останавливает только этот поиск: у каждого свой флаг остановки, а
+    новый поиск на том же ``searcher`` начнется, когда отмененный вернется.
+    """
+
+    def __init__(self, position, time_limit=1.0, evaluate=mobility_evaluation, searcher=None):
+        self.searcher = searcher if searcher is not None else Searcher(evaluate)
+        self.results = queue.Queue()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run,
+                                       args=(position.copy(with_history=True), time_limit),
+                                       daemon=True)
+        self.thread.start()
+
+    def _run(self, position, time_limit):
+        self.results.put(self.searcher.search(position, time_limit, stop_event=self.stop_event))
+
+    def poll(self):
+        """Результат поиска или None, если поиск еще идет"""
+        try:
+            return self.results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def cancel(self):
+        self.stop_event.set()
@@ -0,0 +1,68 @@
+"""Покадровые анимации на холсте без блокировки цикла событий.
+
+Анимация - генератор: каждый шаг рисует кадр (обычно через ``itemconfig`` и
+``coords`` одного и того же элемента холста) и возвращает задержку до
+следующего кадра в миллисекундах. Кадры планируются через ``after``, поэтому
+между ними окно обрабатывает клики и перерисовку.
+"""
+
+from profiling import timed
+
+
+class Animation:
+    """Одна запущенная анимация; ее можно отменить в любой момент"""
+
+    def __init__(self, widget, frames, on_finish=None):
+        self.widget = widget
+        self.frames = frames
+        self.on_finish = on_finish
+        self.after_id = None
+        self.finished = False
+
+    @timed("animation_frame")
+    def _step(self):
+        self.after_id = None
+        try:
+            delay = next(self.frames)
+        except StopIteration:
+            self._complete()
+            return
+        self.after_id = self.widget.after(delay, self._step)
+
+    def _complete(self):
+        self.finished = True
+        if self.on_finish is not None:
+            self.on_finish()
+
+    def cancel(self):
+        """Останавливает анимацию; on_finish не вызывается"""
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+        self.frames.close()  # Выполняет finally в генераторе кадров
+        self.finished = True
+
+
+class Animator:
+    """Планировщик анимаций одного виджета"""
+
+    def __init__(self, widget):
+        self.widget = widget
+        self.running = []
+
+    def play(self, frames, on_finish=None):
+        """Запускает анимацию; первый кадр рисуется сразу"""
+        self.running = [animation for animation in self.running if not animation.finished]
+        animation = Animation(self.widget, frames, on_finish)
+        self.running.append(animation)
+        animation._step()
+        return animation
+
+    def cancel_all(self):
+        for animation in self.running:
+            animation.cancel()
+        self.running = []
+
+    @property
+    def busy(self):
+        return any(not animation.finished for animation in self.running)
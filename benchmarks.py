@@ -0,0 +1,582 @@
+"""Набор замеров производительности Болотуду.
+
+Замеры: проверка линий и допустимости расстановки, генерация ходов и
+случайные партии, стоимость хода на больших полях, время кадра ``draw_board``, блокировка окна анимацией
+``remove_stone``, задержка входа и регистрации в копии ``bolotudu.db`` и
+время холодного запуска до первого окна и до первого вывода ``cli.py``.
+
+Замеры с окном требуют дисплея: используется ``DISPLAY``, а если его нет -
+виртуальный дисплей ``Xvfb``, если он установлен; иначе эти замеры
+пропускаются. Результаты пишутся в JSON, команда ``compare`` сравнивает их с
+сохраненной базой и завершается с кодом 1 при ухудшении, а также если метрика
+пропала или скорость получилась нулевой (замер ничего не измерил).
+
+Примеры:
+    python benchmarks.py run --output baseline.json
+    python benchmarks.py run --output new.json --baseline baseline.json
+    python benchmarks.py compare baseline.json new.json --threshold 0.1
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from engine import Position, GRID_WIDTH, NUM_CELLS, STANDARD, find_line, get_geometry, makes_line, move_to
+from storage import DATABASE_FILE, Database
+
+REPEAT = 5  # Сколько раз повторяется каждый замер (берется медиана)
+THRESHOLD = 0.10  # Ухудшение больше этой доли считается регрессией
+MAX_PLIES = 400  # Длина случайной партии, после которой она обрывается
+XVFB_DISPLAY = ":99"
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+CLI_SCRIPT = os.path.join(REPO_DIR, "cli.py")
+
+
+class Skip(Exception):
+    """Замер невозможен в этом окружении"""
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def throughput(function, count, repeat=REPEAT):
+    """Медиана числа операций в секунду; function выполняет count операций"""
+    rates = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        rates.append(count / (time.perf_counter() - start))
+    return statistics.median(rates)
+
+
+def rate(value, unit="оп/с"):
+    return {"value": value, "unit": unit, "higher_is_better": True}
+
+
+def latency(values_ms):
+    """Метрики p50 и p99 по списку задержек в миллисекундах"""
+    return ({"value": percentile(values_ms, 50), "unit": "мс", "higher_is_better": False},
+            {"value": percentile(values_ms, 99), "unit": "мс", "higher_is_better": False})
+
+
+def random_game(rng, max_plies=MAX_PLIES, geometry=STANDARD):
+    """Случайная партия до конца; возвращает позицию с историей"""
+    position = Position(geometry)
+    while len(position.history) < max_plies:
+        moves = position.legal_moves()
+        if not moves or position.winner is not None or position.is_draw():
+            break
+        position.make_move(rng.choice(moves))
+    return position
+
+
+def sample_positions(rng, count, geometry=STANDARD):
+    """Позиции из случайных партий на обоих этапах"""
+    positions = []
+    while len(positions) < count:
+        game = random_game(rng, geometry=geometry)
+        while game.history and len(positions) < count:
+            game.unmake_move()
+            if rng.random() < 0.2:
+                positions.append(game.copy())
+    return positions
+
+
+def placement_positions(rng, count, geometry=STANDARD):
+    """Позиции этапа расстановки из случайных партий"""
+    positions = []
+    while len(positions) < count:
+        position = Position(geometry)
+        while position.stage == 1 and position.winner is None and len(positions) < count:
+            positions.append(position.copy())
+            moves = position.legal_moves()
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+    return positions
+
+
+# Правила и генерация ходов
+
+def bench_lines(scale):
+    """Поиск линий и проверка расстановки без линии из трех"""
+    rng = random.Random(1)
+    positions = sample_positions(rng, int(500 * scale))
+    empty_cells = []
+    own_cells = []
+    for position in positions:
+        own = position.bb[position.current_player]
+        for index in range(NUM_CELLS):
+            if position.empty_mask() >> index & 1:
+                empty_cells.append((own, index))
+            elif own >> index & 1:
+                own_cells.append((own, index))
+
+    def run_makes_line():
+        for own, index in empty_cells:
+            makes_line(own, index)
+
+    def run_find_line():
+        for own, index in own_cells:
+            find_line(own, index)
+
+    placing = placement_positions(rng, int(500 * scale))
+
+    def run_legal_placement():
+        for position in placing:
+            for index in range(NUM_CELLS):
+                position.is_legal_placement(index)
+
+    return {
+        "makes_line": rate(throughput(run_makes_line, len(empty_cells))),
+        "find_line": rate(throughput(run_find_line, len(own_cells))),
+        "is_legal_placement": rate(throughput(run_legal_placement, len(placing) * NUM_CELLS)),
+    }
+
+
+def bench_moves(scale):
+    """Генерация ходов, ход с отменой и случайные партии целиком"""
+    rng = random.Random(2)
+    positions = sample_positions(rng, int(2000 * scale))
+    move_lists = [(position, position.legal_moves()) for position in positions]
+    move_count = sum(len(moves) for _, moves in move_lists)
+
+    def run_legal_moves():
+        for position in positions:
+            position.legal_moves()
+
+    def run_make_unmake():
+        for position, moves in move_lists:
+            for move in moves:
+                position.make_move(move)
+                position.unmake_move()
+
+    games = max(1, int(50 * scale))
+    plies = []
+
+    def run_playouts():
+        game_rng = random.Random(3)
+        plies.clear()
+        for _ in range(games):
+            plies.append(len(random_game(game_rng).history))
+
+    playouts = throughput(run_playouts, games)
+    return {
+        "legal_moves": rate(throughput(run_legal_moves, len(positions))),
+        "make_unmake": rate(throughput(run_make_unmake, move_count)),
+        "playouts": rate(playouts, "партий/с"),
+        "playout_plies": rate(playouts * sum(plies) / games, "ходов/с"),
+    }
+
+
+# Варианты поля: (ширина, высота, пары, длина линии)
+BOARD_SIZES = [(5, 6, 6, 3), (20, 20, 40, 3), (40, 40, 100, 5)]
+
+
+def bench_board_size(scale):
+    """Ход с отменой и генерация ходов на полях разного размера.
+
+    Линии считаются по маскам строк и столбцов, поэтому цена хода почти не
+    зависит от размера поля; генерация ходов растет с числом пустых клеток.
+    """
+    metrics = {}
+    for board in BOARD_SIZES:
+        geometry = get_geometry(*board)
+        name = f"{geometry.width}x{geometry.height}"
+        rng = random.Random(5)
+        positions = sample_positions(rng, int(300 * scale), geometry)
+        move_lists = [(position, position.legal_moves()) for position in positions]
+        move_count = sum(len(moves) for _, moves in move_lists)
+
+        def run_make_unmake():
+            for position, moves in move_lists:
+                for move in moves:
+                    position.make_move(move)
+                    position.unmake_move()
+
+        def run_legal_moves():
+            for position in positions:
+                position.legal_moves()
+
+        metrics[f"make_unmake_{name}"] = rate(throughput(run_make_unmake, move_count))
+        metrics[f"legal_moves_{name}"] = rate(throughput(run_legal_moves, len(positions)))
+    return metrics
+
+
+# Окно
+
+@contextmanager
+def virtual_display():
+    """Дисплей для замеров с окном: текущий или виртуальный Xvfb"""
+    if os.name == "nt" or sys.platform == "darwin" or os.environ.get("DISPLAY"):
+        yield
+        return
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        raise Skip("нет дисплея и не установлен Xvfb")
+    process = subprocess.Popen([xvfb, XVFB_DISPLAY, "-screen", "0", "1024x768x24", "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = XVFB_DISPLAY
+    try:
+        time.sleep(0.5)  # Xvfb принимает подключения не сразу
+        if process.poll() is not None:
+            raise Skip("Xvfb не запустился")
+        yield
+    finally:
+        del os.environ["DISPLAY"]
+        process.terminate()
+        process.wait()
+
+
+def make_game_window():
+    """Окно с игровым полем BolotuduGame без входа, базы и главного цикла"""
+    import tkinter as tk
+    import cdd
+
+    class BenchGame(cdd.BolotuduGame):
+        def __init__(self):
+            self.window = tk.Tk()
+            self.window.geometry("800x600")
+            self.profile_overlay = None
+            self.reset_game_state()
+            self.sprites = self.create_sprites()
+            self.setup_game_board()
+            self.window.update()
+
+    return BenchGame()
+
+
+def bench_draw_board(scale):
+    """Время кадра draw_board: полная перерисовка и перерисовка после хода"""
+    with virtual_display():
+        game = make_game_window()
+        try:
+            from cdd import PLAYER_COLORS
+
+            # Изображения камней строятся один раз за запуск - отдельная метрика
+            start = time.perf_counter()
+            for color in PLAYER_COLORS:
+                for highlighted in (False, True):
+                    game.sprites.get(color, highlighted, game.cell_size)
+            sprites_ms = (time.perf_counter() - start) * 1000
+            rng = random.Random(4)
+            positions = sample_positions(rng, int(200 * scale))
+            full = []
+            incremental = []
+            for position in positions:
+                game.position = position
+                start = time.perf_counter()
+                game.renderer.shown = [None] * NUM_CELLS  # Как при первом показе поля
+                game.draw_board()
+                game.window.update_idletasks()
+                full.append((time.perf_counter() - start) * 1000)
+                moves = position.legal_moves()
+                if not moves:
+                    continue
+                position.make_move(rng.choice(moves))
+                start = time.perf_counter()
+                game.draw_board({move_to(position.last_delta().move)})
+                game.window.update_idletasks()
+                incremental.append((time.perf_counter() - start) * 1000)
+            full_p50, full_p99 = latency(full)
+            move_p50, move_p99 = latency(incremental)
+            return {"sprites": {"value": sprites_ms, "unit": "мс", "higher_is_better": False},
+                    "full_p50": full_p50, "full_p99": full_p99,
+                    "after_move_p50": move_p50, "after_move_p99": move_p99}
+        finally:
+            game.window.destroy()
+
+
+def bench_remove_stone(scale):
+    """Сколько окно занято анимацией снятия камня: вызов и каждый кадр"""
+    from cdd import BolotuduGame
+
+    with virtual_display():
+        game = make_game_window()
+        try:
+            frames_ms = []
+
+            def timed_frames(*args):
+                frames = BolotuduGame.removal_frames(game, *args)
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        delay = next(frames)
+                    except StopIteration:
+                        frames_ms.append((time.perf_counter() - start) * 1000)
+                        return
+                    frames_ms.append((time.perf_counter() - start) * 1000)
+                    yield delay
+
+            game.removal_frames = timed_frames
+            calls_ms = []
+            durations_ms = []
+            for number in range(max(1, int(5 * scale))):
+                row, col = divmod(number % NUM_CELLS, GRID_WIDTH)
+                start = time.perf_counter()
+                animation = game.remove_stone(row, col, number % 2)
+                calls_ms.append((time.perf_counter() - start) * 1000)
+                while not animation.finished:
+                    game.window.update()
+                    time.sleep(0.001)
+                durations_ms.append((time.perf_counter() - start) * 1000)
+            call_p50, call_p99 = latency(calls_ms)
+            frame_p50, frame_p99 = latency(frames_ms)
+            return {
+                "call_p50": call_p50,
+                "frame_p50": frame_p50,
+                "frame_p99": frame_p99,
+                # Длительность самой анимации задана задержками кадров, а не скоростью кода
+                "animation_ms": {"value": statistics.median(durations_ms), "unit": "мс",
+                                 "higher_is_better": False, "informational": True},
+            }
+        finally:
+            game.window.destroy()
+
+
+# База данных
+
+def bench_database(scale, database=DATABASE_FILE):
+    """Задержка входа и регистрации на копии базы (исходный файл не меняется)"""
+    count = max(10, int(200 * scale))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        if os.path.exists(database):
+            shutil.copyfile(database, path)
+        db = Database(path)
+        try:
+            register_ms = []
+            for number in range(count):
+                start = time.perf_counter()
+                db.register_user(f"bench_{number}", "password")
+                register_ms.append((time.perf_counter() - start) * 1000)
+            login_ms = []
+            for number in range(count):
+                password = "password" if number % 2 else "wrong"
+                start = time.perf_counter()
+                db.authenticate(f"bench_{number}", password)
+                login_ms.append((time.perf_counter() - start) * 1000)
+        finally:
+            db.close()
+    register_p50, register_p99 = latency(register_ms)
+    login_p50, login_p99 = latency(login_ms)
+    return {"register_p50": register_p50, "register_p99": register_p99,
+            "login_p50": login_p50, "login_p99": login_p99}
+
+
+# Холодный запуск
+
+# Запускается в отдельном процессе: окно входа отрисовывается один раз, без
+# главного цикла (BolotuduGame.run), после чего выводится метка
+FIRST_WINDOW_SCRIPT = """
+import cdd
+game = cdd.BolotuduGame()
+game.window.update()
+print("ready", flush=True)
+game.window.destroy()
+"""
+
+
+def spawn_time(arguments, directory, marker=None):
+    """Время от запуска процесса до его выхода (или до строки marker), мс"""
+    environment = dict(os.environ, PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable] + arguments, cwd=directory, env=environment,
+                               stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True)
+    if marker is not None:
+        for line in process.stdout:
+            if line.strip() == marker:
+                break
+        elapsed = time.perf_counter() - start
+        process.communicate()
+    else:
+        process.communicate()
+        elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"процесс завершился с кодом {process.returncode}")
+    return elapsed * 1000
+
+
+def bench_cold_start(scale, database=DATABASE_FILE):
+    """Запуск интерпретатора, импорт игры, первое окно и команды cli.py без окна"""
+    repeat = max(3, int(REPEAT * scale))
+    with tempfile.TemporaryDirectory() as directory:
+        # Окно открывает базу в текущем каталоге - пусть это будет копия
+        if os.path.exists(database):
+            shutil.copyfile(database, os.path.join(directory, DATABASE_FILE))
+        result = {
+            "python": statistics.median(spawn_time(["-c", "pass"], directory) for _ in range(repeat)),
+            "import_cdd": statistics.median(spawn_time(["-c", "import cdd"], directory)
+                                            for _ in range(repeat)),
+            # Разбор аргументов и справка; партия до первой доски (ввод закрыт - выход)
+            "cli_help": statistics.median(spawn_time([CLI_SCRIPT, "--help"], directory)
+                                          for _ in range(repeat)),
+            "cli_play": statistics.median(spawn_time([CLI_SCRIPT, "play"], directory)
+                                          for _ in range(repeat)),
+        }
+        try:
+            with virtual_display():
+                result["first_window"] = statistics.median(
+                    spawn_time(["-c", FIRST_WINDOW_SCRIPT], directory, "ready") for _ in range(repeat))
+        except Skip as reason:
+            result["first_window"] = reason
+    return {name: value if isinstance(value, Skip) else
+            {"value": value, "unit": "мс", "higher_is_better": False}
+            for name, value in result.items()}
+
+
+CASES = {
+    "lines": bench_lines,
+    "moves": bench_moves,
+    "board_size": bench_board_size,
+    "draw_board": bench_draw_board,
+    "remove_stone": bench_remove_stone,
+    "database": bench_database,
+    "cold_start": bench_cold_start,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(names=None, scale=1.0, log=print):
+    """Выполняет замеры; возвращает словарь для записи в JSON"""
+    results = {}
+    skipped = {}
+    for name in names or CASES:
+        start = time.perf_counter()
+        try:
+            metrics = CASES[name](scale)
+        except Skip as reason:
+            skipped[name] = str(reason)
+            log(f"{name}: пропущен ({reason})")
+            continue
+        for metric, value in metrics.items():
+            key = f"{name}.{metric}"
+            if isinstance(value, Skip):
+                skipped[key] = str(value)
+                log(f"{key}: пропущен ({value})")
+                continue
+            results[key] = value
+            log(f"{key:<32}{value['value']:>14.3f} {value['unit']}")
+        log(f"{name}: {time.perf_counter() - start:.1f} с")
+    return {
+        "meta": {
+            "time": time.time(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "scale": scale,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def measured(metric):
+    """Метрика что-то измерила: нулевая скорость значит пустой замер"""
+    return metric["value"] > 0 or not metric["higher_is_better"]
+
+
+def compare(baseline, current, threshold=THRESHOLD, out=print):
+    """Сравнивает результаты с базой; возвращает список ухудшившихся и неизмеренных метрик"""
+    regressions = []
+    skipped = current.get("skipped", {})
+    for key, old in sorted(baseline["results"].items()):
+        new = current["results"].get(key)
+        if new is None:
+            reason = skipped.get(key, skipped.get(key.partition(".")[0]))
+            if reason is not None:
+                out(f"{key:<32}пропущен ({reason})")
+            else:
+                out(f"{key:<32}нет в новых результатах  ОШИБКА")
+                regressions.append(key)
+            continue
+        if not measured(new) or not measured(old):
+            out(f"{key:<32}{old['value']:>14.3f}{new['value']:>14.3f} {new['unit']:<10}ОШИБКА: нулевая скорость")
+            regressions.append(key)
+            continue
+        if old["value"] <= 0:
+            continue
+        change = (new["value"] - old["value"]) / old["value"]
+        worse = -change if new["higher_is_better"] else change
+        if new.get("informational"):
+            status = ""
+        elif worse > threshold:
+            status = "РЕГРЕССИЯ"
+            regressions.append(key)
+        elif worse < -threshold:
+            status = "лучше"
+        else:
+            status = "ок"
+        out(f"{key:<32}{old['value']:>14.3f}{new['value']:>14.3f} {new['unit']:<10}{change:>+8.1%}  {status}")
+    for key in sorted(set(current["results"]) - set(baseline["results"])):
+        if measured(current["results"][key]):
+            out(f"{key:<32}новая метрика")
+        else:
+            out(f"{key:<32}новая метрика  ОШИБКА: нулевая скорость")
+            regressions.append(key)
+    return regressions
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности Болотуду")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="выполнить замеры")
+    run_parser.add_argument("--cases", nargs="+", choices=list(CASES), help="только эти замеры")
+    run_parser.add_argument("--scale", type=float, default=1.0,
+                            help="множитель объема замеров (меньше - быстрее и менее точно)")
+    run_parser.add_argument("--output", help="файл JSON для результатов")
+    run_parser.add_argument("--baseline", help="сразу сравнить с этим файлом результатов")
+    run_parser.add_argument("--threshold", type=float, default=THRESHOLD)
+
+    compare_parser = commands.add_parser("compare", help="сравнить результаты с базой")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                                help="допустимая доля ухудшения")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        current = run_benchmarks(args.cases, args.scale)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as file:
+                json.dump(current, file, ensure_ascii=False, indent=2)
+        baseline = load_results(args.baseline) if args.baseline else None
+    else:
+        baseline = load_results(args.baseline)
+        current = load_results(args.current)
+    if baseline is not None:
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"Ухудшились или не измерены: {', '.join(regressions)}")
+            sys.exit(1)
+        print("Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
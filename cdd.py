@@ -1,18 +1,39 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
-import json
 import os
-import random
 import math
+import time
+
+from engine import (GRID_WIDTH, GRID_HEIGHT, NUM_STONES, LINE_LENGTH, STANDARD, Position,
+                    get_geometry, cell_index, cell_coords, encode_move, move_from, move_to,
+                    parse_move)
+from ai import BackgroundSearch, Searcher
+from openings import get_book
+from tablebase import WIN, LOSS, get_tablebase
+from animation import Animator
+from records import encode_record, game_result
+from savegame import GameSaver
+from renderer import BoardRenderer, touched_cells
+from sprites import StoneSprites, StoneTheme, fade_palette
+from storage import DATABASE_FILE, LEADERBOARD_PAGE_SIZE, LEADERBOARD_START, get_database
+from workers import BackgroundExecutor
+from profiling import PROFILE_FILE, profiler, timed
+from network import SERVER_HOST, SERVER_PORT, END_FINISHED, GameClient
 
 # Константы
-CELL_SIZE = 60  # Размер одной клетки в пикселях
-GRID_WIDTH, GRID_HEIGHT = 5, 6  # Размеры игрового поля
+CELL_SIZE = 60  # Наибольший размер клетки в пикселях
+MIN_CELL_SIZE = 12  # Меньше клетки не делаются даже на большом поле
+WINDOW_WIDTH, WINDOW_HEIGHT = 800, 600  # Начальный размер окна
+BOARD_MARGIN_X = 40  # Место по бокам поля (пикселей)
+BOARD_MARGIN_Y = 200  # Место под отступы, метку и кнопки под полем (пикселей)
+# Варианты игры в главном меню: название и (ширина, высота, пары, длина линии)
+BOARD_VARIANTS = [
+    ("Поле 5x6 (классика)", (GRID_WIDTH, GRID_HEIGHT, NUM_STONES, LINE_LENGTH)),
+    ("Поле 8x8, линия 4", (8, 8, 10, 4)),
+    ("Поле 12x12", (12, 12, 24, 3)),
+    ("Поле 20x20", (20, 20, 40, 3)),
+]
 PLAYER_COLORS = ["#4287f5", "#f54242"]  # Цвета камней игроков (голубой и красный)
-NUM_STONES = 6  # Количество пар камней у каждого игрока (всего 12 камней)
-DATABASE_FILE = "bolotudu.db"  # Файл базы данных
-SAVE_FILE = "bolotudu_save.json"  # Файл сохранения игры
 BOARD_COLOR = "#8B4513"  # Темно-коричневый цвет доски
 GRID_COLOR = "#D2B48C"  # Песочный цвет линий сетки
 STONE_BORDER_WIDTH = 3  # Толщина обводки камней
@@ -22,6 +43,18 @@ STONE_GRADIENT_END = "#D3D3D3"  # Конечный цвет градиента 
 STONE_SHADOW_COLOR = "#000000"  # Цвет тени камня
 STONE_SHADOW_OFFSET = 3  # Смещение тени
 STONE_SIZE_RATIO = 0.85  # Размер камня относительно клетки
+AI_PLAYER = 1  # Компьютер играет красными камнями
+AI_TIME_LIMIT = 1.0  # Время на ход компьютера в секундах
+AI_POLL_INTERVAL = 50  # Как часто окно проверяет, закончил ли компьютер поиск (мс)
+HINT_TIME_LIMIT = 0.5  # Время на поиск подсказки вне эндшпильной базы
+COMPUTER_NAME = "Компьютер"  # Имя компьютера в записях партий
+GUEST_NAME = "Гость"  # Второй игрок за одним компьютером
+PROFILE_REFRESH_INTERVAL = 500  # Как часто обновляется панель замеров (мс)
+NETWORK_POLL_INTERVAL = 30  # Как часто окно забирает сообщения сервера (мс)
+
+# Окна сообщений модальные: время до их закрытия видно в замерах отдельно
+show_info = timed("messagebox")(messagebox.showinfo)
+show_error = timed("messagebox")(messagebox.showerror)
 
 
 class BolotuduGame:
@@ -29,92 +62,195 @@ class BolotuduGame:
         # Инициализация основного окна
         self.window = tk.Tk()
         self.window.title("Болотуду")
-        self.window.geometry("800x600")
+        self.window.geometry(f"{WINDOW_WIDTH}x{WINDOW_HEIGHT}")
         self.window.configure(bg="#2C3E50")
 
+        # Фоновые потоки для базы данных и файлов
+        self.executor = BackgroundExecutor(self.window)
+
         # Создание базы данных
         self.create_database()
 
+        # Автосохранение партии (снимок и журнал ходов)
+        self.saver = GameSaver(self.executor)
+        self.window.protocol("WM_DELETE_WINDOW", self.close_window)
+
+        # Размер клеток подгоняется под окно
+        self.window.bind("<Configure>", self.on_resize)
+
+        # Панель замеров времени (F12)
+        self.profile_overlay = None
+        self.window.bind("<F12>", self.toggle_profile_overlay)
+
         # Загрузка и установка иконки
         try:
             self.window.iconbitmap("icon.ico")
         except:
             pass
 
-        # Инициализация состояния игры
-        self.board = [[None] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
-        self.current_player = 0
-        self.stage = 1  # 1 - расстановка, 2 - перемещение
-        self.stones_count = [0, 0]  # Количество камней на поле для каждого игрока
-        self.remaining_pairs = [NUM_STONES, NUM_STONES]  # Оставшиеся пары камней для размещения
-        self.stones_to_place = 2  # Сколько камней нужно разместить в текущем ходу
-        self.selected_stone = None  # Выбранный камень для перемещения
         self.current_user = None
-
-        # Создание холста для рисования
-        self.canvas = None
-        self.info_label = None
+        # Таблица транспозиций сохраняется между ходами; дебют и эндшпиль - из книги
+        # и базы, если они построены (файлы открываются в фоне)
+        self.searcher = Searcher()
+        self.executor.submit(lambda: (get_tablebase(), get_book()), on_done=self.set_search_data,
+                             on_error=self.show_search_data_error)
+        self.reset_game_state()
+        self.sprites = self.create_sprites()
 
         # Показываем окно входа
         self.show_login_screen()
 
-        # Запуск главного цикла
-        self.window.mainloop()
+    def set_search_data(self, data):
+        self.searcher.tablebase, self.searcher.book = data
 
-    def draw_board(self):
-        """Отрисовывает текущее состояние игрового поля"""
-        self.canvas.delete("all")
+    def show_search_data_error(self, error):
+        show_error("Ошибка", f"Не удалось открыть дебютную книгу или эндшпильную базу: {error}")
 
-        # Рисуем сетку
-        for i in range(GRID_WIDTH + 1):
-            x = i * CELL_SIZE
-            self.canvas.create_line(x, 0, x, GRID_HEIGHT * CELL_SIZE, fill=GRID_COLOR, width=2)
+    def reset_game_state(self):
+        """Состояние партии и поля до начала игры (правила и доска - в движке)"""
+        self.geometry = STANDARD  # Вариант игры, выбранный в меню
+        self.position = Position()
+        self.selected_stone = None  # Выбранный камень для перемещения
+        self.vs_computer = False  # Игра против компьютера
+        self.ai_search = None  # Идущий поиск хода компьютера
+        self.hint_search = None  # Идущий поиск подсказки
+        self.last_search = None  # Статистика последнего поиска
+        self.redo_stack = []  # Отмененные ходы (MoveDelta) для повтора
+        self.network = None  # Подключение к серверу в сетевой игре
+        self.network_player = None  # Цвет камней этого окна в сетевой игре
+
+        # Холст для рисования создается вместе с полем
+        self.canvas = None
+        self.cell_size = CELL_SIZE  # Размер клетки текущего поля
+        self.info_label = None
+        self.animator = None  # Анимации на холсте (снятие камней)
+        self.renderer = None  # Элементы холста, созданные один раз
 
-        for i in range(GRID_HEIGHT + 1):
-            y = i * CELL_SIZE
-            self.canvas.create_line(0, y, GRID_WIDTH * CELL_SIZE, y, fill=GRID_COLOR, width=2)
+    def create_sprites(self):
+        """Изображения камней строятся один раз на (цвет, подсветка, размер)"""
+        return StoneSprites(tk.PhotoImage, StoneTheme(
+            STONE_GRADIENT_START, STONE_GRADIENT_END, STONE_SHADOW_COLOR, STONE_SHADOW_OFFSET,
+            STONE_SIZE_RATIO, STONE_HIGHLIGHT_COLOR, BOARD_COLOR, STONE_BORDER_WIDTH))
 
-        # Рисуем камни
-        for row in range(GRID_HEIGHT):
-            for col in range(GRID_WIDTH):
-                if self.board[row][col] is not None:
-                    x = col * CELL_SIZE + CELL_SIZE // 2
-                    y = row * CELL_SIZE + CELL_SIZE // 2
-                    color = PLAYER_COLORS[self.board[row][col]]
+    def run(self):
+        """Главный цикл окна; возвращается после закрытия окна"""
+        self.window.mainloop()
 
-                    # Выделяем выбранный камень
-                    outline_color = "yellow" if (row, col) == self.selected_stone else "black"
-                    outline_width = 3 if (row, col) == self.selected_stone else 1
+    @timed("draw_board")
+    def draw_board(self, cells=None):
+        """Отрисовывает текущее состояние игрового поля.
 
-                    self.canvas.create_oval(x - CELL_SIZE // 3, y - CELL_SIZE // 3,
-                                            x + CELL_SIZE // 3, y + CELL_SIZE // 3,
-                                            fill=color, outline=outline_color, width=outline_width)
+        Перерисовываются только изменившиеся клетки; cells - клетки,
+        затронутые последним ходом (None - проверить все).
+        """
+        self.renderer.update(self.position, self.selected_stone, cells)
 
         # Обновляем информационную метку
-        player_text = f"игрока {self.current_player + 1}"
-        stones_text = f" (осталось камней: {self.stones_count[self.current_player]})"
-        self.info_label.config(text=f"Ход {player_text} ({PLAYER_COLORS[self.current_player]} камни){stones_text}")
+        current_player = self.position.current_player
+        player_text = f"игрока {current_player + 1}"
+        stones_text = f" (осталось камней: {self.position.stones_count[current_player]})"
+        search_text = ""
+        if self.ai_search is not None:
+            search_text = " | Компьютер думает..."
+        elif self.last_search is not None:
+            search_text = (f" | Компьютер: глубина {self.last_search.depth}, "
+                           f"{self.last_search.nodes_per_second} узлов/с")
+        elif self.network_player is not None:
+            search_text = " | Ваш ход" if current_player == self.network_player else " | Ход соперника"
+        self.renderer.set_info(self.info_label,
+                               f"Ход {player_text} ({PLAYER_COLORS[current_player]} камни){stones_text}{search_text}")
+
+    def close_window(self):
+        """Дописывает сохранение партии и закрывает окно"""
+        if self.ai_search is not None:
+            self.ai_search.cancel()
+        if self.network is not None:
+            self.network.close()
+        self.saver.close()
+        if profiler.enabled and profiler.stages:
+            # Как и сохранение, дописывается после закрытия окна
+            self.executor.submit(profiler.export, PROFILE_FILE, serial=True)
+        self.executor.shutdown()
+        self.window.destroy()
+
+    def clear_window(self):
+        """Удаляет виджеты прежнего экрана; панель замеров остается"""
+        for widget in self.window.winfo_children():
+            if widget is not self.profile_overlay:
+                widget.destroy()
+
+    def toggle_profile_overlay(self, event=None):
+        """Показывает или скрывает панель замеров; при показе замеры включаются"""
+        if self.profile_overlay is not None:
+            self.profile_overlay.destroy()
+            self.profile_overlay = None
+            return
+        profiler.enabled = True
+        self.profile_overlay = tk.Toplevel(self.window)
+        self.profile_overlay.title("Замеры")
+        self.profile_overlay.protocol("WM_DELETE_WINDOW", self.toggle_profile_overlay)
+        stats_label = tk.Label(self.profile_overlay, text="", font=("Courier", 10), justify=tk.LEFT)
+        stats_label.pack(padx=10, pady=10)
+        buttons_frame = tk.Frame(self.profile_overlay)
+        buttons_frame.pack(pady=(0, 10))
+        tk.Button(buttons_frame, text="Сбросить", command=profiler.reset,
+                  font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons_frame, text="Сохранить", command=self.export_profile,
+                  font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
+        self.refresh_profile_overlay(stats_label)
+
+    def refresh_profile_overlay(self, stats_label):
+        """Обновляет таблицу p50/p99 по этапам, пока панель открыта"""
+        if self.profile_overlay is None or not stats_label.winfo_exists():
+            return
+        lines = [f"{'Этап':<22}{'Вызовов':>9}{'p50, мс':>10}{'p99, мс':>10}{'Макс, мс':>10}"]
+        for stage, count, p50, p99, longest in profiler.summary():
+            lines.append(f"{stage:<22}{count:>9}{p50:>10.2f}{p99:>10.2f}{longest:>10.2f}")
+        stats_label.config(text="\n".join(lines))
+        self.window.after(PROFILE_REFRESH_INTERVAL, self.refresh_profile_overlay, stats_label)
+
+    def export_profile(self):
+        """Сохраняет гистограммы замеров в файл для разбора вне игры (в фоне)"""
+        def done(path):
+            show_info("Замеры", f"Гистограммы сохранены в {os.path.abspath(path)}")
+
+        def failed(error):
+            show_error("Ошибка", f"Не удалось сохранить замеры: {error}")
+
+        self.executor.submit(profiler.export, PROFILE_FILE, on_done=done, on_error=failed)
 
     def create_database(self):
-        """Создает базу данных и таблицу пользователей"""
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            games_played INTEGER DEFAULT 0,
-            games_won INTEGER DEFAULT 0
-        )
-        ''')
-        conn.commit()
-        conn.close()
+        """Открывает базу данных и создает недостающие таблицы (в фоне)"""
+        self.executor.submit(get_database, DATABASE_FILE, on_error=self.show_database_error)
+
+    def show_database_error(self, error):
+        show_error("Ошибка", f"Ошибка базы данных: {error}")
+
+    def make_loading_indicator(self, parent, buttons):
+        """Индикатор загрузки: возвращает функцию set_busy(busy, text="")"""
+        status_label = tk.Label(parent, text="", bg="#ffffff", font=("Arial", 10))
+        status_label.pack(pady=(10, 0))
+        progress = ttk.Progressbar(parent, mode="indeterminate", length=200)
+
+        def set_busy(busy, text=""):
+            if not status_label.winfo_exists():  # Экран уже закрыт
+                return False
+            status_label.config(text=text)
+            for button in buttons:
+                button.config(state=tk.DISABLED if busy else tk.NORMAL)
+            if busy:
+                progress.pack(pady=(5, 0))
+                progress.start(15)
+            else:
+                progress.stop()
+                progress.pack_forget()
+            return True
+
+        return set_busy
 
     def show_login_screen(self):
         """Показывает экран входа"""
-        for widget in self.window.winfo_children():
-            widget.destroy()
+        self.clear_window()
 
         login_frame = tk.Frame(self.window, bg="#ffffff", padx=40, pady=40)
         login_frame.place(relx=0.5, rely=0.5, anchor="center")
@@ -139,29 +275,38 @@ class BolotuduGame:
             username = username_entry.get()
             password = password_entry.get()
 
-            conn = sqlite3.connect(DATABASE_FILE)
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE username=? AND password=?", (username, password))
-            user = cursor.fetchone()
-            conn.close()
+            def done(authenticated):
+                if not set_busy(False):
+                    return
+                if authenticated:
+                    self.current_user = username
+                    show_info("Успех", f"Добро пожаловать, {username}!")
+                    self.show_main_menu()
+                else:
+                    show_error("Ошибка", "Неверное имя пользователя или пароль")
 
-            if user:
-                self.current_user = username
-                messagebox.showinfo("Успех", f"Добро пожаловать, {username}!")
-                self.show_main_menu()
-            else:
-                messagebox.showerror("Ошибка", "Неверное имя пользователя или пароль")
+            def failed(error):
+                if set_busy(False):
+                    self.show_database_error(error)
 
-        tk.Button(login_frame, text="Войти", command=login,
-                  bg="#4CAF50", fg="white", **button_style).pack(pady=5)
+            # Проверка идет в фоне, окно при этом не замирает
+            set_busy(True, "Проверяем данные...")
+            self.executor.submit(lambda: get_database(DATABASE_FILE).authenticate(username, password),
+                                 on_done=done, on_error=failed)
 
-        tk.Button(login_frame, text="Регистрация", command=self.show_register_screen,
-                  bg="#2196F3", fg="white", **button_style).pack(pady=5)
+        login_button = tk.Button(login_frame, text="Войти", command=login,
+                                 bg="#4CAF50", fg="white", **button_style)
+        login_button.pack(pady=5)
+
+        register_button = tk.Button(login_frame, text="Регистрация", command=self.show_register_screen,
+                                    bg="#2196F3", fg="white", **button_style)
+        register_button.pack(pady=5)
+
+        set_busy = self.make_loading_indicator(login_frame, [login_button, register_button])
 
     def show_register_screen(self):
         """Показывает экран регистрации"""
-        for widget in self.window.winfo_children():
-            widget.destroy()
+        self.clear_window()
 
         register_frame = tk.Frame(self.window, bg="#ffffff", padx=40, pady=40)
         register_frame.place(relx=0.5, rely=0.5, anchor="center")
@@ -193,49 +338,80 @@ class BolotuduGame:
             confirm = confirm_entry.get()
 
             if not username or not password:
-                messagebox.showerror("Ошибка", "Все поля должны быть заполнены")
+                show_error("Ошибка", "Все поля должны быть заполнены")
                 return
 
             if password != confirm:
-                messagebox.showerror("Ошибка", "Пароли не совпадают")
+                show_error("Ошибка", "Пароли не совпадают")
                 return
 
-            conn = sqlite3.connect(DATABASE_FILE)
-            cursor = conn.cursor()
-            try:
-                cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-                conn.commit()
-                messagebox.showinfo("Успех", "Регистрация успешна!")
-                self.show_login_screen()
-            except sqlite3.IntegrityError:
-                messagebox.showerror("Ошибка", "Такое имя пользователя уже существует")
-            finally:
-                conn.close()
-
-        tk.Button(register_frame, text="Зарегистрироваться", command=register,
-                  bg="#4CAF50", fg="white", **button_style).pack(pady=5)
-
-        tk.Button(register_frame, text="Назад", command=self.show_login_screen,
-                  bg="#f44336", fg="white", **button_style).pack(pady=5)
+            def done(registered):
+                if not set_busy(False):
+                    return
+                if registered:
+                    show_info("Успех", "Регистрация успешна!")
+                    self.show_login_screen()
+                else:
+                    show_error("Ошибка", "Такое имя пользователя уже существует")
+
+            def failed(error):
+                if set_busy(False):
+                    self.show_database_error(error)
+
+            set_busy(True, "Создаем пользователя...")
+            self.executor.submit(lambda: get_database(DATABASE_FILE).register_user(username, password),
+                                 on_done=done, on_error=failed)
+
+        register_button = tk.Button(register_frame, text="Зарегистрироваться", command=register,
+                                    bg="#4CAF50", fg="white", **button_style)
+        register_button.pack(pady=5)
+
+        back_button = tk.Button(register_frame, text="Назад", command=self.show_login_screen,
+                                bg="#f44336", fg="white", **button_style)
+        back_button.pack(pady=5)
+
+        set_busy = self.make_loading_indicator(register_frame, [register_button, back_button])
+
+    def fit_cell_size(self, geometry):
+        """Размер клетки, при котором поле целиком помещается в окно"""
+        width, height = self.window.winfo_width(), self.window.winfo_height()
+        if width <= 1:  # Окно еще не показано
+            width, height = WINDOW_WIDTH, WINDOW_HEIGHT
+        size = min(CELL_SIZE, (width - BOARD_MARGIN_X) // geometry.width,
+                   (height - BOARD_MARGIN_Y) // geometry.height)
+        return max(size, MIN_CELL_SIZE)
+
+    def build_board(self):
+        """Создает сетку и камни холста для текущего размера клетки"""
+        geometry = self.position.geometry
+        self.animator.cancel_all()
+        self.canvas.delete("all")
+        self.canvas.config(width=geometry.width * self.cell_size,
+                           height=geometry.height * self.cell_size)
+        # Сетка и камни создаются один раз
+        self.renderer = BoardRenderer(self.canvas, self.cell_size, PLAYER_COLORS, GRID_COLOR,
+                                      self.sprites, geometry)
+
+    def on_resize(self, event):
+        """Перестраивает поле, если после изменения окна поменялся размер клетки"""
+        if event.widget is not self.window or self.renderer is None:
+            return
+        cell_size = self.fit_cell_size(self.position.geometry)
+        if cell_size != self.cell_size:
+            self.cell_size = cell_size
+            self.build_board()
+            self.draw_board()
 
     def setup_game_board(self):
         """Настраивает игровое поле"""
-        for widget in self.window.winfo_children():
-            widget.destroy()
+        self.clear_window()
 
         # Создаем холст для рисования
-        self.canvas = tk.Canvas(self.window, width=GRID_WIDTH * CELL_SIZE,
-                                height=GRID_HEIGHT * CELL_SIZE, bg=BOARD_COLOR)
+        self.cell_size = self.fit_cell_size(self.position.geometry)
+        self.canvas = tk.Canvas(self.window, bg=BOARD_COLOR)
         self.canvas.pack(pady=20)
-
-        # Рисуем сетку
-        for i in range(GRID_WIDTH + 1):
-            x = i * CELL_SIZE
-            self.canvas.create_line(x, 0, x, GRID_HEIGHT * CELL_SIZE, fill=GRID_COLOR, width=2)
-
-        for i in range(GRID_HEIGHT + 1):
-            y = i * CELL_SIZE
-            self.canvas.create_line(0, y, GRID_WIDTH * CELL_SIZE, y, fill=GRID_COLOR, width=2)
+        self.animator = Animator(self.canvas)
+        self.build_board()
 
         # Создаем информационную метку
         self.info_label = tk.Label(self.window, text="", font=("Arial", 12))
@@ -246,13 +422,30 @@ class BolotuduGame:
                                 bg="#f44336", fg="white", font=("Arial", 12))
         back_button.pack(pady=10)
 
+        # Отмена и повтор ходов
+        undo_frame = tk.Frame(self.window)
+        undo_frame.pack()
+        tk.Button(undo_frame, text="Отменить ход", command=self.undo_move,
+                  font=("Arial", 12)).pack(side=tk.LEFT, padx=5)
+        tk.Button(undo_frame, text="Повторить ход", command=self.redo_move,
+                  font=("Arial", 12)).pack(side=tk.LEFT, padx=5)
+        tk.Button(undo_frame, text="Подсказка", command=self.show_hint,
+                  font=("Arial", 12)).pack(side=tk.LEFT, padx=5)
+
         # Привязываем обработчик кликов
+        @timed("click")
         def handle_click(event):
-            col = event.x // CELL_SIZE
-            row = event.y // CELL_SIZE
+            col = event.x // self.cell_size
+            row = event.y // self.cell_size
+
+            if self.ai_search is not None:  # Ход компьютера
+                return
+            if self.network is not None and self.position.current_player != self.network_player:
+                return  # Ход соперника по сети
 
-            if 0 <= row < GRID_HEIGHT and 0 <= col < GRID_WIDTH:
-                if self.stage == 1:  # Фаза расстановки
+            geometry = self.position.geometry
+            if 0 <= row < geometry.height and 0 <= col < geometry.width:
+                if self.position.stage == 1:  # Фаза расстановки
                     self.place_stone(row, col)
                 else:  # Фаза перемещения
                     self.handle_move(row, col)
@@ -262,18 +455,59 @@ class BolotuduGame:
         # Отрисовываем начальное состояние
         self.draw_board()
 
+    def start_game(self, vs_computer=False, position=None):
+        """Начинает новую партию вдвоем или против компьютера"""
+        self.vs_computer = vs_computer
+        # Новая партия - в варианте, выбранном в меню; сохраненная - в своем
+        self.position = position if position is not None else Position(self.geometry)
+        self.saver.start(self.position, {"vs_computer": vs_computer})
+        self.setup_game_board()
+        if not self.check_game_over():
+            self.start_computer_turn()
+
+    def continue_game(self, button):
+        """Загружает сохраненную партию в фоне и продолжает ее"""
+        button.config(state=tk.DISABLED, text="Загрузка...")
+
+        def done(saved):
+            if saved is None:
+                show_info("Информация", "Нет сохраненной игры")
+                self.show_main_menu()
+                return
+            position, settings = saved
+            self.start_game(settings["vs_computer"], position)
+
+        def failed(error):
+            show_error("Ошибка", f"Не удалось загрузить сохранение: {error}")
+            self.saver.clear()
+            self.show_main_menu()
+
+        self.saver.load(on_done=done, on_error=failed)
+
     def show_main_menu(self):
         # Сброс состояния игры
-        self.board = [[None] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
-        self.current_player = 0
-        self.stage = 1
-        self.stones_count = [0, 0]
-        self.remaining_pairs = [NUM_STONES, NUM_STONES]
-        self.stones_to_place = 2
+        if self.animator is not None:
+            self.animator.cancel_all()
+            self.animator = None
+        self.renderer = None
+        if self.ai_search is not None:
+            self.ai_search.cancel()
+            self.ai_search = None
+        if self.hint_search is not None:
+            self.hint_search.cancel()
+            self.hint_search = None
+        self.position = Position()
         self.selected_stone = None
+        self.vs_computer = False
+        self.last_search = None
+        self.redo_stack = []
+        if self.network is not None:
+            self.network.close()
+            self.network = None
+        self.network_player = None
+        self.saver.stop()  # Незаконченная партия остается сохраненной
 
-        for widget in self.window.winfo_children():
-            widget.destroy()
+        self.clear_window()
 
         main_frame = tk.Frame(self.window, bg="#f0f0f0")
         main_frame.pack(expand=True, fill=tk.BOTH)
@@ -287,314 +521,455 @@ class BolotuduGame:
 
         button_style = {"font": ("Arial", 12), "width": 25, "pady": 10}
 
-        tk.Button(menu_frame, text="Начать игру", command=self.setup_game_board,
+        if self.saver.saved:
+            continue_button = tk.Button(menu_frame, text="Продолжить игру",
+                                        bg="#FF9800", fg="white", **button_style)
+            continue_button.config(command=lambda: self.continue_game(continue_button))
+            continue_button.pack(pady=5)
+
+        # Выбор варианта игры (размер поля, число камней, длина линии)
+        variant_box = ttk.Combobox(menu_frame, state="readonly", font=("Arial", 12), width=23,
+                                   values=[name for name, _ in BOARD_VARIANTS])
+        variant_box.current([get_geometry(*board) for _, board in BOARD_VARIANTS].index(self.geometry))
+        variant_box.bind("<<ComboboxSelected>>", lambda event: self.select_variant(variant_box.current()))
+        variant_box.pack(pady=5)
+
+        tk.Button(menu_frame, text="Начать игру", command=self.start_game,
                   bg="#4CAF50", fg="white", **button_style).pack(pady=5)
 
-        tk.Button(menu_frame, text="Выход", command=self.window.quit,
+        tk.Button(menu_frame, text="Играть с компьютером", command=lambda: self.start_game(True),
+                  bg="#2196F3", fg="white", **button_style).pack(pady=5)
+
+        tk.Button(menu_frame, text="Сетевая игра", command=self.show_network_screen,
+                  bg="#009688", fg="white", **button_style).pack(pady=5)
+
+        tk.Button(menu_frame, text="Таблица лидеров", command=self.show_leaderboard,
+                  bg="#9C27B0", fg="white", **button_style).pack(pady=5)
+
+        tk.Button(menu_frame, text="Выход", command=self.close_window,
                   bg="#f44336", fg="white", **button_style).pack(pady=5)
 
-    def remove_stone(self, row, col):
-        """Анимация удаления камня"""
-        x = col * CELL_SIZE + CELL_SIZE // 2
-        y = row * CELL_SIZE + CELL_SIZE // 2
-        stone_color = PLAYER_COLORS[self.board[row][col]]
-
-        # Анимация мигания
-        for _ in range(3):
-            # Мигание красным
-            self.canvas.create_oval(x - CELL_SIZE // 3, y - CELL_SIZE // 3,
-                                    x + CELL_SIZE // 3, y + CELL_SIZE // 3,
-                                    fill="red", outline="yellow", width=3)
-            self.window.update()
-            self.window.after(100)  # Задержка 100мс
-
-            # Возврат к исходному цвету
-            self.canvas.create_oval(x - CELL_SIZE // 3, y - CELL_SIZE // 3,
-                                    x + CELL_SIZE // 3, y + CELL_SIZE // 3,
-                                    fill=stone_color, outline="black", width=1)
-            self.window.update()
-            self.window.after(100)  # Задержка 100мс
-
-        # Анимация исчезновения с вращением
-        for i in range(10):
-            size = CELL_SIZE // 3 * (10 - i) // 10
-            angle = i * 36  # 360 градусов / 10 шагов = 36 градусов на шаг
-
-            # Создаем эффект вращения с помощью смещения
-            offset_x = size * 0.2 * math.cos(math.radians(angle))
-            offset_y = size * 0.2 * math.sin(math.radians(angle))
-
-            self.canvas.create_oval(x - size + offset_x, y - size + offset_y,
-                                    x + size + offset_x, y + size + offset_y,
-                                    fill=stone_color, outline="black", width=1)
-
-            # Добавляем эффект затухания цвета
-            alpha = (10 - i) / 10
-            fade_color = self.blend_colors(stone_color, BOARD_COLOR, alpha)
-
-            self.canvas.create_oval(x - size + offset_x, y - size + offset_y,
-                                    x + size + offset_x, y + size + offset_y,
-                                    fill=fade_color, outline="black", width=1)
-
-            self.window.update()
-            self.window.after(50)  # Задержка 50мс
-
-        # Удаляем камень
-        self.board[row][col] = None
-        self.stones_count[1 - self.current_player] -= 1
-        self.draw_board()
+    def select_variant(self, index):
+        self.geometry = get_geometry(*BOARD_VARIANTS[index][1])
+
+    def show_network_screen(self):
+        """Подключение к серверу сетевой игры и ожидание соперника"""
+        self.clear_window()
+
+        network_frame = tk.Frame(self.window, bg="#ffffff", padx=40, pady=40)
+        network_frame.place(relx=0.5, rely=0.5, anchor="center")
+
+        title_label = tk.Label(network_frame, text="Сетевая игра", font=("Arial", 24, "bold"), bg="#ffffff")
+        title_label.pack(pady=(0, 30))
+
+        server_label = tk.Label(network_frame, text="Сервер:", bg="#ffffff", font=("Arial", 12))
+        server_label.pack()
+        server_entry = tk.Entry(network_frame, font=("Arial", 12))
+        server_entry.insert(0, f"{SERVER_HOST}:{SERVER_PORT}")
+        server_entry.pack(pady=(0, 10))
+
+        password_label = tk.Label(network_frame, text=f"Пароль {self.current_user} (пусто - играть гостем):",
+                                  bg="#ffffff", font=("Arial", 12))
+        password_label.pack()
+        password_entry = tk.Entry(network_frame, show="*", font=("Arial", 12))
+        password_entry.pack(pady=(0, 20))
 
-    def blend_colors(self, color1, color2, alpha):
-        """Смешивает два цвета с заданной прозрачностью"""
-        # Преобразуем hex в RGB
-        r1 = int(color1[1:3], 16)
-        g1 = int(color1[3:5], 16)
-        b1 = int(color1[5:7], 16)
+        button_style = {"font": ("Arial", 12), "width": 20, "pady": 8}
 
-        r2 = int(color2[1:3], 16)
-        g2 = int(color2[3:5], 16)
-        b2 = int(color2[5:7], 16)
+        def connect():
+            host, _, port = server_entry.get().strip().rpartition(":")
+            if not host or not port.isdigit():
+                show_error("Ошибка", "Адрес сервера указывается как хост:порт")
+                return
+            password = password_entry.get()
 
-        # Смешиваем цвета
-        r = int(r1 * alpha + r2 * (1 - alpha))
-        g = int(g1 * alpha + g2 * (1 - alpha))
-        b = int(b1 * alpha + b2 * (1 - alpha))
+            def connected(client):
+                if not set_busy(True, "Ожидание соперника..."):
+                    client.close()
+                    return
+                self.network = client
+                if password and self.current_user:
+                    client.send("LOGIN", self.current_user, password)
+                else:
+                    client.send("GUEST")
+                client.send("PLAY")
+                self.window.after(NETWORK_POLL_INTERVAL, self.poll_network, client, set_busy)
+
+            def failed(error):
+                if set_busy(False):
+                    show_error("Ошибка", f"Не удалось подключиться к серверу: {error}")
+
+            set_busy(True, "Подключение...")
+            self.executor.submit(lambda: GameClient(host, int(port)), on_done=connected, on_error=failed)
+
+        def back():
+            if self.network is not None:
+                self.network.close()
+                self.network = None
+            self.show_main_menu()
+
+        connect_button = tk.Button(network_frame, text="Подключиться", command=connect,
+                                   bg="#4CAF50", fg="white", **button_style)
+        connect_button.pack(pady=5)
+
+        back_button = tk.Button(network_frame, text="Назад", command=back,
+                                bg="#f44336", fg="white", **button_style)
+        back_button.pack(pady=5)
+
+        set_busy = self.make_loading_indicator(network_frame, [connect_button])
+
+    def poll_network(self, client, set_busy):
+        """Забирает сообщения сервера и применяет ходы соперника"""
+        if client is not self.network:  # Подключение закрыто
+            return
+        for message in client.poll():
+            if message is None:
+                self.network = None
+                client.close()
+                show_error("Ошибка", "Соединение с сервером потеряно")
+                self.show_main_menu()
+                return
+            kind, args = message[0], message[1:]
+            if kind == "WAIT" or kind == "OK":
+                continue
+            if kind == "ERR":
+                self.network = None
+                if self.network_player is None:
+                    client.close()
+                    set_busy(False)
+                    show_error("Ошибка", f"Сервер: {' '.join(args)}")
+                    return
+                # Сервер отклонил ход: позиции окна и сервера разошлись, партию не продолжить
+                client.send("RESIGN")
+                client.close()
+                show_error("Ошибка", f"Сервер: {' '.join(args)}. Партия прервана.")
+                self.show_main_menu()
+                return
+            if kind == "START":
+                self.network_player = int(args[1])
+                self.position = Position()
+                self.setup_game_board()
+                show_info("Сетевая игра", f"Соперник: {args[2]}. Вы играете "
+                          f"{'первым' if self.network_player == 0 else 'вторым'}.")
+            elif kind == "MOVE":
+                if int(args[0]) == len(self.position.history) + 1:
+                    self.apply_move(parse_move(args[1], self.position.geometry))
+                if self.network is not client:  # Партия окончена
+                    return
+            elif kind == "END":
+                # Обычный конец партии уже показан по своей позиции
+                self.network = None
+                client.close()
+                result, reason = int(args[0]), args[1]
+                if result not in (0, 1):
+                    text = "Ничья: партия слишком длинная"
+                elif result != self.network_player:
+                    text = "Вы проиграли"
+                elif reason == END_FINISHED:
+                    text = "Вы победили!"
+                else:
+                    text = "Соперник сдался или отключился. Вы победили!"
+                show_info("Конец игры", text)
+                self.show_main_menu()
+                return
+        self.window.after(NETWORK_POLL_INTERVAL, self.poll_network, client, set_busy)
 
-        # Возвращаем hex
-        return f"#{r:02x}{g:02x}{b:02x}"
+    def show_leaderboard(self):
+        """Таблица лидеров по страницам и статистика текущего игрока"""
+        self.clear_window()
 
+        board_frame = tk.Frame(self.window, bg="#ffffff", padx=40, pady=30)
+        board_frame.place(relx=0.5, rely=0.5, anchor="center")
+
+        title_label = tk.Label(board_frame, text="Таблица лидеров", font=("Arial", 24, "bold"), bg="#ffffff")
+        title_label.pack(pady=(0, 10))
+
+        stats_label = tk.Label(board_frame, text="", bg="#ffffff", font=("Arial", 12))
+        stats_label.pack(pady=(0, 10))
+
+        rows_list = tk.Listbox(board_frame, width=48, height=LEADERBOARD_PAGE_SIZE,
+                               font=("Courier", 11), activestyle="none")
+        rows_list.pack()
+
+        nav_frame = tk.Frame(board_frame, bg="#ffffff")
+        nav_frame.pack(pady=10)
+        prev_button = tk.Button(nav_frame, text="< Назад", font=("Arial", 12), state=tk.DISABLED)
+        prev_button.pack(side=tk.LEFT, padx=5)
+        next_button = tk.Button(nav_frame, text="Вперед >", font=("Arial", 12), state=tk.DISABLED)
+        next_button.pack(side=tk.LEFT, padx=5)
+
+        tk.Button(board_frame, text="В меню", command=self.show_main_menu,
+                  bg="#f44336", fg="white", font=("Arial", 12), width=20).pack(pady=5)
+
+        # Ключи начала уже открытых страниц: назад - по сохраненному ключу
+        page_keys = [LEADERBOARD_START]
+
+        def show_page(page, result):
+            if not rows_list.winfo_exists():  # Экран уже закрыт
+                return
+            rows, next_key = result
+            del page_keys[page + 1:]
+            if next_key is not None:
+                page_keys.append(next_key)
+            rows_list.delete(0, tk.END)
+            rows_list.insert(tk.END, f"{'#':>5}  {'Игрок':<20}{'Партий':>9}{'Побед':>9}")
+            for number, (username, played, won) in enumerate(rows, page * LEADERBOARD_PAGE_SIZE + 1):
+                rows_list.insert(tk.END, f"{number:>5}  {username[:20]:<20}{played:>9}{won:>9}")
+            if not rows:
+                rows_list.insert(tk.END, "Сыгранных партий пока нет")
+            prev_button.config(state=tk.NORMAL if page > 0 else tk.DISABLED,
+                               command=lambda: load_page(page - 1))
+            next_button.config(state=tk.NORMAL if next_key is not None else tk.DISABLED,
+                               command=lambda: load_page(page + 1))
+
+        def load_page(page):
+            prev_button.config(state=tk.DISABLED)
+            next_button.config(state=tk.DISABLED)
+            key = page_keys[page]
+            self.executor.submit(lambda: get_database(DATABASE_FILE).leaderboard_page(key),
+                                 on_done=lambda result: show_page(page, result),
+                                 on_error=self.show_database_error)
+
+        def show_stats(stats):
+            if not stats_label.winfo_exists() or stats is None:
+                return
+            played, won, rank = stats
+            rank_text = f", место {rank}" if rank is not None else ""
+            stats_label.config(text=f"{self.current_user}: партий {played}, побед {won}{rank_text}")
+
+        load_page(0)
+        if self.current_user is not None:
+            username = self.current_user
+            self.executor.submit(lambda: get_database(DATABASE_FILE).player_stats(username),
+                                 on_done=show_stats, on_error=self.show_database_error)
+
+    @timed("remove_stone")
+    def remove_stone(self, row, col, player):
+        """Запускает анимацию удаления камня (сам камень уже снят движком).
+
+        Анимация идет кадрами через after и не мешает кликам и ходу компьютера.
+        """
+        return self.animator.play(self.removal_frames(row, col, player))
+
+    def removal_frames(self, row, col, player):
+        """Кадры анимации удаления: один элемент холста меняет цвет и размер"""
+        cell_size = self.cell_size
+        x = col * cell_size + cell_size // 2
+        y = row * cell_size + cell_size // 2
+        stone_color = PLAYER_COLORS[player]
+        fade_colors = fade_palette(stone_color, BOARD_COLOR, 10)  # Считается один раз на цвет
+        radius = cell_size // 3
+        item = self.canvas.create_oval(x - radius, y - radius, x + radius, y + radius,
+                                       fill=stone_color, outline="black", width=1,
+                                       tags="animation")
+        try:
+            # Анимация мигания
+            for _ in range(3):
+                # Мигание красным
+                self.canvas.itemconfig(item, fill="red", outline="yellow", width=3)
+                yield 100  # Задержка 100мс
+
+                # Возврат к исходному цвету
+                self.canvas.itemconfig(item, fill=stone_color, outline="black", width=1)
+                yield 100  # Задержка 100мс
+
+            # Анимация исчезновения с вращением
+            for i in range(10):
+                size = cell_size // 3 * (10 - i) // 10
+                angle = i * 36  # 360 градусов / 10 шагов = 36 градусов на шаг
+
+                # Создаем эффект вращения с помощью смещения
+                offset_x = size * 0.2 * math.cos(math.radians(angle))
+                offset_y = size * 0.2 * math.sin(math.radians(angle))
+
+                # Добавляем эффект затухания цвета
+                self.canvas.coords(item, x - size + offset_x, y - size + offset_y,
+                                   x + size + offset_x, y + size + offset_y)
+                self.canvas.itemconfig(item, fill=fade_colors[i])
+                yield 50  # Задержка 50мс
+        finally:
+            self.canvas.delete(item)
+
+    @timed("place_stone")
     def place_stone(self, row, col):
         # Размещение камня на поле
-        if self.board[row][col] is None and self.remaining_pairs[self.current_player] > 0:
-            if self.check_no_three_in_row(row, col):
-                self.board[row][col] = self.current_player
-                self.stones_count[self.current_player] += 1
-                self.stones_to_place -= 1
-
-                if self.stones_to_place == 0:
-                    self.remaining_pairs[self.current_player] -= 1
-                    self.stones_to_place = 2
-                    self.next_turn()
-
-                # Проверяем, закончилась ли фаза расстановки
-                if sum(self.remaining_pairs) == 0:
-                    self.stage = 2
-                    messagebox.showinfo("Информация", "Начинается фаза перемещения камней!")
-
-                self.draw_board()
+        position = self.position
+        index = cell_index(row, col, position.geometry)
+        if position.cell(row, col) is None and position.remaining_pairs[position.current_player] > 0:
+            if position.is_legal_placement(index):
+                self.apply_move(encode_move(index, index))
         else:
-            messagebox.showerror("Ошибка", "Недопустимый ход!")
+            show_error("Ошибка", "Недопустимый ход!")
 
+    @timed("handle_move")
     def handle_move(self, row, col):
+        position = self.position
         if self.selected_stone is None:
             # Выбор камня для перемещения
-            if self.board[row][col] is not None and self.board[row][col] == self.current_player:
+            if position.cell(row, col) == position.current_player:
                 self.selected_stone = (row, col)
                 self.draw_board()
         else:
             # Перемещение выбранного камня
-            if self.is_valid_move(self.selected_stone[0], self.selected_stone[1], row, col):
-                old_row, old_col = self.selected_stone
-
-                # Сохраняем старое состояние доски
-                old_board = [row[:] for row in self.board]
-
-                # Выполняем ход
-                self.board[row][col] = self.board[old_row][old_col]
-                self.board[old_row][old_col] = None
-                self.selected_stone = None
-
-                # Проверяем наличие тройки или четверки
-                line_info = self.check_for_line(row, col)
-                if line_info[0]:  # Если есть линия
-                    adjacent_stones = self.get_adjacent_opponent_stones(row, col, line_info[1])
-                    if adjacent_stones:
-                        # Проверяем, что линия только что создана
-                        old_line = self.check_for_line_at_position(row, col, old_board)
-                        if not old_line[0]:  # Если линия новая
-                            # Снимаем только один камень противника с анимацией
-                            remove_row, remove_col = adjacent_stones[0]
-                            self.remove_stone(remove_row, remove_col)
-
-                # Проверяем условие окончания игры
-                if self.stones_count[1 - self.current_player] <= 2:
-                    winner = "Первый игрок" if self.current_player == 0 else "Второй игрок"
-                    messagebox.showinfo("Конец игры", f"{winner} победил!")
-                    self.show_main_menu()
-                    return
-
-                self.next_turn()
+            move = encode_move(cell_index(*self.selected_stone, position.geometry),
+                               cell_index(row, col, position.geometry))
+            self.selected_stone = None
+            if position.is_legal_move(move):
+                self.apply_move(move)
             else:
-                self.selected_stone = None
                 self.draw_board()
-                messagebox.showerror("Ошибка", "Недопустимый ход!")
-
-    def check_for_line_at_position(self, row, col, board):
-        """Проверяет наличие линии на заданной доске"""
-        player = board[row][col]
-        if player is None:
-            return (False, None)
-
-        # Проверка по горизонтали
-        count = 1
-        # Влево
-        c = col - 1
-        while c >= 0 and board[row][c] == player:
-            count += 1
-            c -= 1
-        # Вправо
-        c = col + 1
-        while c < GRID_WIDTH and board[row][c] == player:
-            count += 1
-            c += 1
-
-        if count >= 3:
-            return (True, "horizontal")
-
-        # Проверка по вертикали
-        count = 1
-        # Вверх
-        r = row - 1
-        while r >= 0 and board[r][col] == player:
-            count += 1
-            r -= 1
-        # Вниз
-        r = row + 1
-        while r < GRID_HEIGHT and board[r][col] == player:
-            count += 1
-            r += 1
-
-        if count >= 3:
-            return (True, "vertical")
-
-        return (False, None)
-
-    def check_for_line(self, row, col):
-        """Проверяет наличие линии из 3 или 4 камней и возвращает (bool, direction)"""
-        player = self.board[row][col]
-
-        # Проверка по горизонтали
-        count = 1
-        # Влево
-        c = col - 1
-        while c >= 0 and self.board[row][c] == player:
-            count += 1
-            c -= 1
-        # Вправо
-        c = col + 1
-        while c < GRID_WIDTH and self.board[row][c] == player:
-            count += 1
-            c += 1
-
-        if count >= 3:
-            return (True, "horizontal")
-
-        # Проверка по вертикали
-        count = 1
-        # Вверх
-        r = row - 1
-        while r >= 0 and self.board[r][col] == player:
-            count += 1
-            r -= 1
-        # Вниз
-        r = row + 1
-        while r < GRID_HEIGHT and self.board[r][col] == player:
-            count += 1
-            r += 1
-
-        if count >= 3:
-            return (True, "vertical")
-
-        return (False, None)
-
-    def is_valid_move(self, from_row, from_col, to_row, to_col):
-        # Проверка возможности перемещения
-        if self.board[to_row][to_col] is not None:
-            return False
+                show_error("Ошибка", "Недопустимый ход!")
+
+    def apply_move(self, move):
+        """Выполняет допустимый ход любого из игроков и передает ход дальше"""
+        position = self.position
+        player = position.current_player
+        stage = position.stage
+        self.redo_stack = []
+        captured = position.make_move(move)
+        if self.network is not None and player == self.network_player:
+            self.network.send_move(move)
+        self.saver.record(position)
+        self.draw_board(touched_cells(position.last_delta()))
+        if captured >= 0:
+            # Снимаем камень противника с анимацией
+            remove_row, remove_col = cell_coords(captured, position.geometry)
+            self.remove_stone(remove_row, remove_col, 1 - player)
+
+        # Проверяем, закончилась ли фаза расстановки
+        if stage == 1 and position.stage == 2:
+            show_info("Информация", "Начинается фаза перемещения камней!")
+
+        if not self.check_game_over():
+            self.start_computer_turn()
+
+    def undo_move(self):
+        """Отменяет последний ход; против компьютера - вместе с его ответом"""
+        if self.ai_search is not None or self.network is not None:
+            return
+        position = self.position
+        while position.history:
+            self.redo_stack.append(position.unmake_move())
+            if not self.vs_computer or position.current_player != AI_PLAYER:
+                break
+        self.saver.snapshot(position)
+        self.selected_stone = None
+        self.draw_board()
 
-        # Проверка, что перемещение происходит на соседнюю клетку
-        row_diff = abs(to_row - from_row)
-        col_diff = abs(to_col - from_col)
-        return (row_diff == 1 and col_diff == 0) or (row_diff == 0 and col_diff == 1)
-
-    def check_no_three_in_row(self, row, col):
-        # Временно размещаем камень для проверки
-        self.board[row][col] = self.current_player
-
-        # Проверка по горизонтали
-        count = 1
-        # Влево
-        c = col - 1
-        while c >= 0 and self.board[row][c] == self.current_player:
-            count += 1
-            c -= 1
-        # Вправо
-        c = col + 1
-        while c < GRID_WIDTH and self.board[row][c] == self.current_player:
-            count += 1
-            c += 1
-
-        # Проверка по вертикали
-        count_vert = 1
-        # Вверх
-        r = row - 1
-        while r >= 0 and self.board[r][col] == self.current_player:
-            count_vert += 1
-            r -= 1
-        # Вниз
-        r = row + 1
-        while r < GRID_HEIGHT and self.board[r][col] == self.current_player:
-            count_vert += 1
-            r += 1
-
-        # Убираем временно размещенный камень
-        self.board[row][col] = None
-
-        return count < 3 and count_vert < 3
-
-    def get_adjacent_opponent_stones(self, row, col, direction):
-        """Получает список вражеских камней, примыкающих к линии"""
-        player = self.board[row][col]
-        opponent = 1 - player
-        adjacent_stones = []
-
-        if direction == "horizontal":
-            # Находим начало и конец линии
-            left = col
-            while left > 0 and self.board[row][left - 1] == player:
-                left -= 1
-            right = col
-            while right < GRID_WIDTH - 1 and self.board[row][right + 1] == player:
-                right += 1
-
-            # Проверяем камни слева и справа от линии
-            if left > 0 and self.board[row][left - 1] == opponent:
-                adjacent_stones.append((row, left - 1))
-            if right < GRID_WIDTH - 1 and self.board[row][right + 1] == opponent:
-                adjacent_stones.append((row, right + 1))
-
-        elif direction == "vertical":
-            # Находим верх и низ линии
-            top = row
-            while top > 0 and self.board[top - 1][col] == player:
-                top -= 1
-            bottom = row
-            while bottom < GRID_HEIGHT - 1 and self.board[bottom + 1][col] == player:
-                bottom += 1
-
-            # Проверяем камни сверху и снизу от линии
-            if top > 0 and self.board[top - 1][col] == opponent:
-                adjacent_stones.append((top - 1, col))
-            if bottom < GRID_HEIGHT - 1 and self.board[bottom + 1][col] == opponent:
-                adjacent_stones.append((bottom + 1, col))
-
-        return adjacent_stones
-
-    def next_turn(self):
-        """Переход хода к следующему игроку"""
-        self.current_player = 1 - self.current_player
+    def redo_move(self):
+        """Повторяет отмененный ход"""
+        if self.ai_search is not None or self.network is not None:
+            return
+        position = self.position
+        while self.redo_stack:
+            position.redo_move(self.redo_stack.pop())
+            self.saver.record(position)
+            if not self.vs_computer or position.current_player != AI_PLAYER:
+                break
+        self.selected_stone = None
+        self.draw_board()
+        if not self.check_game_over():
+            self.start_computer_turn()
+
+    def start_computer_turn(self):
+        """Запускает поиск хода компьютера в фоне, если сейчас его ход"""
+        if not self.vs_computer or self.position.current_player != AI_PLAYER:
+            return
+        self.ai_search = BackgroundSearch(self.position, AI_TIME_LIMIT, searcher=self.searcher)
         self.draw_board()
+        self.window.after(AI_POLL_INTERVAL, self.poll_computer_move, self.ai_search)
+
+    def poll_computer_move(self, search):
+        """Проверяет, нашел ли компьютер ход, не блокируя окно"""
+        if search is not self.ai_search:  # Поиск отменен
+            return
+        result = search.poll()
+        if result is None:
+            self.window.after(AI_POLL_INTERVAL, self.poll_computer_move, search)
+            return
+        self.ai_search = None
+        self.last_search = result
+        self.apply_move(result.move)
+
+    def save_game_record(self):
+        """Записывает законченную партию в базу одной вставкой в фоне"""
+        position = self.position
+        moves = [delta.move for delta in position.history]
+        white = self.current_user or GUEST_NAME
+        black = COMPUTER_NAME if self.vs_computer else GUEST_NAME
+        result = game_result(position)
+        row = (white, black, result, len(moves), time.time(), encode_record(moves, result, position.geometry))
+        # Засчитывается только партия против компьютера: за одним компьютером
+        # вошедший пользователь мог бы "выиграть" сам у себя (сетевую партию
+        # записывает сервер)
+        users = [(self.current_user is not None and self.vs_computer, False)]
+        self.executor.submit(lambda: get_database(DATABASE_FILE).insert_games([row], users),
+                             on_error=self.show_database_error)
+
+    def show_hint(self):
+        """Подсказывает ход: из эндшпильной базы сразу, иначе коротким поиском"""
+        if self.ai_search is not None or self.hint_search is not None or self.network is not None:
+            return
+        tablebase = self.searcher.tablebase
+        found = tablebase.best_move(self.position) if tablebase is not None else None
+        if found is not None:
+            move, result, plies = found
+            if result == WIN:
+                outcome = f"выигрыш, полуходов до конца партии: {plies}"
+            elif result == LOSS:
+                outcome = f"проигрыш при лучшей игре соперника, полуходов до конца партии: {plies}"
+            else:
+                outcome = "ничья при лучшей игре"
+            self.show_hint_move(move, f"\n({outcome})")
+            return
+        self.hint_search = BackgroundSearch(self.position, HINT_TIME_LIMIT)
+        self.window.after(AI_POLL_INTERVAL, self.poll_hint, self.hint_search,
+                          len(self.position.history))
+
+    def poll_hint(self, search, plies):
+        """Ждет подсказку поиска; устаревшая (после хода) не показывается"""
+        if search is not self.hint_search:
+            return
+        result = search.poll()
+        if result is None:
+            self.window.after(AI_POLL_INTERVAL, self.poll_hint, search, plies)
+            return
+        self.hint_search = None
+        if self.renderer is not None and result.move is not None and len(self.position.history) == plies:
+            self.show_hint_move(result.move, "")
+
+    def show_hint_move(self, move, outcome):
+        geometry = self.position.geometry
+        frm_row, frm_col = cell_coords(move_from(move), geometry)
+        to_row, to_col = cell_coords(move_to(move), geometry)
+        if (frm_row, frm_col) == (to_row, to_col):
+            text = f"Поставьте камень в клетку ({to_row + 1}, {to_col + 1})"
+        else:
+            text = (f"Переместите камень ({frm_row + 1}, {frm_col + 1}) "
+                    f"в клетку ({to_row + 1}, {to_col + 1})")
+            # Камень сразу выбран - остается нажать на клетку
+            self.selected_stone = (frm_row, frm_col)
+            self.draw_board()
+        show_info("Подсказка", text + outcome)
+
+    def check_game_over(self):
+        """Показывает победителя и возвращает в меню, если игра окончена"""
+        if self.position.is_game_over() and self.network is None:
+            # Сетевую партию записывает сервер
+            self.saver.clear()
+            self.save_game_record()
+        if self.position.is_draw():
+            show_info("Конец игры", "Ничья: позиция повторилась трижды")
+            self.show_main_menu()
+            return True
+        winner = self.position.result()
+        if winner is None:
+            return False
+        winner_text = "Первый игрок" if winner == 0 else "Второй игрок"
+        show_info("Конец игры", f"{winner_text} победил!")
+        self.show_main_menu()
+        return True
 
 
 if __name__ == "__main__":
-    BolotuduGame()
\ No newline at end of file
+    BolotuduGame().run()
\ No newline at end of file
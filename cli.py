@@ -0,0 +1,321 @@
+"""Болотуду из командной строки, без окна.
+
+Команды:
+    play      партия против компьютера в терминале
+    simulate  пакет случайных партий на NumPy (simulator.py)
+    analyze   разбор записанной партии из базы: лучший ход и потери на каждом ходу
+    bench     замеры производительности (аргументы передаются benchmarks.py)
+    gui       окно игры
+
+Модуль не импортирует tkinter, а тяжелые модули (NumPy, sqlite3, окно,
+замеры) загружаются только той командой, которой они нужны: запуск до первого
+вывода стоит немногим больше запуска самого интерпретатора (замер
+``cold_start`` в ``benchmarks.py``). Это важно для пакетных заданий и
+процессов пула, которые запускаются тысячами.
+
+Ходы записываются как в журнале: ``12`` - поставить камень в клетку 12,
+``12-13`` - переместить камень из 12 в 13. Клетки нумеруются по строкам
+с нуля.
+
+Примеры:
+    python cli.py play --depth 4
+    python cli.py simulate --games 100000 --width 20 --height 20 --stones 40
+    python cli.py analyze 17
+    python cli.py bench run --cases lines moves
+"""
+
+import argparse
+import os
+import sys
+
+from engine import (GRID_WIDTH, GRID_HEIGHT, NUM_STONES, LINE_LENGTH, Position, format_move,
+                    get_geometry, parse_move)
+
+STONE_SYMBOLS = ("X", "O")  # Камни первого и второго игрока
+EMPTY_SYMBOL = "."
+PLAY_TIME_LIMIT = 1.0  # Время компьютера на ход по умолчанию (с)
+ANALYSIS_DEPTH = 4  # Глубина разбора партии по умолчанию
+BLUNDER_THRESHOLD = 100  # Потеря оценки, начиная с которой ход считается ошибкой (камень)
+
+
+class HelpFormatter(argparse.HelpFormatter):
+    """Ширина справки по терминалу без shutil.get_terminal_size.
+
+    Стандартный форматтер создается при каждом add_argument и при первом
+    создании импортирует shutil, а тот - zlib, bz2 и lzma: это треть времени
+    запуска cli.py.
+    """
+
+    def __init__(self, prog, indent_increment=2, max_help_position=24, width=None):
+        if width is None:
+            width = terminal_width()
+        super().__init__(prog, indent_increment, max_help_position, width)
+
+
+def terminal_width():
+    """Ширина терминала как у shutil.get_terminal_size (по умолчанию 80)"""
+    try:
+        return int(os.environ["COLUMNS"])
+    except (KeyError, ValueError):
+        pass
+    try:
+        return os.get_terminal_size(sys.__stdout__.fileno()).columns
+    except (AttributeError, ValueError, OSError):
+        return 80
+
+
+def add_board_arguments(parser):
+    parser.add_argument("--width", type=int, default=GRID_WIDTH, help="ширина поля")
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT, help="высота поля")
+    parser.add_argument("--stones", type=int, default=NUM_STONES, help="пар камней у игрока")
+    parser.add_argument("--line", type=int, default=LINE_LENGTH, help="длина линии")
+
+
+def board_geometry(parser, args):
+    try:
+        return get_geometry(args.width, args.height, args.stones, args.line)
+    except ValueError as error:
+        parser.error(str(error))
+
+
+def format_board(position):
+    """Доска текстом: над столбцами их номера, слева - номер первой клетки строки"""
+    geometry = position.geometry
+    width = len(str(geometry.num_cells - 1)) + 1
+    lines = [" " * width + "".join(f"{col:>{width}}" for col in range(geometry.width))]
+    for row in range(geometry.height):
+        cells = []
+        for col in range(geometry.width):
+            owner = position.cell(row, col)
+            cells.append(f"{EMPTY_SYMBOL if owner is None else STONE_SYMBOLS[owner]:>{width}}")
+        lines.append(f"{row * geometry.width:>{width}}" + "".join(cells))
+    return "\n".join(lines)
+
+
+def format_status(position):
+    player = position.current_player
+    if position.stage == 1:
+        stage = (f"расстановка, пар осталось {position.remaining_pairs[player]}, "
+                 f"камень {3 - position.stones_to_place} из 2")
+    else:
+        stage = "перемещение"
+    return (f"Ход игрока {player + 1} ({STONE_SYMBOLS[player]}): {stage}; камней на поле "
+            f"{position.stones_count[0]}:{position.stones_count[1]}")
+
+
+def format_outcome(position):
+    if position.is_draw():
+        return "Ничья: позиция повторилась"
+    winner = position.result()
+    return f"Победил игрок {winner + 1} ({STONE_SYMBOLS[winner]})"
+
+
+# Команды
+
+def command_play(parser, args):
+    position = Position(board_geometry(parser, args))
+    searcher = None  # Поиск, книга и база загружаются к первому ходу компьютера
+    human = 1 if args.second else 0
+    print(f"Болотуду: поле {position.geometry.describe()}. Вы играете {STONE_SYMBOLS[human]}; "
+          f"ход - номер клетки (12) или перемещение (12-13), q - выход.", flush=True)
+    while not position.is_game_over():
+        print()
+        print(format_board(position))
+        print(format_status(position))
+        if position.current_player == human:
+            try:
+                text = input("> ").strip()
+            except EOFError:
+                print()
+                return 0
+            if text in ("q", "quit", "выход"):
+                return 0
+            try:
+                move = parse_move(text, position.geometry)
+            except ValueError:
+                print(f"Не понимаю ход: {text}")
+                continue
+            if not position.is_legal_move(move):
+                print(f"Недопустимый ход: {text}")
+                continue
+        else:
+            if searcher is None:
+                from ai import Searcher
+                from openings import get_book
+                from tablebase import get_tablebase
+
+                searcher = Searcher(tablebase=get_tablebase(), book=get_book())
+            result = searcher.search(position, time_limit=args.time, max_depth=args.depth)
+            move = result.move
+            print(f"Компьютер: {format_move(move)} (глубина {result.depth}, "
+                  f"{result.nodes_per_second} узлов/с)")
+        captured = position.make_move(move)
+        if captured >= 0:
+            print(f"Снят камень в клетке {captured}")
+    print()
+    print(format_board(position))
+    print(format_outcome(position))
+    return 0
+
+
+def command_simulate(parser, args):
+    from simulator import simulate
+
+    geometry = board_geometry(parser, args)
+    stats = simulate(args.games, seed=args.seed, batch_size=args.batch_size,
+                     max_plies=args.max_plies, geometry=geometry)
+    if args.json:
+        import json
+        json.dump(stats, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return 0
+    games = stats["games"]
+    print(f"Поле {geometry.describe()}: {games} партий за {stats['elapsed']:.2f} с "
+          f"({stats['games_per_second']:.0f} партий/с)")
+    for player in (0, 1):
+        print(f"Победы игрока {player + 1}: {stats['wins'][player]} "
+              f"({100 * stats['wins'][player] / max(games, 1):.1f}%)")
+    print(f"Ничьи (повторение позиции или {args.max_plies} ходов): {stats['draws']}")
+    percentiles = ", ".join(f"p{q} {value:.0f}" for q, value in stats["length_percentiles"].items())
+    print(f"Длина партии: в среднем {stats['mean_length']:.1f} ходов ({percentiles})")
+    return 0
+
+
+def command_analyze(parser, args):
+    from ai import WIN_SCORE, Searcher
+    from records import RESULT_DRAW, RESULT_UNFINISHED, decode_header
+    from storage import DATABASE_FILE, Database
+    from tablebase import get_tablebase
+
+    # Database создает недостающий файл: опечатка в пути дала бы пустую базу
+    path = args.database or DATABASE_FILE
+    if not os.path.exists(path):
+        parser.error(f"нет базы {path}")
+    database = Database(path)
+    record = database.game(args.game)
+    database.close()
+    if record is None:
+        print(f"Партии {args.game} нет в {path}", file=sys.stderr)
+        return 1
+    if record.result == RESULT_DRAW:
+        outcome = "ничья"
+    elif record.result == RESULT_UNFINISHED:
+        outcome = "не закончена"
+    else:
+        outcome = f"победил игрок {record.result + 1}"
+    geometry = decode_header(record.data).geometry
+    print(f"Партия {record.id} ({geometry.describe()}): {record.white} - {record.black}, "
+          f"{record.plies} ходов, {outcome}")
+
+    # Оценка хода - оценка позиции после него на ход меньше глубиной; потеря -
+    # насколько она хуже лучшего хода, с точки зрения сделавшего ход игрока
+    searcher = Searcher(tablebase=get_tablebase())
+    position = Position(geometry)
+    mistakes = [0, 0]
+    print(f"{'Ход':>5} {'Игрок':>6} {'Сделан':>8} {'Лучший':>8} {'Оценка':>8} {'Потеря':>8}")
+    for ply, move in enumerate(record.moves(), 1):
+        player = position.current_player
+        best = searcher.search(position, time_limit=None, max_depth=args.depth)
+        loss = 0
+        if move != best.move:
+            position.make_move(move)
+            if position.winner is not None:
+                played = WIN_SCORE if position.winner == player else -WIN_SCORE
+            else:
+                reply = searcher.search(position, time_limit=None, max_depth=max(args.depth - 1, 1))
+                played = reply.score if position.current_player == player else -reply.score
+            position.unmake_move()
+            loss = max(best.score - played, 0)
+        mark = ""
+        if loss >= args.threshold:
+            mistakes[player] += 1
+            mark = " ?"
+        print(f"{ply:>5} {player + 1:>6} {format_move(move):>8} {format_move(best.move):>8} "
+              f"{best.score:>8} {loss:>8}{mark}")
+        position.make_move(move)
+    print(f"Ошибок (потеря от {args.threshold}): игрок 1 - {mistakes[0]}, игрок 2 - {mistakes[1]}")
+    return 0
+
+
+def command_bench(parser, args):
+    import benchmarks
+
+    benchmarks.main(args.arguments)
+    return 0
+
+
+def command_gui(parser, args):
+    from cdd import BolotuduGame
+
+    BolotuduGame().run()
+    return 0
+
+
+def add_play_arguments(parser):
+    add_board_arguments(parser)
+    parser.add_argument("--second", action="store_true", help="играть вторым (O)")
+    parser.add_argument("--time", type=float, default=PLAY_TIME_LIMIT, help="время компьютера на ход, с")
+    parser.add_argument("--depth", type=int, default=None, help="наибольшая глубина поиска")
+
+
+def add_simulate_arguments(parser):
+    add_board_arguments(parser)
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10000, help="партий в пакете")
+    parser.add_argument("--max-plies", type=int, default=400, help="после стольких ходов - ничья")
+    parser.add_argument("--json", action="store_true", help="вывести статистику в JSON")
+
+
+def add_analyze_arguments(parser):
+    parser.add_argument("game", type=int, help="номер партии в базе")
+    parser.add_argument("--database", default=None, help="база партий (bolotudu.db)")
+    parser.add_argument("--depth", type=int, default=ANALYSIS_DEPTH, help="глубина поиска")
+    parser.add_argument("--threshold", type=int, default=BLUNDER_THRESHOLD,
+                        help="потеря оценки, с которой ход отмечается как ошибка")
+
+
+def add_bench_arguments(parser):
+    parser.add_argument("arguments", nargs=argparse.REMAINDER)
+
+
+def add_gui_arguments(parser):
+    pass
+
+
+# Команда: (описание, аргументы, обработчик)
+COMMANDS = {
+    "play": ("партия против компьютера в терминале", add_play_arguments, command_play),
+    "simulate": ("пакет случайных партий", add_simulate_arguments, command_simulate),
+    "analyze": ("разбор партии из базы", add_analyze_arguments, command_analyze),
+    "bench": ("замеры производительности (benchmarks.py)", add_bench_arguments, command_bench),
+    "gui": ("окно игры", add_gui_arguments, command_gui),
+}
+
+
+def build_parser(only=None):
+    """Парсер команд; аргументы добавляются только команде only (None - всем).
+
+    Каждый add_argument стоит времени запуска, а разбирается всегда одна команда.
+    """
+    parser = argparse.ArgumentParser(prog="cli.py", description="Болотуду без окна",
+                                     formatter_class=HelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, (help_text, add_arguments, handler) in COMMANDS.items():
+        command_parser = commands.add_parser(name, help=help_text, formatter_class=HelpFormatter)
+        if only is None or name == only:
+            add_arguments(command_parser)
+        command_parser.set_defaults(handler=handler)
+    return parser
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = build_parser(argv[0] if argv else "")
+    args = parser.parse_args(argv)
+    return args.handler(parser, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
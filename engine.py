@@ -0,0 +1,688 @@
+"""Движок правил Болотуду без зависимости от Tk.
+
+Доска хранится как два целых числа-битборда (по одному на игрока):
+бит с номером ``row * width + col`` установлен, если в клетке стоит
+камень этого игрока. Кроме того, у каждого игрока есть маски строк ``rows``
+и столбцов ``cols``: они обновляются при каждом ходе, и длина цепочки камней
+через клетку считается по одной такой маске несколькими битовыми операциями -
+за O(1) при любом размере поля.
+
+Размеры поля, число пар камней и длина линии задаются геометрией партии
+``Geometry``; по умолчанию - стандартное поле 5x6 (``STANDARD``).
+"""
+
+from collections import namedtuple
+
+# Константы правил стандартной игры
+GRID_WIDTH, GRID_HEIGHT = 5, 6  # Размеры игрового поля
+NUM_STONES = 6  # Количество пар камней у каждого игрока (всего 12 камней)
+LINE_LENGTH = 3  # Минимальная длина линии
+MIN_STONES = 2  # При таком количестве камней игрок проигрывает
+
+NUM_CELLS = GRID_WIDTH * GRID_HEIGHT
+FULL_MASK = (1 << NUM_CELLS) - 1
+
+# Кодирование хода: (откуда << MOVE_SHIFT) | куда; для расстановки откуда == куда
+MOVE_SHIFT = 16
+MOVE_MASK = (1 << MOVE_SHIFT) - 1
+
+HORIZONTAL = "horizontal"
+VERTICAL = "vertical"
+
+REPETITION_LIMIT = 3  # Повторение позиции столько раз - ничья
+MAX_SIDE = 255  # Наибольшая сторона поля: номер клетки помещается в MOVE_SHIFT бит
+
+# Запись о ходе для отмены: сам ход, снятый камень (-1, если не было), новая ли
+# линия образована ходом и состояние счетчиков до хода. Отмена и повтор хода по
+# такой записи выполняются за O(1), без копирования доски.
+MoveDelta = namedtuple("MoveDelta", ("move", "captured", "line_formed", "stage",
+                                     "stones_to_place", "pairs", "winner", "hash"))
+
+
+def encode_move(frm, to):
+    """Кодирует перемещение камня из клетки frm в клетку to"""
+    return (frm << MOVE_SHIFT) | to
+
+
+def encode_placement(to):
+    """Кодирует постановку камня в клетку to"""
+    return (to << MOVE_SHIFT) | to
+
+
+def move_from(move):
+    return move >> MOVE_SHIFT
+
+
+def move_to(move):
+    return move & MOVE_MASK
+
+
+def is_placement(move):
+    return (move >> MOVE_SHIFT) == (move & MOVE_MASK)
+
+
+def iter_bits(bb):
+    """Перебирает номера установленных битов"""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def run_bounds(bits, i):
+    """Первый и последний бит непрерывной цепочки единиц маски bits через бит i.
+
+    Бит i должен быть установлен. Выше i цепочка - младшие единицы ``bits >> i``,
+    ниже - все биты выше старшего нуля под i.
+    """
+    above = bits >> i
+    return (~bits & ((1 << i) - 1)).bit_length(), i + (~above & (above + 1)).bit_length() - 2
+
+
+def _splitmix64(state):
+    """Генератор псевдослучайных 64-битных ключей (воспроизводимый)"""
+    while True:
+        state = (state + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        z = state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        yield z ^ (z >> 31)
+
+
+ZOBRIST_SEED = 0x5A0B
+
+
+def build_zobrist_keys(num_cells, num_stones, seed=ZOBRIST_SEED):
+    """Ключи Зобриста: камни, очередь хода, этап, оставшиеся пары и камни в паре"""
+    keys = _splitmix64(seed)
+    piece_keys = tuple(tuple(next(keys) for _ in range(num_cells)) for _ in range(2))
+    side_key = next(keys)
+    stage_key = next(keys)
+    pairs_keys = tuple(tuple(next(keys) for _ in range(num_stones + 1)) for _ in range(2))
+    to_place_key = next(keys)
+    return piece_keys, side_key, stage_key, pairs_keys, to_place_key
+
+
+class Geometry:
+    """Размеры поля и параметры правил партии.
+
+    Маски краев строятся один раз на геометрию, ключи Зобриста - при первом
+    обращении к ним (импорт движка и разбор аргументов их не ждут); позиции с
+    одинаковой геометрией могут пользоваться одним объектом (``get_geometry``).
+    """
+
+    ZOBRIST_ATTRIBUTES = ("piece_keys", "side_key", "stage_key", "pairs_keys", "to_place_key")
+
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, num_stones=NUM_STONES,
+                 line_length=LINE_LENGTH, min_stones=MIN_STONES):
+        if width < 1 or height < 1 or line_length < 2 or num_stones < 1:
+            raise ValueError("Неверные размеры поля, число пар или длина линии")
+        if width > MAX_SIDE or height > MAX_SIDE:
+            raise ValueError(f"Слишком большое поле {width}x{height}")
+        if 4 * num_stones > width * height:
+            raise ValueError(f"Камни обоих игроков не помещаются на поле {width}x{height}")
+        if min_stones >= 2 * num_stones:
+            raise ValueError("Игроку не хватает камней даже на начало партии")
+        self.width = width
+        self.height = height
+        self.num_stones = num_stones
+        self.line_length = line_length
+        self.min_stones = min_stones
+        self.num_cells = width * height
+        self.full_mask = (1 << self.num_cells) - 1
+        self.row_mask = (1 << width) - 1
+        # Маски для сдвигов без перехода через край строки
+        first_col = sum(1 << (row * width) for row in range(height))
+        self.not_first_col = self.full_mask & ~first_col
+        self.not_last_col = self.full_mask & ~(first_col << (width - 1))
+        # Клетки первого столбца и клетка-ограничитель за верхним краем: по
+        # столбцу, сдвинутому к первому, цепочка камней ищется как по строке
+        self.col_stops = first_col | (1 << self.num_cells)
+
+    def __getattr__(self, name):
+        # Вызывается, только если атрибута еще нет: ключи Зобриста строятся
+        # при первом обращении и дальше читаются как обычные атрибуты
+        if name not in Geometry.ZOBRIST_ATTRIBUTES:
+            raise AttributeError(name)
+        # У стандартного поля прежние ключи (хеши в сохранениях остаются верными), у
+        # других вариантов свое зерно: хеши позиций разных вариантов не совпадают
+        seed = ZOBRIST_SEED
+        if self.key != (GRID_WIDTH, GRID_HEIGHT, NUM_STONES, LINE_LENGTH, MIN_STONES):
+            for value in self.key:
+                seed = next(_splitmix64(seed ^ value))
+        (self.piece_keys, self.side_key, self.stage_key, self.pairs_keys,
+         self.to_place_key) = build_zobrist_keys(self.num_cells, self.num_stones, seed)
+        return getattr(self, name)
+
+    @property
+    def key(self):
+        return (self.width, self.height, self.num_stones, self.line_length, self.min_stones)
+
+    def __eq__(self, other):
+        return isinstance(other, Geometry) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return (f"Geometry({self.width}x{self.height}, пар {self.num_stones}, "
+                f"линия {self.line_length})")
+
+    def describe(self):
+        return f"{self.width}x{self.height}, {self.num_stones} пар, линия {self.line_length}"
+
+    # Битборды целиком. Позиция пользуется своими масками строк и столбцов, а
+    # эти функции нужны для таблиц и инструментов: строка берется сдвигом, а
+    # цепочка по столбцу - по пустым клеткам столбца (col_stops) без обхода.
+
+    def row_bits(self, bb, row):
+        return (bb >> (row * self.width)) & self.row_mask
+
+    def col_bits(self, bb, col):
+        bits = 0
+        for row in range(self.height):
+            bits |= (bb >> (row * self.width + col) & 1) << row
+        return bits
+
+    def _column_run(self, bb, row, col):
+        """Первая и последняя строка цепочки камней bb по столбцу через (row, col).
+
+        Камень в клетке должен быть. Как run_bounds, только биты столбца идут
+        через width: начало - над старшей пустой клеткой ниже, конец - под
+        младшей пустой клеткой выше (или ограничителем за краем).
+        """
+        width = self.width
+        shift = row * width
+        empty = self.col_stops & ~(bb >> col)
+        above = empty >> shift
+        return (((empty & ((1 << shift) - 1)).bit_length() + width - 1) // width,
+                row + ((above & -above).bit_length() - 1) // width - 1)
+
+    def line_ends(self, row_bits, col_bits, row, col):
+        """Соседние клетки концов максимальной линии через (row, col) или None.
+
+        row_bits и col_bits - камни игрока в строке row и столбце col, включая
+        саму клетку. Горизонталь проверяется первой, как и в исходных правилах;
+        клетка за краем доски равна -1.
+        """
+        width = self.width
+        start, end = run_bounds(row_bits, col)
+        if end - start >= self.line_length - 1:
+            base = row * width
+            return (base + start - 1 if start > 0 else -1,
+                    base + end + 1 if end < width - 1 else -1)
+        start, end = run_bounds(col_bits, row)
+        if end - start >= self.line_length - 1:
+            return ((start - 1) * width + col if start > 0 else -1,
+                    (end + 1) * width + col if end < self.height - 1 else -1)
+        return None
+
+    def find_line(self, own, index):
+        """Линия из line_length+ камней через клетку: (направление, начало, конец) или None"""
+        if not own >> index & 1:
+            return None
+        row, col = divmod(index, self.width)
+        start, end = run_bounds((own >> (row * self.width)) & self.row_mask, col)
+        if end - start >= self.line_length - 1:
+            return (HORIZONTAL, start, end)
+        start, end = self._column_run(own, row, col)
+        if end - start >= self.line_length - 1:
+            return (VERTICAL, start, end)
+        return None
+
+    def makes_line(self, own, index):
+        """Образует ли камень в клетке index линию из line_length+ камней"""
+        own |= 1 << index
+        row, col = divmod(index, self.width)
+        start, end = run_bounds((own >> (row * self.width)) & self.row_mask, col)
+        if end - start >= self.line_length - 1:
+            return True
+        start, end = self._column_run(own, row, col)
+        return end - start >= self.line_length - 1
+
+    def capture_target(self, own, opp, index):
+        """Клетка камня, снимаемого после хода в index, или -1"""
+        for cell in self._line_ends(own, index):
+            if cell >= 0 and opp >> cell & 1:
+                return cell
+        return -1
+
+    def _line_ends(self, own, index):
+        """Соседние клетки концов линии через камень index (пусто, если линии нет)"""
+        line = self.find_line(own, index)
+        if line is None:
+            return ()
+        direction, start, end = line
+        width = self.width
+        if direction == HORIZONTAL:
+            base = index - index % width
+            return (base + start - 1 if start > 0 else -1,
+                    base + end + 1 if end < width - 1 else -1)
+        col = index % width
+        return ((start - 1) * width + col if start > 0 else -1,
+                (end + 1) * width + col if end < self.height - 1 else -1)
+
+
+STANDARD = Geometry()  # Стандартное поле 5x6
+_geometries = {STANDARD.key: STANDARD}
+
+
+def get_geometry(width=GRID_WIDTH, height=GRID_HEIGHT, num_stones=NUM_STONES,
+                 line_length=LINE_LENGTH, min_stones=MIN_STONES):
+    """Общий объект геометрии с такими параметрами (таблицы строятся один раз)"""
+    key = (width, height, num_stones, line_length, min_stones)
+    geometry = _geometries.get(key)
+    if geometry is None:
+        geometry = _geometries[key] = Geometry(*key)
+    return geometry
+
+
+def cell_index(row, col, geometry=STANDARD):
+    """Номер клетки по строке и столбцу"""
+    return row * geometry.width + col
+
+
+def cell_coords(index, geometry=STANDARD):
+    """Строка и столбец по номеру клетки"""
+    return divmod(index, geometry.width)
+
+
+def format_move(move):
+    """Запись хода как в журнале: "12" - постановка, "12-13" - перемещение"""
+    if move is None:
+        return "-"
+    frm, to = move >> MOVE_SHIFT, move & MOVE_MASK
+    return str(to) if frm == to else f"{frm}-{to}"
+
+
+def parse_move(text, geometry=STANDARD):
+    """Ход по записи format_move; ValueError, если запись неверна или клетки нет на поле"""
+    frm, _, to = text.partition("-")
+    frm = int(frm)
+    to = int(to) if to else frm
+    if not (0 <= frm < geometry.num_cells and 0 <= to < geometry.num_cells):
+        raise ValueError(f"Нет такой клетки: {text}")
+    return encode_move(frm, to)
+
+
+def find_line(own, index, geometry=STANDARD):
+    """Ищет линию через клетку по битборду: (направление, начало, конец) или None"""
+    return geometry.find_line(own, index)
+
+
+def makes_line(own, index, geometry=STANDARD):
+    """Образует ли камень в клетке index линию"""
+    return geometry.makes_line(own, index)
+
+
+def capture_target(own, opp, index, geometry=STANDARD):
+    """Клетка камня, снимаемого после хода в index, или -1"""
+    return geometry.capture_target(own, opp, index)
+
+
+class Position:
+    """Позиция игры: битборды, маски строк и столбцов, счетчики, хеш Зобриста и
+    стек отмены ходов.
+
+    Хеш ``hash`` обновляется при каждом ходе и учитывает камни, очередь хода,
+    этап, оставшиеся пары и то, какой камень пары ставится.
+    """
+
+    __slots__ = ("geometry", "bb", "rows", "cols", "current_player", "stage", "stones_to_place",
+                 "remaining_pairs", "stones_count", "winner", "history", "hash")
+
+    def __init__(self, geometry=STANDARD):
+        self.geometry = geometry
+        self.bb = [0, 0]
+        # rows[игрок][строка] - биты столбцов с камнями, cols[игрок][столбец] - биты строк
+        self.rows = [[0] * geometry.height, [0] * geometry.height]
+        self.cols = [[0] * geometry.width, [0] * geometry.width]
+        self.current_player = 0
+        self.stage = 1  # 1 - расстановка, 2 - перемещение
+        self.stones_to_place = 2  # Сколько камней осталось поставить в текущем ходу
+        self.remaining_pairs = [geometry.num_stones, geometry.num_stones]
+        self.stones_count = [0, 0]
+        self.winner = None
+        self.history = []
+        self.hash = self.compute_hash()
+
+    def set_boards(self, bb):
+        """Расставляет камни по битбордам; маски и счетчики камней пересчитываются.
+
+        Хеш не пересчитывается: его нужно посчитать после остальных полей.
+        """
+        geometry = self.geometry
+        self.bb = list(bb)
+        self.rows = [[geometry.row_bits(b, row) for row in range(geometry.height)] for b in bb]
+        self.cols = [[geometry.col_bits(b, col) for col in range(geometry.width)] for b in bb]
+        self.stones_count = [bin(b).count("1") for b in bb]
+
+    def compute_hash(self):
+        """Хеш позиции, посчитанный с нуля"""
+        geometry = self.geometry
+        value = 0
+        for player in (0, 1):
+            for index in iter_bits(self.bb[player]):
+                value ^= geometry.piece_keys[player][index]
+            value ^= geometry.pairs_keys[player][self.remaining_pairs[player]]
+        if self.current_player:
+            value ^= geometry.side_key
+        if self.stage == 2:
+            value ^= geometry.stage_key
+        if self.stones_to_place == 1:
+            value ^= geometry.to_place_key
+        return value
+
+    def copy(self, with_history=False):
+        """Копия позиции; история ходов копируется только по запросу"""
+        other = Position(self.geometry)
+        other.bb = self.bb[:]
+        other.rows = [self.rows[0][:], self.rows[1][:]]
+        other.cols = [self.cols[0][:], self.cols[1][:]]
+        other.current_player = self.current_player
+        other.stage = self.stage
+        other.stones_to_place = self.stones_to_place
+        other.remaining_pairs = self.remaining_pairs[:]
+        other.stones_count = self.stones_count[:]
+        other.winner = self.winner
+        other.hash = self.hash
+        if with_history:
+            other.history = self.history[:]
+        return other
+
+    def cell(self, row, col):
+        """Владелец клетки: 0, 1 или None"""
+        if self.rows[0][row] >> col & 1:
+            return 0
+        if self.rows[1][row] >> col & 1:
+            return 1
+        return None
+
+    def to_rows(self):
+        """Доска в виде списка строк со значениями None/0/1"""
+        return [[self.cell(row, col) for col in range(self.geometry.width)]
+                for row in range(self.geometry.height)]
+
+    def empty_mask(self):
+        return self.geometry.full_mask & ~(self.bb[0] | self.bb[1])
+
+    def is_legal_placement(self, index):
+        """Можно ли текущему игроку поставить камень в клетку"""
+        if self.stage != 1 or self.winner is not None:
+            return False
+        geometry = self.geometry
+        player = self.current_player
+        if not 0 <= index < geometry.num_cells or self.remaining_pairs[player] <= 0:
+            return False
+        row, col = divmod(index, geometry.width)
+        bits = self.rows[player][row]
+        if (bits | self.rows[1 - player][row]) >> col & 1:
+            return False
+        # Длина цепочки по строке и по столбцу, если поставить камень
+        limit = geometry.line_length - 1
+        bits |= 1 << col
+        above = bits >> col
+        if (col + (~above & (above + 1)).bit_length() - 2
+                - (~bits & ((1 << col) - 1)).bit_length()) >= limit:
+            return False
+        bits = self.cols[player][col] | (1 << row)
+        above = bits >> row
+        return (row + (~above & (above + 1)).bit_length() - 2
+                - (~bits & ((1 << row) - 1)).bit_length()) < limit
+
+    def is_legal_move(self, move):
+        """Проверяет ход текущего игрока"""
+        if self.winner is not None:
+            return False
+        if is_placement(move):
+            return self.is_legal_placement(move_to(move))
+        if self.stage != 2:
+            return False
+        geometry = self.geometry
+        frm, to = move_from(move), move_to(move)
+        if not (0 <= frm < geometry.num_cells and 0 <= to < geometry.num_cells):
+            return False
+        if not self.bb[self.current_player] >> frm & 1 or not self.empty_mask() >> to & 1:
+            return False
+        # Перемещение только на соседнюю клетку по горизонтали или вертикали
+        from_row, from_col = divmod(frm, geometry.width)
+        to_row, to_col = divmod(to, geometry.width)
+        return abs(from_row - to_row) + abs(from_col - to_col) == 1
+
+    def legal_moves(self):
+        """Список допустимых ходов текущего игрока"""
+        if self.winner is not None:
+            return []
+        player = self.current_player
+        geometry = self.geometry
+        empty = self.empty_mask()
+        moves = []
+        if self.stage == 1:
+            if self.remaining_pairs[player] > 0:
+                rows = self.rows[player]
+                cols = self.cols[player]
+                width = geometry.width
+                limit = geometry.line_length - 1
+                for to in iter_bits(empty):
+                    # Длина цепочки через клетку, если поставить в нее камень
+                    row, col = divmod(to, width)
+                    bits = rows[row] | (1 << col)
+                    above = bits >> col
+                    if (col + (~above & (above + 1)).bit_length() - 2
+                            - (~bits & ((1 << col) - 1)).bit_length()) >= limit:
+                        continue
+                    bits = cols[col] | (1 << row)
+                    above = bits >> row
+                    if (row + (~above & (above + 1)).bit_length() - 2
+                            - (~bits & ((1 << row) - 1)).bit_length()) >= limit:
+                        continue
+                    moves.append((to << MOVE_SHIFT) | to)
+            return moves
+
+        own = self.bb[player]
+        width = geometry.width
+        for shift, source in ((1, own & geometry.not_last_col), (width, own)):
+            # Вправо и вниз
+            targets = (source << shift) & empty
+            while targets:
+                low = targets & -targets
+                to = low.bit_length() - 1
+                moves.append(((to - shift) << MOVE_SHIFT) | to)
+                targets ^= low
+        for shift, source in ((1, own & geometry.not_first_col), (width, own)):
+            # Влево и вверх
+            targets = (source >> shift) & empty
+            while targets:
+                low = targets & -targets
+                to = low.bit_length() - 1
+                moves.append(((to + shift) << MOVE_SHIFT) | to)
+                targets ^= low
+        return moves
+
+    def _capture(self, player, to):
+        """Клетка камня соперника, снимаемого линией через to, и есть ли линия.
+
+        Камень игрока уже стоит в to; соперник проверяется по его маскам строк.
+        """
+        geometry = self.geometry
+        width = geometry.width
+        row, col = divmod(to, width)
+        ends = geometry.line_ends(self.rows[player][row], self.cols[player][col], row, col)
+        if ends is None:
+            return -1, False
+        opp_rows = self.rows[1 - player]
+        for cell in ends:
+            if cell >= 0 and opp_rows[cell // width] >> (cell % width) & 1:
+                return cell, True
+        return -1, True
+
+    def capture_of(self, move):
+        """Клетка, которую снимет перемещение move, или -1 (без выполнения хода)"""
+        frm = move >> MOVE_SHIFT
+        to = move & MOVE_MASK
+        if frm == to:
+            return -1
+        width = self.geometry.width
+        player = self.current_player
+        rows, cols = self.rows[player], self.cols[player]
+        from_row, from_col = divmod(frm, width)
+        to_row, to_col = divmod(to, width)
+        # Временно переносим камень в масках и возвращаем обратно
+        rows[from_row] ^= 1 << from_col
+        cols[from_col] ^= 1 << from_row
+        rows[to_row] |= 1 << to_col
+        cols[to_col] |= 1 << to_row
+        captured = self._capture(player, to)[0]
+        rows[to_row] &= ~(1 << to_col)
+        cols[to_col] &= ~(1 << to_row)
+        rows[from_row] |= 1 << from_col
+        cols[from_col] |= 1 << from_row
+        return captured
+
+    def make_move(self, move):
+        """Выполняет ход и возвращает клетку снятого камня или -1.
+
+        Ход должен быть допустимым; проверка не выполняется.
+        """
+        player = self.current_player
+        opponent = 1 - player
+        geometry = self.geometry
+        width = geometry.width
+        frm = move >> MOVE_SHIFT
+        to = move & MOVE_MASK
+        bit = 1 << to
+        to_row, to_col = divmod(to, width)
+
+        if frm == to:
+            # Расстановка
+            self.history.append(MoveDelta(move, -1, False, self.stage, self.stones_to_place,
+                                          self.remaining_pairs[player], self.winner, self.hash))
+            self.bb[player] |= bit
+            self.rows[player][to_row] |= 1 << to_col
+            self.cols[player][to_col] |= 1 << to_row
+            self.stones_count[player] += 1
+            h = self.hash ^ geometry.piece_keys[player][to] ^ geometry.to_place_key
+            self.stones_to_place -= 1
+            if self.stones_to_place == 0:
+                pairs = self.remaining_pairs[player]
+                keys = geometry.pairs_keys[player]
+                h ^= keys[pairs] ^ keys[pairs - 1] ^ geometry.side_key
+                self.remaining_pairs[player] = pairs - 1
+                self.stones_to_place = 2
+                self.current_player = opponent
+            if self.remaining_pairs[0] + self.remaining_pairs[1] == 0:
+                self.stage = 2
+                h ^= geometry.stage_key
+            self.hash = h
+            return -1
+
+        # Перемещение. Клетка to до хода была пуста, поэтому любая линия через
+        # нее образована именно этим ходом - старую доску хранить не нужно.
+        from_row, from_col = divmod(frm, width)
+        rows, cols = self.rows[player], self.cols[player]
+        rows[from_row] ^= 1 << from_col
+        cols[from_col] ^= 1 << from_row
+        rows[to_row] |= 1 << to_col
+        cols[to_col] |= 1 << to_row
+        self.bb[player] = (self.bb[player] & ~(1 << frm)) | bit
+        captured, line_formed = self._capture(player, to)
+        self.history.append(MoveDelta(move, captured, line_formed, self.stage,
+                                      self.stones_to_place, self.remaining_pairs[player],
+                                      self.winner, self.hash))
+        keys = geometry.piece_keys[player]
+        h = self.hash ^ keys[frm] ^ keys[to] ^ geometry.side_key
+        if captured >= 0:
+            captured_row, captured_col = divmod(captured, width)
+            self.bb[opponent] &= ~(1 << captured)
+            self.rows[opponent][captured_row] &= ~(1 << captured_col)
+            self.cols[opponent][captured_col] &= ~(1 << captured_row)
+            self.stones_count[opponent] -= 1
+            h ^= geometry.piece_keys[opponent][captured]
+            if self.stones_count[opponent] <= geometry.min_stones:
+                self.winner = player
+        self.current_player = opponent
+        self.hash = h
+        return captured
+
+    def unmake_move(self):
+        """Отменяет последний ход и возвращает его запись MoveDelta"""
+        delta = self.history.pop()
+        move, captured, _, stage, stones_to_place, pairs, winner, h = delta
+        width = self.geometry.width
+        frm = move >> MOVE_SHIFT
+        to = move & MOVE_MASK
+        to_row, to_col = divmod(to, width)
+        self.stage = stage
+        self.winner = winner
+        self.hash = h
+
+        if frm == to:
+            if stones_to_place == 1:
+                # Ход переходил к сопернику после второго камня
+                self.current_player = 1 - self.current_player
+            player = self.current_player
+            self.bb[player] &= ~(1 << to)
+            self.rows[player][to_row] &= ~(1 << to_col)
+            self.cols[player][to_col] &= ~(1 << to_row)
+            self.stones_count[player] -= 1
+            self.stones_to_place = stones_to_place
+            self.remaining_pairs[player] = pairs
+            return delta
+
+        self.current_player = player = 1 - self.current_player
+        from_row, from_col = divmod(frm, width)
+        rows, cols = self.rows[player], self.cols[player]
+        rows[to_row] &= ~(1 << to_col)
+        cols[to_col] &= ~(1 << to_row)
+        rows[from_row] |= 1 << from_col
+        cols[from_col] |= 1 << from_row
+        self.bb[player] = (self.bb[player] & ~(1 << to)) | (1 << frm)
+        if captured >= 0:
+            captured_row, captured_col = divmod(captured, width)
+            self.bb[1 - player] |= 1 << captured
+            self.rows[1 - player][captured_row] |= 1 << captured_col
+            self.cols[1 - player][captured_col] |= 1 << captured_row
+            self.stones_count[1 - player] += 1
+        return delta
+
+    def redo_move(self, delta):
+        """Повторяет отмененный ход по его записи"""
+        return self.make_move(delta.move)
+
+    def last_delta(self):
+        """Запись последнего хода или None"""
+        return self.history[-1] if self.history else None
+
+    def repetition_count(self):
+        """Сколько раз текущая позиция встречалась в партии (включая текущую).
+
+        Поиск идет назад до последнего необратимого хода: постановки или взятия.
+        """
+        count = 1
+        h = self.hash
+        for delta in reversed(self.history):
+            move = delta.move
+            if delta.captured >= 0 or (move >> MOVE_SHIFT) == (move & MOVE_MASK):
+                break
+            if delta.hash == h:
+                count += 1
+        return count
+
+    def is_draw(self):
+        """Ничья по повторению позиции"""
+        return self.winner is None and self.repetition_count() >= REPETITION_LIMIT
+
+    def is_game_over(self):
+        """Игра окончена: есть победитель, ничья или у текущего игрока нет ходов"""
+        return self.winner is not None or self.is_draw() or not self.legal_moves()
+
+    def result(self):
+        """Победитель (0 или 1) или None, если игра продолжается.
+
+        Игрок, которому некуда ходить, проигрывает.
+        """
+        if self.winner is not None:
+            return self.winner
+        if not self.legal_moves():
+            return 1 - self.current_player
+        return None
@@ -0,0 +1,151 @@
+"""Нагрузочный тест сервера сетевой игры.
+
+Запускает множество клиентов в одном цикле asyncio. Клиенты парами играют
+случайными допустимыми ходами (у каждого своя копия позиции) и замеряют время
+от отправки MOVE до ответа ACK. В конце печатаются ходы в секунду и p50/p99
+подтверждения хода.
+
+С ``--local`` сервер поднимается в том же процессе на свободном порту с копией
+базы во временном каталоге - весь тест идет на localhost.
+
+Пример: python loadgen.py --local --clients 2000 --games 3
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from engine import Position, format_move, parse_move
+from network import SERVER_HOST, SERVER_PORT, encode_line, decode_line
+from profiling import Histogram
+from server import MAX_PLIES, GameServer
+from storage import DATABASE_FILE
+
+
+class LoadStats:
+    def __init__(self):
+        self.acks = Histogram()  # Задержки подтверждения хода, нс
+        self.moves = 0
+        self.games = 0
+        self.errors = 0
+        self.connected = 0
+
+
+async def run_client(host, port, games, seed, stats):
+    """Один клиент: вход гостем и games партий случайными ходами"""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    stats.connected += 1
+
+    async def receive():
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("сервер закрыл соединение")
+        return decode_line(line)
+
+    try:
+        writer.write(encode_line("GUEST"))
+        await receive()
+        for _ in range(games):
+            writer.write(encode_line("PLAY"))
+            position = None
+            color = None
+            sent_at = None
+            while True:
+                message = await receive()
+                kind = message[0]
+                if kind == "START":
+                    position = Position()
+                    color = int(message[2])
+                elif kind == "MOVE":
+                    position.make_move(parse_move(message[2]))
+                elif kind == "ACK":
+                    stats.acks.record(time.perf_counter_ns() - sent_at)
+                    stats.moves += 1
+                    sent_at = None
+                elif kind == "END":
+                    stats.games += 1
+                    break
+                elif kind == "ERR":
+                    stats.errors += 1
+                    sent_at = None
+                # Ход, только если партия не окончена и по мнению сервера
+                if (position is not None and sent_at is None and position.current_player == color
+                        and len(position.history) < MAX_PLIES and not position.is_draw()):
+                    moves = position.legal_moves()
+                    if moves:
+                        move = rng.choice(moves)
+                        position.make_move(move)
+                        sent_at = time.perf_counter_ns()
+                        writer.write(encode_line("MOVE", format_move(move)))
+    finally:
+        writer.close()
+
+
+def raise_file_limit():
+    """Поднимает лимит открытых файлов: на каждого клиента нужен сокет"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def run_load(host, port, clients, games, seed=0, local=False, database=DATABASE_FILE):
+    game_server = None
+    directory = None
+    if local:
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "load.db")
+        if os.path.exists(database):
+            shutil.copyfile(database, path)
+        game_server = GameServer(path)
+        await game_server.start(host, 0)
+        port = game_server.port
+
+    stats = LoadStats()
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(run_client(host, port, games, seed + number, stats)
+                                         for number in range(clients)), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        failures = [result for result in results if isinstance(result, BaseException)]
+    finally:
+        if game_server is not None:
+            await game_server.close()
+            shutil.rmtree(directory, ignore_errors=True)
+    return stats, elapsed, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервера Болотуду")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--clients", type=int, default=200, help="одновременных клиентов (четное число)")
+    parser.add_argument("--games", type=int, default=1, help="партий на клиента")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--local", action="store_true", help="поднять сервер в этом же процессе")
+    parser.add_argument("--database", default=DATABASE_FILE, help="база, копия которой нужна серверу --local")
+    args = parser.parse_args(argv)
+    if args.clients % 2:
+        parser.error("клиенты играют парами: нужно четное --clients")
+
+    raise_file_limit()
+    stats, elapsed, failures = asyncio.run(run_load(args.host, args.port, args.clients, args.games,
+                                                    args.seed, args.local, args.database))
+    print(f"клиентов {stats.connected}/{args.clients}, партий {stats.games // 2}, ходов {stats.moves}, "
+          f"ошибок {stats.errors + len(failures)}, {elapsed:.1f} с")
+    print(f"{stats.moves / elapsed:.0f} ходов/с, подтверждение хода: p50 {stats.acks.percentile(50) / 1e6:.2f} мс, "
+          f"p99 {stats.acks.percentile(99) / 1e6:.2f} мс, макс {stats.acks.max / 1e6:.2f} мс")
+    if failures:
+        print(f"первая ошибка клиента: {failures[0]!r}")
+
+
+if __name__ == "__main__":
+    main()
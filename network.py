@@ -0,0 +1,135 @@
+"""Протокол сетевой игры и клиент для окна Tk.
+
+Протокол текстовый: одна команда в строке (UTF-8), части через пробел. Ход
+записывается как в журнале: ``12`` - постановка в клетку 12, ``12-13`` -
+перемещение. Пробелы и знак ``%`` внутри части (имена, пароли, тексты
+ошибок) передаются как ``%XX`` - байты UTF-8, так что "Иван Петров" остается
+одной частью.
+
+Клиент -> сервер::
+
+    GUEST                     войти гостем
+    LOGIN имя пароль          войти
+    REGISTER имя пароль       зарегистрироваться и войти
+    PLAY                      встать в очередь на партию
+    MOVE ход                  сделать ход
+    RESIGN                    сдаться
+    PING
+
+Сервер -> клиент::
+
+    OK имя                    вход выполнен
+    ERR текст                 команда отклонена
+    WAIT                      соперник ищется
+    START партия цвет соперник
+    ACK номер                 ход принят (номер хода в партии)
+    MOVE номер ход            ход соперника
+    END результат причина     партия окончена: 0, 1 - победитель, 2 - ничья
+    PONG
+"""
+
+import queue
+import socket
+import threading
+
+from engine import format_move
+
+SERVER_HOST = "127.0.0.1"  # Адрес сервера по умолчанию
+SERVER_PORT = 8765  # Порт сервера по умолчанию
+CONNECT_TIMEOUT = 5.0  # Сколько секунд ждать подключения
+MAX_LINE = 256  # Длиннее строк в протоколе не бывает
+HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+# Причины окончания партии в END
+END_FINISHED = "finished"
+END_RESIGN = "resign"
+END_DISCONNECT = "disconnect"
+
+
+def quote_part(text):
+    """Часть команды без пробелов: пробельные символы и % - как %XX"""
+    return "".join("".join(f"%{byte:02X}" for byte in char.encode("utf-8"))
+                   if char.isspace() or char == "%" else char for char in text)
+
+
+def unquote_part(text):
+    """Обратно к quote_part; неверные %XX остаются как есть"""
+    if "%" not in text:
+        return text
+    pieces = text.split("%")
+    data = bytearray(pieces[0].encode("utf-8"))
+    for piece in pieces[1:]:
+        if len(piece) >= 2 and piece[0] in HEX_DIGITS and piece[1] in HEX_DIGITS:
+            data.append(int(piece[:2], 16))
+            piece = piece[2:]
+        else:
+            data.append(ord("%"))
+        data += piece.encode("utf-8")
+    return data.decode("utf-8", "replace")
+
+
+def encode_line(*parts):
+    return (" ".join(quote_part(str(part)) for part in parts) + "\n").encode("utf-8")
+
+
+def decode_line(line):
+    return [unquote_part(part) for part in line.decode("utf-8", "replace").split()]
+
+
+class GameClient:
+    """Подключение окна к серверу.
+
+    Сокет читается в отдельном потоке, сообщения складываются в очередь, а
+    окно забирает их таймером через ``poll``. Конец соединения - сообщение
+    None.
+    """
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, timeout=CONNECT_TIMEOUT):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.messages = queue.Queue()
+        self.closed = False
+        self.thread = threading.Thread(target=self._read, name="bolotudu-network", daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        try:
+            with self.sock.makefile("rb") as file:
+                for line in file:
+                    self.messages.put(decode_line(line))
+        except OSError:
+            pass
+        self.messages.put(None)
+
+    def send(self, *parts):
+        """Отправляет команду; False, если соединение уже закрыто"""
+        if self.closed:
+            return False
+        try:
+            self.sock.sendall(encode_line(*parts))
+        except OSError:
+            return False
+        return True
+
+    def send_move(self, move):
+        return self.send("MOVE", format_move(move))
+
+    def poll(self):
+        """Все пришедшие сообщения без ожидания"""
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
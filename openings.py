@@ -0,0 +1,228 @@
+"""Дебютная книга этапа расстановки.
+
+Поле 5x6 не меняется при отражении слева направо и сверху вниз, поэтому
+позиция и ее три отражения - одна и та же позиция. В книге хранится только
+каноническая форма: из четырех вариантов пары битбордов берется наименьший
+ключ ``bb[0] | bb[1] << NUM_CELLS``. На этапе расстановки по битбордам
+однозначно восстанавливается все остальное (чей ход, какой камень пары).
+
+Файл книги: заголовок, отсортированные ключи (по 8 байт), ходы в канонической
+форме (номер клетки, 1 байт) и оценки (4 байта). Поиск - двоичный по ключам
+в файле, отображенном через ``mmap``. Книга строится для стандартного поля;
+в партиях других вариантов она не используется.
+
+Книгу строит ``python openings.py`` перебором всех позиций с небольшим числом
+камней на пуле процессов.
+
+Пример: python openings.py --stones 3 --depth 3
+"""
+
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+
+from engine import (GRID_WIDTH, GRID_HEIGHT, NUM_CELLS, NUM_STONES, FULL_MASK, STANDARD, Position,
+                    encode_placement, move_to, is_placement)
+from ai import Searcher
+
+BOOK_FILE = "bolotudu.book"  # Файл дебютной книги
+BOOK_STONES = 3  # Книга покрывает позиции, где на поле не больше стольких камней
+BOOK_DEPTH = 3  # Глубина поиска для каждой позиции книги
+
+MAGIC = b"BLBK"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBI")  # метка, версия, ширина, высота, число позиций
+KEY = struct.Struct("<Q")
+
+ROW_MASK = (1 << GRID_WIDTH) - 1
+_REVERSED_ROWS = tuple(int(format(bits, f"0{GRID_WIDTH}b")[::-1], 2) for bits in range(1 << GRID_WIDTH))
+
+# Симметрии поля: (отражение столбцов, отражение строк); каждая обратна сама себе
+SYMMETRIES = ((False, False), (True, False), (False, True), (True, True))
+
+
+def mirror_bits(bb, flip_cols, flip_rows):
+    """Битборд после отражения поля"""
+    result = 0
+    for row in range(GRID_HEIGHT):
+        bits = (bb >> (row * GRID_WIDTH)) & ROW_MASK
+        if flip_cols:
+            bits = _REVERSED_ROWS[bits]
+        result |= bits << ((GRID_HEIGHT - 1 - row if flip_rows else row) * GRID_WIDTH)
+    return result
+
+
+def mirror_cell(index, flip_cols, flip_rows):
+    row, col = divmod(index, GRID_WIDTH)
+    if flip_cols:
+        col = GRID_WIDTH - 1 - col
+    if flip_rows:
+        row = GRID_HEIGHT - 1 - row
+    return row * GRID_WIDTH + col
+
+
+def canonical_key(bb):
+    """(канонический ключ, симметрия, которая к нему приводит) для пары битбордов"""
+    return min((mirror_bits(bb[0], *symmetry) | mirror_bits(bb[1], *symmetry) << NUM_CELLS, symmetry)
+               for symmetry in SYMMETRIES)
+
+
+def position_from_key(key):
+    """Позиция этапа расстановки по ключу книги"""
+    position = Position()
+    position.set_boards([key & FULL_MASK, key >> NUM_CELLS])
+    counts = position.stones_count
+    placed = counts[0] + counts[1]
+    # Игроки ставят камни парами по очереди, первым - игрок 0
+    position.current_player = (placed // 2) % 2
+    position.stones_to_place = 2 - placed % 2
+    position.remaining_pairs = [NUM_STONES - count // 2 for count in counts]
+    position.hash = position.compute_hash()
+    return position
+
+
+class OpeningBook:
+    """Дебютная книга, отображенная в память"""
+
+    def __init__(self, path=BOOK_FILE):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, height, self.count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Это не дебютная книга Болотуду")
+        if (width, height) != (GRID_WIDTH, GRID_HEIGHT):
+            raise ValueError(f"Книга построена для поля {width}x{height}")
+        self.keys_offset = HEADER.size
+        self.moves_offset = self.keys_offset + KEY.size * self.count
+        self.scores_offset = self.moves_offset + self.count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        # Последовательность ключей для bisect без чтения файла целиком
+        return KEY.unpack_from(self.data, self.keys_offset + KEY.size * index)[0]
+
+    def lookup(self, position):
+        """(ход, оценка) из книги для позиции или None"""
+        if position.stage != 1 or position.winner is not None or position.geometry != STANDARD:
+            return None
+        key, symmetry = canonical_key(position.bb)
+        index = bisect.bisect_left(self, key)
+        if index == self.count or self[index] != key:
+            return None
+        cell = mirror_cell(self.data[self.moves_offset + index], *symmetry)
+        score = struct.unpack_from("<i", self.data, self.scores_offset + 4 * index)[0]
+        move = encode_placement(cell)
+        if not position.is_legal_move(move):
+            return None
+        return move, score
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+_books = {}
+_books_lock = threading.Lock()
+
+
+def get_book(path=BOOK_FILE):
+    """Общая для процесса книга из файла path или None, если файла нет"""
+    with _books_lock:
+        if path not in _books:
+            try:
+                _books[path] = OpeningBook(path)
+            except FileNotFoundError:
+                _books[path] = None
+        return _books[path]
+
+
+# Построение книги
+
+def enumerate_positions(max_stones):
+    """Канонические ключи всех позиций расстановки с не более чем max_stones камнями.
+
+    Возвращает (ключи, число позиций без учета симметрий).
+    """
+    level = {canonical_key([0, 0])[0]}
+    keys = set(level)
+    raw = 1
+    for _ in range(max_stones):
+        children = set()
+        for key in level:
+            position = position_from_key(key)
+            for move in position.legal_moves():
+                position.make_move(move)
+                children.add(canonical_key(position.bb)[0])
+                position.unmake_move()
+        # Сколько различных позиций дают отражения канонических
+        raw += sum(len({mirror_bits(key & FULL_MASK, *symmetry)
+                        | mirror_bits(key >> NUM_CELLS, *symmetry) << NUM_CELLS
+                        for symmetry in SYMMETRIES}) for key in children)
+        keys |= children
+        level = children
+    return sorted(keys), raw
+
+
+def _search_position(task):
+    """Ищет ход для одной позиции книги; выполняется в процессе пула"""
+    key, depth = task
+    result = Searcher().search(position_from_key(key), time_limit=None, max_depth=depth)
+    return key, result.move, result.score
+
+
+def write_book(path, entries):
+    """Записывает отсортированные записи (ключ, клетка, оценка) в файл книги"""
+    count = len(entries)
+    with open(path + ".tmp", "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, GRID_WIDTH, GRID_HEIGHT, count))
+        file.write(struct.pack(f"<{count}Q", *(key for key, _, _ in entries)))
+        file.write(bytes(cell for _, cell, _ in entries))
+        file.write(struct.pack(f"<{count}i", *(score for _, _, score in entries)))
+    os.replace(path + ".tmp", path)
+
+
+def build_book(max_stones=BOOK_STONES, depth=BOOK_DEPTH, path=BOOK_FILE, workers=None, log=print):
+    """Строит книгу для позиций, где на поле не больше max_stones камней"""
+    # Пул процессов нужен только здесь: окно и cli.py книгу лишь читают
+    import multiprocessing
+
+    start = time.perf_counter()
+    keys, raw = enumerate_positions(max_stones)
+    log(f"позиций: {len(keys)} с учетом симметрий, {raw} без учета")
+    entries = []
+    workers = workers or os.cpu_count() or 1
+    with multiprocessing.Pool(workers) as pool:
+        tasks = ((key, depth) for key in keys)
+        for done, (key, move, score) in enumerate(
+                pool.imap_unordered(_search_position, tasks, chunksize=16), 1):
+            if move is not None and is_placement(move):
+                entries.append((key, move_to(move), score))
+            if done % 1000 == 0:
+                log(f"{done}/{len(keys)} позиций, {time.perf_counter() - start:.0f} с")
+    entries.sort()
+    write_book(path, entries)
+    log(f"книга: {len(entries)} позиций, {os.path.getsize(path)} байт, "
+        f"{time.perf_counter() - start:.1f} с")
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Построение дебютной книги Болотуду")
+    parser.add_argument("--stones", type=int, default=BOOK_STONES,
+                        help="книга для позиций, где на поле не больше стольких камней")
+    parser.add_argument("--depth", type=int, default=BOOK_DEPTH, help="глубина поиска для позиции")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument("--output", default=BOOK_FILE)
+    args = parser.parse_args(argv)
+    build_book(args.stones, args.depth, args.output, args.workers)
+
+
+if __name__ == "__main__":
+    main()
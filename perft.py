@@ -0,0 +1,190 @@
+"""Подсчет листьев дерева ходов (perft) для проверки генератора ходов.
+
+``perft(position, depth)`` перебирает все последовательности из depth ходов и
+считает конечные позиции, а также сколько последних ходов сняли камень и
+сколько закончили партию. Числа зависят только от правил, поэтому любая новая
+реализация движка должна давать те же значения, что записаны в
+``REFERENCE_COUNTS`` (они сверены с исходными правилами из cdd.py).
+
+Ничья по повторению позиций не учитывается - считается генерация ходов.
+
+Примеры:
+    python perft.py --depth 4
+    python perft.py --position movement --depth 5 --memo --divide
+    python perft.py --verify
+"""
+
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+from engine import Position, format_move, parse_move
+
+PerftResult = namedtuple("PerftResult", "nodes captures wins")
+
+# Позиции для проверки: последовательности ходов от начала партии
+REFERENCE_POSITIONS = {
+    "start": "",
+    "placement": "27 12 25 14 1 9 20 21 16 11 26 18 19 4",
+    "movement": "27 12 25 14 1 9 20 21 16 11 26 18 19 4 13 3 8 5 2 17 24 28 6 10",
+    "endgame": ("11 20 16 26 8 18 6 9 15 14 5 25 1 0 2 19 3 22 28 13 12 7 24 23 22-17 28-29 "
+                "15-10 16-15 11-16 29-28 16-15 28-27 0-5 26-21 12-13 27-26 15-16 26-25 16-15 "
+                "6-11 5-6 21-16"),
+}
+
+# (позиция, глубина) -> (листья, взятия, выигрыши)
+REFERENCE_COUNTS = {
+    ("start", 1): (30, 0, 0),
+    ("start", 2): (870, 0, 0),
+    ("start", 3): (24360, 0, 0),
+    ("start", 4): (657720, 0, 0),
+    ("placement", 1): (14, 0, 0),
+    ("placement", 2): (176, 0, 0),
+    ("placement", 3): (2010, 0, 0),
+    ("placement", 4): (18628, 0, 0),
+    ("movement", 1): (10, 3, 0),
+    ("movement", 2): (74, 6, 0),
+    ("movement", 3): (761, 164, 0),
+    ("movement", 4): (6210, 974, 0),
+    ("movement", 5): (64410, 10352, 0),
+    ("endgame", 1): (17, 0, 0),
+    ("endgame", 2): (83, 0, 0),
+    ("endgame", 3): (1455, 25, 25),
+    ("endgame", 4): (7703, 0, 0),
+    ("endgame", 5): (141661, 4123, 4123),
+}
+
+
+def parse_moves(text):
+    """Ходы в записи format_move ("12" - постановка, "12-13" - перемещение)"""
+    return [parse_move(token) for token in text.split()]
+
+
+def position_after(moves):
+    """Позиция после последовательности ходов с проверкой их допустимости"""
+    position = Position()
+    for move in moves:
+        if not position.is_legal_move(move):
+            raise ValueError(f"Недопустимый ход {format_move(move)}")
+        position.make_move(move)
+    return position
+
+
+def perft(position, depth):
+    """Листья, взятия и выигрыши на глубине depth (позиция восстанавливается)"""
+    if depth == 0:
+        return PerftResult(1, 0, 0)
+    nodes = captures = wins = 0
+    for move in position.legal_moves():
+        captured = position.make_move(move)
+        if depth == 1:
+            nodes += 1
+            captures += captured >= 0
+            wins += position.winner is not None
+        else:
+            result = perft(position, depth - 1)
+            nodes += result.nodes
+            captures += result.captures
+            wins += result.wins
+        position.unmake_move()
+    return PerftResult(nodes, captures, wins)
+
+
+def perft_memo(position, depth, cache=None):
+    """perft с запоминанием результатов для уже встреченных позиций.
+
+    Ключ - полное состояние позиции, а не хеш, чтобы коллизия не исказила счет.
+    """
+    if cache is None:
+        cache = {}
+    if depth == 0:
+        return PerftResult(1, 0, 0)
+    key = (position.bb[0], position.bb[1], position.current_player, position.stones_to_place,
+           position.remaining_pairs[0], position.remaining_pairs[1], depth)
+    result = cache.get(key)
+    if result is not None:
+        return result
+    nodes = captures = wins = 0
+    for move in position.legal_moves():
+        captured = position.make_move(move)
+        if depth == 1:
+            nodes += 1
+            captures += captured >= 0
+            wins += position.winner is not None
+        else:
+            child = perft_memo(position, depth - 1, cache)
+            nodes += child.nodes
+            captures += child.captures
+            wins += child.wins
+        position.unmake_move()
+    result = cache[key] = PerftResult(nodes, captures, wins)
+    return result
+
+
+def divide(position, depth, memo=False):
+    """Счет листьев отдельно для каждого первого хода"""
+    cache = {}
+    counts = []
+    for move in position.legal_moves():
+        position.make_move(move)
+        if memo:
+            counts.append((move, perft_memo(position, depth - 1, cache)))
+        else:
+            counts.append((move, perft(position, depth - 1)))
+        position.unmake_move()
+    return counts
+
+
+def timed_perft(position, depth, memo=False):
+    """(результат, секунд)"""
+    start = time.perf_counter()
+    result = perft_memo(position, depth) if memo else perft(position, depth)
+    return result, time.perf_counter() - start
+
+
+def verify(memo=False, max_nodes=None, out=print):
+    """Сверяет perft со всеми эталонными числами; возвращает число расхождений"""
+    failures = 0
+    for (name, depth), expected in sorted(REFERENCE_COUNTS.items()):
+        if max_nodes is not None and expected[0] > max_nodes:
+            continue
+        result, elapsed = timed_perft(position_after(parse_moves(REFERENCE_POSITIONS[name])), depth, memo)
+        ok = tuple(result) == tuple(expected)
+        failures += not ok
+        nps = int(result.nodes / elapsed) if elapsed > 0 else 0
+        out(f"{name:<10}{depth:>3}{result.nodes:>12}{result.captures:>10}{result.wins:>8}"
+            f"{nps:>12} листьев/с  {'ок' if ok else f'ОШИБКА, ожидалось {tuple(expected)}'}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Подсчет листьев дерева ходов Болотуду")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--position", choices=sorted(REFERENCE_POSITIONS), default="start",
+                        help="начальная позиция из набора эталонных")
+    parser.add_argument("--moves", default="", help='ходы после начальной позиции: "12 7 12-13"')
+    parser.add_argument("--memo", action="store_true", help="запоминать уже посчитанные позиции")
+    parser.add_argument("--divide", action="store_true", help="счет по каждому первому ходу")
+    parser.add_argument("--verify", action="store_true", help="сверить с эталонными числами")
+    parser.add_argument("--max-nodes", type=int, default=None,
+                        help="при --verify пропускать проверки с большим числом листьев")
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        failures = verify(args.memo, args.max_nodes)
+        print("Все проверки пройдены" if not failures else f"Расхождений: {failures}")
+        sys.exit(1 if failures else 0)
+
+    position = position_after(parse_moves(REFERENCE_POSITIONS[args.position]) + parse_moves(args.moves))
+    if args.divide:
+        for move, result in divide(position, args.depth, args.memo):
+            print(f"{format_move(move):>8}: {result.nodes}")
+    result, elapsed = timed_perft(position, args.depth, args.memo)
+    nps = int(result.nodes / elapsed) if elapsed > 0 else 0
+    print(f"листьев {result.nodes}, взятий {result.captures}, выигрышей {result.wins}, "
+          f"{elapsed:.2f} с, {nps} листьев/с")
+
+
+if __name__ == "__main__":
+    main()
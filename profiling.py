@@ -0,0 +1,181 @@
+"""Замеры времени в горячих местах игры.
+
+Обработчики окна, отрисовка, анимации и запросы к базе помечены ``timed``
+(или ``span`` для части функции). Пока замеры выключены, обертка лишь
+проверяет флаг и вызывает функцию. Включенные замеры складывают время каждого
+вызова в гистограмму своего этапа: корзины идут по степеням двойки,
+каждая делится на ``SUB_BUCKETS`` частей, поэтому p50 и p99 считаются с
+точностью около 20% без хранения отдельных замеров.
+
+Замеры включаются переменной окружения ``BOLOTUDU_PROFILE`` или клавишей F12
+в окне игры; гистограммы выгружаются в JSON для разбора вне игры.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+ENABLE_VARIABLE = "BOLOTUDU_PROFILE"  # Непустое значение включает замеры при запуске
+PROFILE_FILE = "bolotudu_profile.json"  # Файл выгрузки гистограмм
+SUB_BUCKETS = 4  # Частей в каждой степени двойки
+SUB_BITS = 2
+
+
+def bucket_of(ns):
+    """Номер корзины для длительности в наносекундах"""
+    if ns < SUB_BUCKETS:
+        return max(ns, 0)
+    bits = ns.bit_length() - 1
+    return (bits - SUB_BITS + 1) * SUB_BUCKETS + ((ns >> (bits - SUB_BITS)) & (SUB_BUCKETS - 1))
+
+
+def bucket_bounds(bucket):
+    """Границы корзины [нижняя, верхняя) в наносекундах"""
+    if bucket < SUB_BUCKETS:
+        return bucket, bucket + 1
+    bits = bucket // SUB_BUCKETS + SUB_BITS - 1
+    step = 1 << (bits - SUB_BITS)
+    lower = (1 << bits) + (bucket % SUB_BUCKETS) * step
+    return lower, lower + step
+
+
+class Histogram:
+    """Гистограмма длительностей одного этапа"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        bucket = bucket_of(ns)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q):
+        """Оценка q-го процентиля в наносекундах (середина корзины)"""
+        if not self.count:
+            return 0
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                lower, upper = bucket_bounds(bucket)
+                return min((lower + upper) / 2, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total / 1e6,
+            "max_ms": self.max / 1e6,
+            "p50_ms": self.percentile(50) / 1e6,
+            "p90_ms": self.percentile(90) / 1e6,
+            "p99_ms": self.percentile(99) / 1e6,
+            # [нижняя граница, верхняя граница, число вызовов]
+            "buckets": [[bound / 1e6 for bound in bucket_bounds(bucket)] + [self.counts[bucket]]
+                        for bucket in sorted(self.counts)],
+        }
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "stage", "start")
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.stage, time.perf_counter_ns() - self.start)
+        return False
+
+
+class Profiler:
+    """Гистограммы по этапам; запись из любого потока"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = {}
+        self.lock = threading.Lock()  # Запросы к базе замеряются в фоновых потоках
+        self.started = time.time()
+
+    def record(self, stage, ns):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.record(ns)
+
+    def timed(self, stage):
+        """Декоратор: время каждого вызова функции попадает в этап stage"""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter_ns()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter_ns() - start)
+            return wrapper
+        return decorate
+
+    def span(self, stage):
+        """Контекстный менеджер для замера части функции"""
+        return _Span(self, stage) if self.enabled else NULL_SPAN
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.started = time.time()
+
+    def summary(self):
+        """[(этап, вызовов, p50 мс, p99 мс, максимум мс)] по убыванию общего времени"""
+        with self.lock:
+            stages = sorted(self.stages.items(), key=lambda item: -item[1].total)
+            return [(stage, histogram.count, histogram.percentile(50) / 1e6,
+                     histogram.percentile(99) / 1e6, histogram.max / 1e6)
+                    for stage, histogram in stages]
+
+    def export(self, path=PROFILE_FILE):
+        """Выгружает гистограммы всех этапов в JSON"""
+        with self.lock:
+            data = {
+                "started": self.started,
+                "exported": time.time(),
+                "stages": {stage: histogram.to_dict() for stage, histogram in sorted(self.stages.items())},
+            }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+        return path
+
+
+# Общий для процесса профилировщик
+profiler = Profiler(enabled=bool(os.environ.get(ENABLE_VARIABLE)))
+timed = profiler.timed
+span = profiler.span
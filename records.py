@@ -0,0 +1,139 @@
+"""Компактная двоичная запись партий.
+
+Запись - заголовок и список ходов, по одному байту на ход: постановка камня -
+номер клетки, перемещение - ``клеток + клетка * 4 + направление``. Снятие
+камня не хранится: оно однозначно следует из хода. Если поле слишком велико
+для одного байта, ход занимает два или четыре байта (это указано в заголовке).
+
+Партии стандартного поля пишутся заголовком версии 1. Для других вариантов
+игры (``engine.Geometry``) заголовок версии 2 дополнительно хранит число пар,
+длину линии и порог поражения.
+"""
+
+import struct
+from collections import namedtuple
+
+from engine import NUM_CELLS, MOVE_SHIFT, MOVE_MASK, STANDARD, Position, get_geometry
+
+MAGIC = b"BG"
+VERSION = 1
+GEOMETRY_VERSION = 2  # Запись варианта игры с нестандартными правилами
+HEADER = struct.Struct("<2sBBBBBI")  # метка, версия, ширина, высота, байт на ход, результат, ходов
+GEOMETRY = struct.Struct("<HBB")  # версия 2: пары, длина линии, порог поражения
+RESULT_DRAW = 2
+RESULT_UNFINISHED = 3
+
+# Формат кода хода по числу байт на ход
+CODE_FORMATS = {2: "H", 4: "I"}
+
+RecordHeader = namedtuple("RecordHeader", "version width height move_size result plies geometry")
+
+
+def move_size(num_cells=NUM_CELLS):
+    """Байт на ход для поля из num_cells клеток"""
+    codes = num_cells * 5
+    if codes <= 1 << 8:
+        return 1
+    return 2 if codes <= 1 << 16 else 4
+
+
+def direction_offsets(geometry=STANDARD):
+    """Направления перемещения: вправо, вниз, влево, вверх (сдвиг номера клетки)"""
+    return (1, geometry.width, -1, -geometry.width)
+
+
+def encode_move_code(move, geometry=STANDARD):
+    frm, to = move >> MOVE_SHIFT, move & MOVE_MASK
+    if frm == to:
+        return to
+    return geometry.num_cells + frm * 4 + direction_offsets(geometry).index(to - frm)
+
+
+def decode_move_code(code, geometry=STANDARD):
+    if code < geometry.num_cells:
+        return (code << MOVE_SHIFT) | code
+    frm, direction = divmod(code - geometry.num_cells, 4)
+    return (frm << MOVE_SHIFT) | (frm + direction_offsets(geometry)[direction])
+
+
+def encode_record(moves, result, geometry=STANDARD):
+    """Заголовок и ходы партии в виде bytes"""
+    size = move_size(geometry.num_cells)
+    codes = [encode_move_code(move, geometry) for move in moves]
+    if geometry == STANDARD:
+        header = HEADER.pack(MAGIC, VERSION, geometry.width, geometry.height, size, result, len(codes))
+    else:
+        header = (HEADER.pack(MAGIC, GEOMETRY_VERSION, geometry.width, geometry.height, size, result,
+                              len(codes))
+                  + GEOMETRY.pack(geometry.num_stones, geometry.line_length, geometry.min_stones))
+    if size == 1:
+        return header + bytes(codes)
+    return header + struct.pack(f">{len(codes)}{CODE_FORMATS[size]}", *codes)
+
+
+def decode_header(data):
+    magic, version, width, height, size, result, plies = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Это не запись партии Болотуду")
+    if version == VERSION:
+        if (width, height) != (STANDARD.width, STANDARD.height):
+            raise ValueError(f"Запись для поля {width}x{height}, а игра на поле "
+                             f"{STANDARD.width}x{STANDARD.height}")
+        geometry = STANDARD
+    elif version == GEOMETRY_VERSION:
+        geometry = get_geometry(width, height, *GEOMETRY.unpack_from(data, HEADER.size))
+    else:
+        raise ValueError(f"Неизвестная версия записи партии: {version}")
+    return RecordHeader(version, width, height, size, result, plies, geometry)
+
+
+def iter_moves(data):
+    """Лениво декодирует ходы записи"""
+    header = decode_header(data)
+    geometry = header.geometry
+    offset = HEADER.size + (GEOMETRY.size if header.version == GEOMETRY_VERSION else 0)
+    size = header.move_size
+    if size == 1:
+        for code in memoryview(data)[offset:offset + header.plies]:
+            yield decode_move_code(code, geometry)
+    else:
+        for (code,) in struct.iter_unpack(">" + CODE_FORMATS[size],
+                                          memoryview(data)[offset:offset + size * header.plies]):
+            yield decode_move_code(code, geometry)
+
+
+def game_result(position):
+    """Результат партии для записи: победитель, ничья или не закончена"""
+    if position.is_draw():
+        return RESULT_DRAW
+    winner = position.result()
+    return RESULT_UNFINISHED if winner is None else winner
+
+
+class GameRecord:
+    """Партия из базы; ходы декодируются только при обращении"""
+
+    __slots__ = ("id", "white", "black", "result", "plies", "played_at", "data")
+
+    def __init__(self, id, white, black, result, plies, played_at, data):
+        self.id = id
+        self.white = white
+        self.black = black
+        self.result = result
+        self.plies = plies
+        self.played_at = played_at
+        self.data = data
+
+    def moves(self):
+        return iter_moves(self.data)
+
+    def positions(self):
+        """Позиции после каждого хода партии"""
+        position = Position(decode_header(self.data).geometry)
+        for move in self.moves():
+            position.make_move(move)
+            yield position
+
+    def __repr__(self):
+        return (f"GameRecord(id={self.id}, white={self.white!r}, black={self.black!r}, "
+                f"result={self.result}, plies={self.plies})")
@@ -0,0 +1,98 @@
+"""Отрисовка доски в режиме удержания элементов холста.
+
+Сетка и по одному изображению на клетку создаются один раз. Дальше ``update``
+сравнивает нужное состояние клетки с показанным и вызывает ``itemconfig``
+только для изменившихся клеток; ничего не удаляется и не создается заново.
+"""
+
+from engine import MOVE_SHIFT, MOVE_MASK, STANDARD
+
+HIDDEN_STATE = "hidden"
+NORMAL_STATE = "normal"
+
+
+class BoardRenderer:
+    """Холст игрового поля с элементами, созданными один раз"""
+
+    def __init__(self, canvas, cell_size, player_colors, grid_color, sprites, geometry=STANDARD):
+        self.canvas = canvas
+        self.cell_size = cell_size
+        self.geometry = geometry
+        self.player_colors = player_colors
+        self.sprites = sprites  # Кеш изображений камней (sprites.StoneSprites)
+        self.items = []
+        self.shown = [None] * geometry.num_cells  # (владелец, выделен) для каждой клетки
+        self.selected_index = -1
+        self.info_label = None
+        self.info_text = None
+
+        # Рисуем сетку
+        width, height = geometry.width, geometry.height
+        for i in range(width + 1):
+            x = i * cell_size
+            canvas.create_line(x, 0, x, height * cell_size, fill=grid_color, width=2,
+                               tags="grid")
+        for i in range(height + 1):
+            y = i * cell_size
+            canvas.create_line(0, y, width * cell_size, y, fill=grid_color, width=2,
+                               tags="grid")
+
+        # По одному скрытому камню на клетку
+        for index in range(geometry.num_cells):
+            row, col = divmod(index, width)
+            x = col * cell_size + cell_size // 2
+            y = row * cell_size + cell_size // 2
+            self.items.append(canvas.create_image(x, y, state=HIDDEN_STATE, tags="stone"))
+
+    def cell_state(self, position, index, selected_index):
+        bit = 1 << index
+        if position.bb[0] & bit:
+            owner = 0
+        elif position.bb[1] & bit:
+            owner = 1
+        else:
+            return None
+        return (owner, index == selected_index)
+
+    def update(self, position, selected=None, cells=None):
+        """Приводит холст к позиции; cells - клетки, затронутые ходом (None - все)"""
+        width = self.geometry.width
+        selected_index = selected[0] * width + selected[1] if selected is not None else -1
+        if cells is None:
+            cells = range(self.geometry.num_cells)
+        elif selected_index != self.selected_index:
+            # Снимаем выделение со старой клетки и ставим на новую
+            cells = set(cells) | {selected_index, self.selected_index}
+            cells.discard(-1)
+        self.selected_index = selected_index
+        changed = 0
+        for index in cells:
+            state = self.cell_state(position, index, selected_index)
+            if state == self.shown[index]:
+                continue
+            self.shown[index] = state
+            changed += 1
+            item = self.items[index]
+            if state is None:
+                self.canvas.itemconfig(item, state=HIDDEN_STATE)
+                continue
+            owner, is_selected = state
+            # Выбранный камень показывается подсвеченным изображением
+            image = self.sprites.get(self.player_colors[owner], is_selected, self.cell_size)
+            self.canvas.itemconfig(item, state=NORMAL_STATE, image=image)
+        return changed
+
+    def set_info(self, label, text):
+        """Обновляет информационную метку, только если текст изменился"""
+        if label is not self.info_label or text != self.info_text:
+            self.info_label = label
+            self.info_text = text
+            label.config(text=text)
+
+
+def touched_cells(delta):
+    """Клетки, которые изменил ход из записи MoveDelta"""
+    cells = {delta.move >> MOVE_SHIFT, delta.move & MOVE_MASK}
+    if delta.captured >= 0:
+        cells.add(delta.captured)
+    return cells
@@ -0,0 +1,265 @@
+"""Автосохранение партии: снимок позиции и журнал ходов.
+
+Снимок (``SAVE_FILE``) - позиция целиком в JSON. Он пишется во временный файл
+и подменяет старый через ``os.replace``, поэтому на диске всегда лежит либо
+старый, либо новый снимок целиком. Между снимками каждый ход дописывается в
+журнал (``JOURNAL_FILE``) кадром из нескольких байт с длиной и контрольной
+суммой; ``fsync`` выполняется один раз за ход игрока. Оборванный при
+падении последний кадр не проходит проверку и отбрасывается.
+
+Журнал начинается с номера снимка, к которому он относится. Восстановление
+читает снимок и доигрывает только ходы журнала с тем же номером.
+
+Вся работа с файлами идет через ``BackgroundExecutor`` окна строго по очереди
+(``serial=True``), ошибки доставляются в поток окна; в потоке окна остается
+только упаковка хода.
+"""
+
+import json
+import os
+import random
+import struct
+import zlib
+
+from engine import MoveDelta, Position, get_geometry
+
+SAVE_FILE = "bolotudu_save.json"  # Файл снимка сохраненной игры
+JOURNAL_FILE = "bolotudu_save.journal"  # Журнал ходов после снимка
+SNAPSHOT_INTERVAL = 32  # Через сколько ходов журнал сворачивается в новый снимок
+SAVE_VERSION = 1
+
+JOURNAL_MAGIC = b"BLTJ"
+JOURNAL_HEADER = struct.Struct("<4sI")  # метка, номер снимка
+FRAME_HEADER = struct.Struct("<HI")  # длина данных, crc32 данных
+ENTRY = struct.Struct("<II")  # номер хода в партии, ход
+
+
+def _fsync_directory(path):
+    """Сохраняет на диск саму подмену файла (только POSIX)"""
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data):
+    """Записывает файл целиком или не записывает вовсе"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+    _fsync_directory(path)
+
+
+def encode_snapshot(position, snapshot_id, settings):
+    return json.dumps({
+        "version": SAVE_VERSION,
+        "snapshot_id": snapshot_id,
+        "settings": settings,
+        # Ширина, высота, пары, длина линии и порог поражения варианта игры
+        "geometry": position.geometry.key,
+        "bb": position.bb,
+        "current_player": position.current_player,
+        "stage": position.stage,
+        "stones_to_place": position.stones_to_place,
+        "remaining_pairs": position.remaining_pairs,
+        "stones_count": position.stones_count,
+        "winner": position.winner,
+        # История нужна для отмены ходов и ничьей по повторению
+        "history": [list(delta) for delta in position.history],
+    }, separators=(",", ":")).encode("utf-8")
+
+
+def decode_snapshot(data):
+    """Возвращает (позиция, номер снимка, настройки партии)"""
+    state = json.loads(data.decode("utf-8"))
+    if state["version"] != SAVE_VERSION:
+        raise ValueError("Неизвестная версия сохранения")
+    # В снимках до вариантов игры геометрии нет - это стандартное поле
+    position = Position(get_geometry(*state.get("geometry", ())))
+    position.set_boards(state["bb"])
+    position.current_player = state["current_player"]
+    position.stage = state["stage"]
+    position.stones_to_place = state["stones_to_place"]
+    position.remaining_pairs = list(state["remaining_pairs"])
+    position.winner = state["winner"]
+    position.history = [MoveDelta(*delta) for delta in state["history"]]
+    position.hash = position.compute_hash()
+    return position, state["snapshot_id"], state["settings"]
+
+
+def encode_frame(ply, move):
+    payload = ENTRY.pack(ply, move)
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_journal(data):
+    """Номер снимка и ходы (номер, ход) журнала до первого поврежденного кадра"""
+    if len(data) < JOURNAL_HEADER.size:
+        return None, []
+    magic, snapshot_id = JOURNAL_HEADER.unpack_from(data)
+    if magic != JOURNAL_MAGIC:
+        return None, []
+    entries = []
+    offset = JOURNAL_HEADER.size
+    while offset + FRAME_HEADER.size <= len(data):
+        length, checksum = FRAME_HEADER.unpack_from(data, offset)
+        start = offset + FRAME_HEADER.size
+        payload = data[start:start + length]
+        if length != ENTRY.size or len(payload) != length or zlib.crc32(payload) != checksum:
+            break  # Кадр оборван при записи
+        entries.append(ENTRY.unpack(payload))
+        offset = start + length
+    return snapshot_id, entries
+
+
+def has_saved_game(save_file=SAVE_FILE):
+    return os.path.exists(save_file)
+
+
+def load_game(save_file=SAVE_FILE, journal_file=JOURNAL_FILE):
+    """Восстанавливает (позиция, настройки) из снимка и хвоста журнала.
+
+    Возвращает None, если сохранения нет.
+    """
+    try:
+        with open(save_file, "rb") as file:
+            position, snapshot_id, settings = decode_snapshot(file.read())
+    except FileNotFoundError:
+        return None
+    try:
+        with open(journal_file, "rb") as file:
+            journal_id, entries = read_journal(file.read())
+    except FileNotFoundError:
+        journal_id, entries = None, []
+    if journal_id == snapshot_id:
+        for ply, move in entries:
+            if ply != len(position.history) or not position.is_legal_move(move):
+                break
+            position.make_move(move)
+    return position, settings
+
+
+class GameSaver:
+    """Автосохранение одной партии; все записи выполняются в фоне по порядку.
+
+    executor - ``workers.BackgroundExecutor`` окна.
+    """
+
+    def __init__(self, executor, save_file=SAVE_FILE, journal_file=JOURNAL_FILE,
+                 snapshot_interval=SNAPSHOT_INTERVAL):
+        self.executor = executor
+        self.save_file = save_file
+        self.journal_file = journal_file
+        self.snapshot_interval = snapshot_interval
+        self.settings = None
+        self.fd = None  # Журнал открыт только в фоновом потоке
+        self.moves_since_snapshot = 0
+        self.buffer = bytearray()  # Кадры текущего хода до fsync
+        self.saved = False  # Есть ли на диске незаконченная партия
+        self.error = None
+        self._run(has_saved_game, save_file, on_done=self._found_saved)
+
+    def _run(self, function, *args, on_done=None, on_error=None):
+        # Снимок, сброс журнала и дозапись идут строго по очереди
+        return self.executor.submit(function, *args, on_done=on_done,
+                                    on_error=on_error or self._failed, serial=True)
+
+    def _failed(self, error):
+        if self.error is None:
+            self.error = error
+
+    def _found_saved(self, found):
+        # Партия, начатая до окончания проверки, уже сохраняется
+        self.saved = self.saved or found
+
+    def start(self, position, settings):
+        """Начинает сохранение партии с позиции position"""
+        self.settings = settings
+        self.saved = True
+        self.snapshot(position)
+
+    def snapshot(self, position):
+        """Пишет снимок позиции и начинает пустой журнал"""
+        if self.settings is None:
+            return
+        self.buffer.clear()
+        self.moves_since_snapshot = 0
+        self._run(self._write_snapshot, position.copy(with_history=True), self.settings)
+
+    def _write_snapshot(self, position, settings):
+        snapshot_id = random.getrandbits(32)
+        atomic_write(self.save_file, encode_snapshot(position, snapshot_id, settings))
+        # Если упасть здесь, старый журнал не совпадет по номеру и будет пропущен
+        self._close_journal()
+        atomic_write(self.journal_file, JOURNAL_HEADER.pack(JOURNAL_MAGIC, snapshot_id))
+        self.fd = os.open(self.journal_file, os.O_WRONLY | os.O_APPEND | getattr(os, "O_BINARY", 0))
+
+    def record(self, position):
+        """Добавляет в журнал последний ход позиции.
+
+        Ходы копятся в буфере и сбрасываются на диск, когда ход переходит к
+        другому игроку или партия окончена.
+        """
+        if self.settings is None:
+            return
+        delta = position.last_delta()
+        self.buffer += encode_frame(len(position.history) - 1, delta.move)
+        self.moves_since_snapshot += 1
+        if self.moves_since_snapshot >= self.snapshot_interval:
+            self.snapshot(position)
+        elif position.stones_to_place == 2 or position.stage == 2 or position.winner is not None:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self._run(self._append, bytes(self.buffer))
+            self.buffer.clear()
+
+    def _append(self, data):
+        if self.fd is None:
+            return
+        os.write(self.fd, data)
+        os.fsync(self.fd)
+
+    def _close_journal(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _remove_files(self):
+        self._close_journal()
+        for path in (self.save_file, self.journal_file):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """Удаляет сохранение законченной партии"""
+        self.buffer.clear()
+        self.settings = None
+        self.saved = False
+        return self._run(self._remove_files)
+
+    def load(self, on_done, on_error):
+        """Загружает сохраненную партию после всех уже начатых записей.
+
+        on_done получает (позиция, настройки) или None.
+        """
+        return self._run(load_game, self.save_file, self.journal_file, on_done=on_done, on_error=on_error)
+
+    def stop(self):
+        """Дописывает буфер и закрывает журнал; сохранение остается на диске"""
+        self.flush()
+        self.settings = None
+        return self._run(self._close_journal)
+
+    def close(self):
+        """Как stop; записи дописываются в фоне, процесс дожидается их при выходе"""
+        self.stop()
@@ -0,0 +1,318 @@
+"""Сервер сетевой игры на asyncio.
+
+Один процесс держит любое число партий: у каждой своя позиция движка, и
+каждый ход проверяется теми же правилами, что и клик в окне
+(``Position.is_legal_move``). Игроки подбираются парами по команде PLAY.
+Протокол описан в ``network.py``.
+
+К ``bolotudu.db`` сервер ходит через пул соединений в потоках, чтобы запросы
+не останавливали цикл событий. Законченные партии копятся и записываются
+пачкой раз в ``RESULTS_FLUSH_INTERVAL`` секунд одной транзакцией.
+
+Пример: python server.py --port 8765
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import Position, parse_move
+from network import (SERVER_HOST, SERVER_PORT, MAX_LINE, END_FINISHED, END_RESIGN,
+                     END_DISCONNECT, encode_line, decode_line)
+from records import RESULT_DRAW, RESULT_UNFINISHED, encode_record, game_result
+from storage import DATABASE_FILE, Database
+
+DB_POOL_SIZE = 4  # Соединений с базой
+MAX_PLIES = 400  # После стольких ходов партия считается ничьей
+RESULTS_FLUSH_INTERVAL = 0.5  # Как часто записывать законченные партии (с)
+DB_BATCH_SIZE = 500  # Больше партий за раз не записывается
+GUEST_NAME = "Гость"
+
+
+class DatabasePool:
+    """Несколько соединений с базой для запросов из цикла событий"""
+
+    def __init__(self, path=DATABASE_FILE, size=DB_POOL_SIZE):
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="bolotudu-db")
+        self.connections = asyncio.Queue()
+        for _ in range(size):
+            self.connections.put_nowait(Database(path))
+
+    async def call(self, method, *args):
+        """Вызывает метод Database на свободном соединении в потоке пула"""
+        database = await self.connections.get()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, getattr(database, method), *args)
+        finally:
+            self.connections.put_nowait(database)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        while not self.connections.empty():
+            self.connections.get_nowait().close()
+
+
+class Player:
+    """Подключенный клиент"""
+
+    __slots__ = ("writer", "name", "is_user", "game", "color")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.name = None
+        self.is_user = False  # Вошел под именем из users (а не гостем)
+        self.game = None
+        self.color = None
+
+    def send(self, *parts):
+        if not self.writer.is_closing():
+            self.writer.write(encode_line(*parts))
+
+
+class ServerGame:
+    """Одна партия на сервере"""
+
+    __slots__ = ("id", "players", "position", "started_at")
+
+    def __init__(self, game_id, white, black):
+        self.id = game_id
+        self.players = [white, black]
+        self.position = Position()
+        self.started_at = time.time()
+
+
+class GameServer:
+    """Подбор соперников, проверка ходов и запись результатов"""
+
+    def __init__(self, database=DATABASE_FILE, pool_size=DB_POOL_SIZE, max_plies=MAX_PLIES):
+        self.database = database
+        self.pool_size = pool_size
+        self.max_plies = max_plies
+        self.pool = None
+        self.server = None
+        self.waiting = None  # Игрок, ожидающий соперника
+        self.game_ids = itertools.count(1)
+        self.games = {}
+        self.results = []  # Законченные партии до записи в базу: (строка games, флаги users)
+        self.flusher = None
+        self.players = set()  # Подключенные клиенты
+        self.users = {}  # Вошедшие под именем из users: имя -> Player
+        self.handlers = set()  # Задачи обработки соединений
+        self.moves = 0
+        self.finished = 0
+
+    async def start(self, host=SERVER_HOST, port=SERVER_PORT):
+        self.pool = DatabasePool(self.database, self.pool_size)
+        self.server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE,
+                                                 backlog=1024)
+        self.flusher = asyncio.ensure_future(self._flush_results())
+        return self.server
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    @property
+    def connections(self):
+        return len(self.players)
+
+    async def close(self):
+        self.server.close()
+        # Закрываем соединения сами: иначе их задачи отменяются при выходе из цикла
+        for player in self.players:
+            player.writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+        self.flusher.cancel()
+        await self._write_results()
+        self.pool.close()
+
+    # Соединения
+
+    async def handle_client(self, reader, writer):
+        player = Player(writer)
+        self.players.add(player)
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):  # Слишком длинная строка или обрыв
+                    break
+                if not line:
+                    break
+                parts = decode_line(line)
+                if parts:
+                    await self.handle_command(player, parts)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.players.discard(player)
+            self.handlers.discard(task)
+            self.disconnect(player)
+            writer.close()
+
+    async def handle_command(self, player, parts):
+        command, args = parts[0], parts[1:]
+        if command == "MOVE" and len(args) == 1:
+            self.handle_move(player, args[0])
+        elif command == "PING":
+            player.send("PONG")
+        elif command == "GUEST":
+            if player.game is not None:
+                player.send("ERR", "идет партия")
+                return
+            self.logout(player)
+            player.name = GUEST_NAME
+            player.send("OK", GUEST_NAME)
+        elif command in ("LOGIN", "REGISTER") and len(args) == 2:
+            await self.handle_login(player, command, *args)
+        elif command == "PLAY":
+            self.handle_play(player)
+        elif command == "RESIGN":
+            if player.game is not None:
+                self.finish_game(player.game, 1 - player.color, END_RESIGN)
+        else:
+            player.send("ERR", "команда")
+
+    async def handle_login(self, player, command, username, password):
+        if player.game is not None:
+            player.send("ERR", "идет партия")
+            return
+        if command == "REGISTER" and not await self.pool.call("register_user", username, password):
+            player.send("ERR", "имя занято")
+            return
+        if not await self.pool.call("authenticate", username, password):
+            player.send("ERR", "неверное имя или пароль")
+            return
+        # Второе подключение под тем же именем могло бы сыграть само с собой
+        if self.users.get(username, player) is not player:
+            player.send("ERR", "имя уже подключено")
+            return
+        self.logout(player)
+        player.name = username
+        player.is_user = True
+        self.users[username] = player
+        player.send("OK", username)
+
+    def logout(self, player):
+        if player.is_user:
+            del self.users[player.name]
+            player.is_user = False
+            player.name = None
+
+    def disconnect(self, player):
+        if self.waiting is player:
+            self.waiting = None
+        if player.game is not None:
+            self.finish_game(player.game, 1 - player.color, END_DISCONNECT)
+        self.logout(player)
+
+    # Партии
+
+    def handle_play(self, player):
+        if player.name is None:
+            player.send("ERR", "нужен вход")
+            return
+        if player.game is not None or self.waiting is player:
+            player.send("ERR", "уже в игре")
+            return
+        opponent = self.waiting
+        if opponent is None:
+            self.waiting = player
+            player.send("WAIT")
+            return
+        self.waiting = None
+        game = ServerGame(next(self.game_ids), opponent, player)
+        self.games[game.id] = game
+        for color, member in enumerate(game.players):
+            member.game = game
+            member.color = color
+            member.send("START", game.id, color, game.players[1 - color].name)
+
+    def handle_move(self, player, text):
+        game = player.game
+        if game is None:
+            player.send("ERR", "нет партии")
+            return
+        position = game.position
+        try:
+            move = parse_move(text, position.geometry)
+        except ValueError:
+            player.send("ERR", "ход")
+            return
+        if position.current_player != player.color or not position.is_legal_move(move):
+            player.send("ERR", "недопустимый ход")
+            return
+        position.make_move(move)
+        self.moves += 1
+        ply = len(position.history)
+        player.send("ACK", ply)
+        game.players[1 - player.color].send("MOVE", ply, text)
+        if position.is_game_over() or ply >= self.max_plies:
+            result = game_result(position)
+            self.finish_game(game, RESULT_DRAW if result == RESULT_UNFINISHED else result, END_FINISHED)
+
+    def finish_game(self, game, result, reason):
+        """Сообщает результат обоим игрокам и ставит партию в очередь записи"""
+        if self.games.pop(game.id, None) is None:
+            return
+        self.finished += 1
+        for player in game.players:
+            player.game = None
+            player.color = None
+            player.send("END", result, reason)
+        moves = [delta.move for delta in game.position.history]
+        white, black = game.players
+        self.results.append(((white.name, black.name, result, len(moves), game.started_at,
+                              encode_record(moves, result)), (white.is_user, black.is_user)))
+
+    # Запись результатов
+
+    async def _flush_results(self):
+        while True:
+            await asyncio.sleep(RESULTS_FLUSH_INTERVAL)
+            await self._write_results()
+
+    async def _write_results(self):
+        while self.results:
+            batch = self.results[:DB_BATCH_SIZE]
+            del self.results[:DB_BATCH_SIZE]
+            await self.pool.call("insert_games", [row for row, _ in batch], [users for _, users in batch])
+
+
+async def serve(host, port, database, pool_size, report_interval=None):
+    game_server = GameServer(database, pool_size)
+    await game_server.start(host, port)
+    print(f"Сервер слушает {host}:{game_server.port}")
+    try:
+        while True:
+            await asyncio.sleep(report_interval or 3600)
+            if report_interval:
+                print(f"соединений {game_server.connections}, партий {len(game_server.games)}, "
+                      f"закончено {game_server.finished}, ходов {game_server.moves}")
+    finally:
+        await game_server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сервер сетевой игры Болотуду")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--database", default=DATABASE_FILE)
+    parser.add_argument("--pool-size", type=int, default=DB_POOL_SIZE, help="соединений с базой")
+    parser.add_argument("--report", type=float, default=None, help="печатать статистику раз в N секунд")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.database, args.pool_size, args.report))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""Пакетный симулятор партий на массивах NumPy.
+
+Все N партий хранятся в массиве ``(N, высота, ширина)`` типа int8
+(-1 - пустая клетка, 0 и 1 - камни игроков), и каждый шаг выполняется сразу для
+всех незавершенных партий: генерация допустимых ходов, выбор хода политикой,
+поиск линии и снятие камня соперника по тем же правилам, что и в ``engine``.
+Как и в ``engine``, партия заканчивается ничьей при трехкратном повторении
+позиции (с последней постановки или взятия) - для этого у каждой партии
+ведется хеш Зобриста по ключам ``engine.Geometry``. Размеры поля и правила
+варианта задает ``engine.Geometry``.
+"""
+
+import time
+
+import numpy as np
+
+from engine import REPETITION_LIMIT, STANDARD, encode_move
+
+EMPTY = -1
+DRAW = 2  # Значение в массиве winner для ничьей
+# Направления перемещения: вправо, вниз, влево, вверх
+DIRECTIONS = np.array([(0, 1), (1, 0), (0, -1), (-1, 0)], dtype=np.int64)
+
+
+def random_policy(legal, rng):
+    """Случайный равновероятный выбор среди допустимых ходов.
+
+    ``legal`` - булев массив (игры, ходы); возвращает номер хода для каждой игры.
+    """
+    keys = rng.random(legal.shape)
+    keys[~legal] = -1.0
+    return keys.argmax(axis=1)
+
+
+def _runs(own, axis, reverse):
+    """Длина непрерывной цепочки своих камней рядом с каждой клеткой.
+
+    Для каждой клетки считается, сколько своих камней подряд стоит слева
+    (axis=2) или сверху (axis=1); при reverse=True - справа или снизу.
+    """
+    size = own.shape[axis]
+    runs = np.zeros(own.shape, dtype=np.int8)
+    chain = np.ones(own.shape, dtype=bool)
+    for k in range(1, size):
+        shifted = np.zeros(own.shape, dtype=bool)
+        if axis == 2:
+            if reverse:
+                shifted[:, :, :-k] = own[:, :, k:]
+            else:
+                shifted[:, :, k:] = own[:, :, :-k]
+        else:
+            if reverse:
+                shifted[:, :-k, :] = own[:, k:, :]
+            else:
+                shifted[:, k:, :] = own[:, :-k, :]
+        chain &= shifted
+        if not chain.any():
+            break
+        runs += chain
+    return runs
+
+
+class BatchSimulator:
+    """N одновременных партий, которые играются до конца за вызов ``run``"""
+
+    def __init__(self, num_games, seed=0, policy=random_policy, max_plies=400,
+                 record_moves=False, geometry=STANDARD):
+        self.num_games = num_games
+        self.geometry = geometry
+        self.rng = np.random.default_rng(seed)
+        self.policy = policy
+        self.max_plies = max_plies  # После стольких ходов партия считается ничьей
+        self.record_moves = record_moves
+        # Ключи Зобриста движка: камни, очередь хода и этап (счетчики пар на
+        # этапе перемещения не меняются)
+        self.piece_keys = np.array(geometry.piece_keys, dtype=np.uint64)
+        self.side_key = np.uint64(geometry.side_key)
+        self.stage_key = np.uint64(geometry.stage_key)
+        self.reset()
+
+    def reset(self):
+        n = self.num_games
+        geometry = self.geometry
+        self.boards = np.full((n, geometry.height, geometry.width), EMPTY, dtype=np.int8)
+        self.current = np.zeros(n, dtype=np.int8)
+        self.stage = np.ones(n, dtype=np.int8)
+        self.stones_to_place = np.full(n, 2, dtype=np.int8)
+        self.remaining_pairs = np.full((n, 2), geometry.num_stones, dtype=np.int16)
+        self.stones_count = np.zeros((n, 2), dtype=np.int32)
+        self.winner = np.full(n, EMPTY, dtype=np.int8)
+        self.length = np.zeros(n, dtype=np.int32)
+        self.hash = np.zeros(n, dtype=np.uint64)
+        # Хеш после каждого хода (столбец 0 - начальная позиция) и ход, с
+        # которого повторение возможно: после последней постановки или взятия
+        self.positions = np.zeros((n, self.max_plies + 1), dtype=np.uint64)
+        self.reversible_from = np.zeros(n, dtype=np.int32)
+        # Выбранные ходы в кодировке engine (если record_moves): массив на шаг,
+        # -1 у партий, которые на этом шаге не ходили (окончены)
+        self.moves = []
+
+    def placement_mask(self, games):
+        """Допустимые клетки для расстановки: (игры, клетки)"""
+        boards = self.boards[games]
+        player = self.current[games][:, None, None]
+        own = boards == player
+        empty = boards == EMPTY
+        horizontal = _runs(own, 2, False) + _runs(own, 2, True) + 1
+        vertical = _runs(own, 1, False) + _runs(own, 1, True) + 1
+        line_length = self.geometry.line_length
+        legal = empty & (horizontal < line_length) & (vertical < line_length)
+        has_pairs = self.remaining_pairs[games, self.current[games]] > 0
+        legal &= has_pairs[:, None, None]
+        return legal.reshape(len(games), self.geometry.num_cells)
+
+    def movement_mask(self, games):
+        """Допустимые перемещения: (игры, клетки * 4), ход = клетка * 4 + направление"""
+        boards = self.boards[games]
+        own = boards == self.current[games][:, None, None]
+        empty = boards == EMPTY
+        geometry = self.geometry
+        legal = np.zeros((len(games), geometry.height, geometry.width, 4), dtype=bool)
+        legal[:, :, :-1, 0] = own[:, :, :-1] & empty[:, :, 1:]
+        legal[:, :-1, :, 1] = own[:, :-1, :] & empty[:, 1:, :]
+        legal[:, :, 1:, 2] = own[:, :, 1:] & empty[:, :, :-1]
+        legal[:, 1:, :, 3] = own[:, 1:, :] & empty[:, :-1, :]
+        return legal.reshape(len(games), geometry.num_cells * 4)
+
+    def step(self):
+        """Делает по одному ходу во всех незавершенных партиях"""
+        active = np.flatnonzero(self.winner == EMPTY)
+        if len(active) == 0:
+            return 0
+        placing = active[self.stage[active] == 1]
+        moving = active[self.stage[active] == 2]
+        chosen = np.full(self.num_games, -1, dtype=np.int64)
+        placed = self._place(placing, chosen) if len(placing) else placing
+        moved, captured = self._move(moving, chosen) if len(moving) else (moving, moving)
+        if self.record_moves:
+            self.moves.append(chosen)
+
+        # Ход, на котором у игрока не нашлось ходов, не считается
+        played = np.concatenate((placed, moved))
+        self.length[played] += 1
+        self.positions[played, self.length[played]] = self.hash[played]
+        irreversible = np.concatenate((placed, captured))
+        self.reversible_from[irreversible] = self.length[irreversible]
+        self._check_repetition(moved[self.winner[moved] == EMPTY])
+
+        timeout = active[(self.length[active] >= self.max_plies) & (self.winner[active] == EMPTY)]
+        self.winner[timeout] = DRAW
+        return len(active)
+
+    def _check_repetition(self, games):
+        """Ничья, если позиция встретилась REPETITION_LIMIT раз с последнего необратимого хода"""
+        # Позиция повторяется не раньше чем через 4 хода
+        games = games[self.length[games] - self.reversible_from[games] >= 4 * (REPETITION_LIMIT - 1)]
+        if len(games) == 0:
+            return
+        # Позиции до взятия (на камень больше) и этапа расстановки (другой ключ
+        # этапа) с текущей не совпадают, а после текущего хода хешей еще нет -
+        # достаточно сравнить строку с первого возможного повтора
+        window = self.positions[games, self.reversible_from[games].min():self.length[games].max() + 1]
+        repeats = np.count_nonzero(window == self.hash[games][:, None], axis=1)
+        self.winner[games[repeats >= REPETITION_LIMIT]] = DRAW
+
+    def _no_moves(self, games, legal):
+        """Игрок без допустимых ходов проигрывает; возвращает оставшиеся игры"""
+        stuck = ~legal.any(axis=1)
+        if stuck.any():
+            self.winner[games[stuck]] = 1 - self.current[games[stuck]]
+        return games[~stuck], legal[~stuck]
+
+    def _place(self, games, chosen):
+        """Постановка камня; возвращает партии, в которых ход сделан"""
+        legal = self.placement_mask(games)
+        games, legal = self._no_moves(games, legal)
+        if len(games) == 0:
+            return games
+        cells = self.policy(legal, self.rng)
+        if self.record_moves:
+            chosen[games] = [encode_move(cell, cell) for cell in cells.tolist()]
+        player = self.current[games]
+        rows, cols = np.divmod(cells, self.geometry.width)
+        self.boards[games, rows, cols] = player
+        self.hash[games] ^= self.piece_keys[player, cells]
+        self.stones_count[games, player] += 1
+        self.stones_to_place[games] -= 1
+
+        done = self.stones_to_place[games] == 0
+        finished = games[done]
+        self.remaining_pairs[finished, player[done]] -= 1
+        self.stones_to_place[finished] = 2
+        self.current[finished] = 1 - self.current[finished]
+        self.hash[finished] ^= self.side_key
+        movement = games[self.remaining_pairs[games].sum(axis=1) == 0]
+        self.stage[movement] = 2
+        self.hash[movement] ^= self.stage_key
+        return games
+
+    def _move(self, games, chosen):
+        """Перемещение камня; возвращает партии, в которых ход сделан, и партии со взятием"""
+        legal = self.movement_mask(games)
+        games, legal = self._no_moves(games, legal)
+        if len(games) == 0:
+            return games, games
+        picks = self.policy(legal, self.rng)
+        width = self.geometry.width
+        cells, direction = np.divmod(picks, 4)
+        from_rows, from_cols = np.divmod(cells, width)
+        to_rows = from_rows + DIRECTIONS[direction, 0]
+        to_cols = from_cols + DIRECTIONS[direction, 1]
+        if self.record_moves:
+            chosen[games] = [encode_move(frm, to) for frm, to in
+                             zip(cells.tolist(), (to_rows * width + to_cols).tolist())]
+
+        player = self.current[games]
+        self.boards[games, from_rows, from_cols] = EMPTY
+        self.boards[games, to_rows, to_cols] = player
+        self.hash[games] ^= (self.piece_keys[player, cells] ^ self.side_key
+                             ^ self.piece_keys[player, to_rows * width + to_cols])
+
+        target_rows, target_cols = self._capture_targets(games, player, to_rows, to_cols)
+        captured = target_rows >= 0
+        hit = games[captured]
+        if len(hit):
+            opponent = 1 - player[captured]
+            self.boards[hit, target_rows[captured], target_cols[captured]] = EMPTY
+            self.hash[hit] ^= self.piece_keys[opponent, target_rows[captured] * width + target_cols[captured]]
+            self.stones_count[hit, opponent] -= 1
+            lost = self.stones_count[hit, opponent] <= self.geometry.min_stones
+            self.winner[hit[lost]] = player[captured][lost]
+        self.current[games] = 1 - player
+        return games, hit
+
+    def _capture_targets(self, games, player, rows, cols):
+        """Клетка снимаемого камня для каждой игры (строка -1, если взятия нет).
+
+        Как и в engine: сначала горизонтальная линия, затем вертикальная;
+        снимается камень у левого/верхнего конца, иначе у правого/нижнего.
+        """
+        height, width = self.geometry.height, self.geometry.width
+        line_length = self.geometry.line_length
+        boards = self.boards[games]
+        index = np.arange(len(games))
+        own = boards == player[:, None, None]
+        opp = boards == (1 - player)[:, None, None]
+
+        def run(d_row, d_col, limit):
+            length = np.zeros(len(games), dtype=np.int64)
+            chain = np.ones(len(games), dtype=bool)
+            for k in range(1, limit):
+                r = rows + d_row * k
+                c = cols + d_col * k
+                inside = (r >= 0) & (r < height) & (c >= 0) & (c < width)
+                chain &= inside
+                chain[inside] &= own[index[inside], r[inside], c[inside]]
+                length += chain
+                if not chain.any():
+                    break
+            return length
+
+        def opponent_at(r, c):
+            inside = (r >= 0) & (r < height) & (c >= 0) & (c < width)
+            result = np.zeros(len(games), dtype=bool)
+            result[inside] = opp[index[inside], r[inside], c[inside]]
+            return result
+
+        left, right = run(0, -1, width), run(0, 1, width)
+        up, down = run(-1, 0, height), run(1, 0, height)
+        horizontal = left + right + 1 >= line_length
+        vertical = ~horizontal & (up + down + 1 >= line_length)
+
+        target_rows = np.full(len(games), -1, dtype=np.int64)
+        target_cols = np.zeros(len(games), dtype=np.int64)
+        candidates = (
+            (horizontal, rows, cols - left - 1),
+            (horizontal, rows, cols + right + 1),
+            (vertical, rows - up - 1, cols),
+            (vertical, rows + down + 1, cols),
+        )
+        for line, r, c in candidates:
+            take = line & (target_rows < 0) & opponent_at(r, c)
+            target_rows[take] = r[take]
+            target_cols[take] = c[take]
+        return target_rows, target_cols
+
+    def run(self):
+        """Доигрывает все партии и возвращает статистику"""
+        start = time.perf_counter()
+        while self.step():
+            pass
+        return self.statistics(time.perf_counter() - start)
+
+    def statistics(self, elapsed):
+        n = self.num_games
+        lengths = self.length
+        return {
+            "games": n,
+            "wins": [int((self.winner == 0).sum()), int((self.winner == 1).sum())],
+            "draws": int((self.winner == DRAW).sum()),
+            "mean_length": float(lengths.mean()) if n else 0.0,
+            "length_percentiles": {str(q): float(np.percentile(lengths, q)) for q in (5, 50, 95)}
+            if n else {},
+            "length_histogram": np.bincount(lengths).tolist(),
+            "elapsed": elapsed,
+            "games_per_second": n / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+def simulate(num_games, seed=0, batch_size=10000, policy=random_policy, max_plies=400,
+             geometry=STANDARD):
+    """Играет num_games партий пакетами и объединяет статистику"""
+    start = time.perf_counter()
+    wins = [0, 0]
+    draws = 0
+    histogram = np.zeros(max_plies + 1, dtype=np.int64)
+    played = 0
+    batch = 0
+    while played < num_games:
+        size = min(batch_size, num_games - played)
+        stats = BatchSimulator(size, seed=seed + batch, policy=policy, max_plies=max_plies,
+                               geometry=geometry).run()
+        wins[0] += stats["wins"][0]
+        wins[1] += stats["wins"][1]
+        draws += stats["draws"]
+        counts = np.array(stats["length_histogram"], dtype=np.int64)
+        histogram[:len(counts)] += counts
+        played += size
+        batch += 1
+    elapsed = time.perf_counter() - start
+    lengths = np.repeat(np.arange(len(histogram)), histogram)
+    return {
+        "games": num_games,
+        "wins": wins,
+        "draws": draws,
+        "mean_length": float(lengths.mean()) if num_games else 0.0,
+        "length_percentiles": {str(q): float(np.percentile(lengths, q)) for q in (5, 50, 95)}
+        if num_games else {},
+        "length_histogram": np.trim_zeros(histogram, "b").tolist(),
+        "elapsed": elapsed,
+        "games_per_second": num_games / elapsed if elapsed > 0 else 0.0,
+    }
@@ -0,0 +1,120 @@
+"""Заранее отрисованные изображения камней и палитры для анимаций.
+
+Камень с градиентом, тенью и обводкой рисуется попиксельно один раз для
+каждого сочетания (цвет игрока, подсветка, размер клетки) и хранится в кеше
+как ``PhotoImage``. Палитры затухания тоже считаются один раз.
+"""
+
+from functools import lru_cache
+
+
+def hex_to_rgb(color):
+    return int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+
+
+def rgb_to_hex(rgb):
+    return "#%02x%02x%02x" % tuple(max(0, min(255, int(c))) for c in rgb)
+
+
+def blend_colors(color1, color2, alpha):
+    """Смешивает два цвета с заданной прозрачностью"""
+    r1, g1, b1 = hex_to_rgb(color1)
+    r2, g2, b2 = hex_to_rgb(color2)
+    return rgb_to_hex((r1 * alpha + r2 * (1 - alpha),
+                       g1 * alpha + g2 * (1 - alpha),
+                       b1 * alpha + b2 * (1 - alpha)))
+
+
+@lru_cache(maxsize=None)
+def fade_palette(color, background, steps):
+    """Цвета затухания от color к background: кадр i имеет прозрачность (steps - i) / steps"""
+    return tuple(blend_colors(color, background, (steps - i) / steps) for i in range(steps))
+
+
+class StoneTheme:
+    """Параметры внешнего вида камня (берутся из констант cdd.py)"""
+
+    def __init__(self, gradient_start, gradient_end, shadow_color, shadow_offset,
+                 size_ratio, highlight_color, board_color, border_width):
+        self.gradient_start = gradient_start
+        self.gradient_end = gradient_end
+        self.shadow_color = shadow_color
+        self.shadow_offset = shadow_offset
+        self.size_ratio = size_ratio
+        self.highlight_color = highlight_color
+        self.board_color = board_color
+        self.border_width = border_width
+
+
+def render_stone_rows(theme, color, highlighted, cell_size):
+    """Пиксели камня: список (y, x0, [цвета]) непрозрачных отрезков строк.
+
+    Все, что не попало в отрезки, остается прозрачным.
+    """
+    radius = cell_size * theme.size_ratio / 2
+    center = cell_size / 2
+    offset = theme.shadow_offset
+    border = theme.border_width if highlighted else 1
+
+    base = hex_to_rgb(color)
+    light = hex_to_rgb(theme.gradient_start)
+    dark = hex_to_rgb(theme.gradient_end)
+    outline = hex_to_rgb(theme.highlight_color) if highlighted else tuple(c * 0.45 for c in base)
+    shadow = hex_to_rgb(blend_colors(theme.shadow_color, theme.board_color, 0.5))
+    # Блик в левой верхней части камня
+    light_x = center - radius * 0.35
+    light_y = center - radius * 0.35
+
+    rows = []
+    for y in range(cell_size):
+        span_start = None
+        span = []
+        for x in range(cell_size):
+            px, py = x + 0.5, y + 0.5
+            distance = ((px - center) ** 2 + (py - center) ** 2) ** 0.5
+            pixel = None
+            if distance <= radius:
+                if distance >= radius - border:
+                    pixel = outline
+                else:
+                    spot = min(1.0, ((px - light_x) ** 2 + (py - light_y) ** 2) ** 0.5 / (radius * 1.35))
+                    # Градиент от светлого к темному, умноженный на цвет игрока
+                    gradient = [l * (1 - spot) + d * spot for l, d in zip(light, dark)]
+                    pixel = [b * g / 255 for b, g in zip(base, gradient)]
+                    shine = max(0.0, 1 - spot * 2.5) ** 2 * 0.7
+                    pixel = [p * (1 - shine) + l * shine for p, l in zip(pixel, light)]
+            elif ((px - center - offset) ** 2 + (py - center - offset) ** 2) ** 0.5 <= radius:
+                pixel = shadow
+            if pixel is None:
+                if span:
+                    rows.append((y, span_start, span))
+                    span = []
+                continue
+            if not span:
+                span_start = x
+            span.append(rgb_to_hex(pixel))
+        if span:
+            rows.append((y, span_start, span))
+    return rows
+
+
+class StoneSprites:
+    """Кеш изображений камней по (цвет, подсветка, размер клетки)"""
+
+    def __init__(self, image_factory, theme):
+        self.image_factory = image_factory  # Например, tkinter.PhotoImage
+        self.theme = theme
+        self.cache = {}
+
+    def get(self, color, highlighted, cell_size):
+        key = (color, highlighted, cell_size)
+        image = self.cache.get(key)
+        if image is None:
+            image = self.image_factory(width=cell_size, height=cell_size)
+            for y, x0, span in render_stone_rows(self.theme, color, highlighted, cell_size):
+                image.put("{" + " ".join(span) + "}", to=(x0, y))
+            self.cache[key] = image
+        return image
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,287 @@
+"""Слой доступа к базе данных ``bolotudu.db``.
+
+Одно постоянное соединение на процесс вместо ``sqlite3.connect`` на каждый
+запрос. Журнал WAL позволяет читать во время записи, а ожидание блокировки
+(busy_timeout) вместо ошибки ``database is locked`` - нескольким окнам игры и
+турниру писать в один файл. Подготовленные запросы кешируются модулем sqlite3
+по тексту запроса, поэтому все запросы здесь - константные строки.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from records import GameRecord
+from profiling import timed
+
+DATABASE_FILE = "bolotudu.db"  # Файл базы данных
+BUSY_TIMEOUT = 10.0  # Сколько секунд ждать освобождения базы другим процессом
+CACHED_STATEMENTS = 256
+
+# Миграции схемы по порядку; номер примененной хранится в PRAGMA user_version.
+# Каждая миграция сама по себе идемпотентна (IF NOT EXISTS), поэтому ее
+# безопасно применить к базе, созданной старой версией игры.
+MIGRATIONS = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        games_played INTEGER DEFAULT 0,
+        games_won INTEGER DEFAULT 0
+    );
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS tournaments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at REAL NOT NULL,
+        settings TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS tournament_games (
+        tournament_id INTEGER NOT NULL REFERENCES tournaments(id),
+        game_id INTEGER NOT NULL,
+        white TEXT NOT NULL,
+        black TEXT NOT NULL,
+        result INTEGER NOT NULL,
+        plies INTEGER NOT NULL,
+        seed INTEGER NOT NULL,
+        PRIMARY KEY (tournament_id, game_id)
+    );
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS games (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        white TEXT NOT NULL,
+        black TEXT NOT NULL,
+        result INTEGER NOT NULL,
+        plies INTEGER NOT NULL,
+        played_at REAL NOT NULL,
+        record BLOB NOT NULL
+    );
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS users_leaderboard
+        ON users (games_won, -games_played, -id) WHERE games_played > 0;
+    CREATE INDEX IF NOT EXISTS games_white ON games (white, black, result);
+    CREATE INDEX IF NOT EXISTS games_black ON games (black, white, result);
+    ''',
+]
+GAMES_FETCH_SIZE = 1000  # Сколько записей партий читать из курсора за раз
+LEADERBOARD_PAGE_SIZE = 20  # Строк таблицы лидеров на странице
+
+# Таблица лидеров: больше побед выше, при равенстве - меньше сыгранных партий,
+# затем раньше зарегистрированный. Сортировка и условие страницы совпадают с
+# индексом users_leaderboard, поэтому каждая страница - короткий проход по
+# индексу от позиции, где закончилась предыдущая (без OFFSET).
+LEADERBOARD_QUERY = (
+    "SELECT id, username, games_played, games_won FROM users "
+    "WHERE games_played > 0 AND (games_won, -games_played, -id) < (?, ?, ?) "
+    "ORDER BY games_won DESC, -games_played DESC, -id DESC LIMIT ?")
+LEADERBOARD_START = (1 << 62, 0, 0)  # Ключ перед первой строкой таблицы
+
+
+class Database:
+    """Постоянное соединение с базой и запросы игры"""
+
+    def __init__(self, path=DATABASE_FILE, timeout=BUSY_TIMEOUT):
+        self.path = path
+        # isolation_level=None: транзакции открываются явно в transaction()
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                    cached_statements=CACHED_STATEMENTS,
+                                    check_same_thread=False)
+        self.lock = threading.RLock()  # Соединение может использоваться из фонового потока
+        self.conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.migrate()
+
+    @contextmanager
+    def transaction(self):
+        """Явная транзакция записи.
+
+        BEGIN IMMEDIATE сразу берет блокировку записи (с ожиданием busy_timeout),
+        чтобы транзакция не падала при попытке повысить блокировку чтения.
+        """
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def migrate(self):
+        """Применяет недостающие миграции схемы"""
+        with self.transaction() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number in range(version, len(MIGRATIONS)):
+                for statement in MIGRATIONS[number].split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+            if version < len(MIGRATIONS):
+                conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # Пользователи
+
+    @timed("db.authenticate")
+    def authenticate(self, username, password):
+        """Проверяет имя и пароль пользователя"""
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM users WHERE username=? AND password=?",
+                                    (username, password)).fetchone()
+        return row is not None
+
+    @timed("db.register_user")
+    def register_user(self, username, password):
+        """Добавляет пользователя; False, если имя уже занято"""
+        try:
+            with self.transaction() as conn:
+                conn.execute("INSERT INTO users (username, password) VALUES (?, ?)",
+                             (username, password))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    # Турниры
+
+    def create_tournament(self, started_at, settings):
+        with self.transaction() as conn:
+            return conn.execute("INSERT INTO tournaments (started_at, settings) VALUES (?, ?)",
+                                (started_at, settings)).lastrowid
+
+    def insert_tournament_games(self, rows):
+        """Записывает пачку партий турнира одной транзакцией"""
+        with self.transaction() as conn:
+            conn.executemany("INSERT INTO tournament_games VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    # Записи партий
+
+    @timed("db.insert_games")
+    def insert_games(self, rows, users=None):
+        """Записывает пачку партий (white, black, result, plies, played_at, record).
+
+        users - для каждой партии пара флагов (white, black): вошедший ли это
+        пользователь. Только им в той же транзакции засчитываются партия и
+        победа; гость, компьютер и игроки турнира - просто имена, и
+        пользователь с таким же именем их результатов не получает. Без users
+        счетчики не меняются.
+        """
+        results = []
+        for (white, black, result, *_), (white_user, black_user) in zip(rows, users or ()):
+            if white_user:
+                results.append((int(result == 0), white))
+            if black_user:
+                results.append((int(result == 1), black))
+        with self.transaction() as conn:
+            conn.executemany("INSERT INTO games (white, black, result, plies, played_at, record) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany("UPDATE users SET games_played = games_played + 1, "
+                             "games_won = games_won + ? WHERE username = ?", results)
+
+    def iter_games(self, player=None, fetch_size=GAMES_FETCH_SIZE):
+        """Потоково читает записи партий (records.GameRecord) в порядке id.
+
+        Читается по fetch_size строк за раз без открытой транзакции, поэтому
+        запись в базу во время чтения не блокируется.
+        """
+        last_id = 0
+        while True:
+            with self.lock:
+                if player is None:
+                    rows = self.conn.execute(
+                        "SELECT id, white, black, result, plies, played_at, record FROM games "
+                        "WHERE id > ? ORDER BY id LIMIT ?", (last_id, fetch_size)).fetchall()
+                else:
+                    rows = self.conn.execute(
+                        "SELECT id, white, black, result, plies, played_at, record FROM games "
+                        "WHERE id > ? AND (white = ? OR black = ?) ORDER BY id LIMIT ?",
+                        (last_id, player, player, fetch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield GameRecord(*row)
+            last_id = rows[-1][0]
+
+    @timed("db.game")
+    def game(self, game_id):
+        """Запись партии по номеру (records.GameRecord) или None"""
+        with self.lock:
+            row = self.conn.execute("SELECT id, white, black, result, plies, played_at, record "
+                                    "FROM games WHERE id = ?", (game_id,)).fetchone()
+        return GameRecord(*row) if row is not None else None
+
+    @timed("db.count_games")
+    def count_games(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    # Статистика
+
+    @timed("db.leaderboard_page")
+    def leaderboard_page(self, after=LEADERBOARD_START, limit=LEADERBOARD_PAGE_SIZE):
+        """Страница таблицы лидеров после ключа after.
+
+        Возвращает (строки (имя, партий, побед), ключ для следующей страницы).
+        """
+        with self.lock:
+            rows = self.conn.execute(LEADERBOARD_QUERY, (*after, limit)).fetchall()
+        if not rows:
+            return [], None
+        user_id, _, played, won = rows[-1]
+        next_key = (won, -played, -user_id) if len(rows) == limit else None
+        return [(username, played, won) for _, username, played, won in rows], next_key
+
+    @timed("db.player_stats")
+    def player_stats(self, username):
+        """(партий, побед, место в таблице лидеров или None) игрока"""
+        with self.lock:
+            row = self.conn.execute("SELECT id, games_played, games_won FROM users WHERE username = ?",
+                                    (username,)).fetchone()
+            if row is None:
+                return None
+            user_id, played, won = row
+            if not played:
+                return played, won, None
+            # Число игроков выше - подсчет по тому же индексу
+            ahead = self.conn.execute(
+                "SELECT COUNT(*) FROM users WHERE games_played > 0 "
+                "AND (games_won, -games_played, -id) > (?, ?, ?)",
+                (won, -played, -user_id)).fetchone()[0]
+        return played, won, ahead + 1
+
+    @timed("db.head_to_head")
+    def head_to_head(self, player, opponent):
+        """(победы player, победы opponent, остальные партии) в их встречах"""
+        wins = losses = other = 0
+        with self.lock:
+            for query, player_wins in (
+                    ("SELECT result, COUNT(*) FROM games WHERE white = ? AND black = ? GROUP BY result", 0),
+                    ("SELECT result, COUNT(*) FROM games WHERE black = ? AND white = ? GROUP BY result", 1)):
+                for result, count in self.conn.execute(query, (player, opponent)):
+                    if result == player_wins:
+                        wins += count
+                    elif result == 1 - player_wins:
+                        losses += count
+                    else:
+                        other += count
+        return wins, losses, other
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+@timed("db.get_database")
+def get_database(path=DATABASE_FILE):
+    """Общее для процесса соединение с базой path"""
+    with _databases_lock:
+        database = _databases.get(path)
+        if database is None:
+            database = _databases[path] = Database(path)
+        return database
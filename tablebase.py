@@ -0,0 +1,188 @@
+"""Эндшпильная база этапа перемещения.
+
+Для позиций этапа 2 с небольшим числом камней у каждой стороны база хранит
+точный результат для игрока, который ходит, и расстояние до конца партии в
+полуходах. Файл строит ``tablebase_builder.py``; здесь он только читается через
+``mmap``, поэтому в память загружаются лишь страницы, к которым обращались, а
+поиск записи - это вычисление номера и чтение одного байта.
+
+Формат файла: заголовок, каталог таблиц и сами таблицы. Таблица (a, b) - для
+позиций, где у ходящего a камней, а у соперника b; запись позиции - байт с
+номером ``rank(свои) * C(NUM_CELLS - a, b) + rank(чужие)``, где rank - номер
+набора клеток в комбинаторной системе счисления. Камни соперника нумеруются
+среди NUM_CELLS - a клеток, не занятых своими, поэтому пересекающиеся наборы
+места в таблице не занимают. Байт 0 - ничья, иначе
+``полуходов + 1``: нечетное число полуходов - выигрыш, четное - проигрыш.
+Повторение позиций база не учитывает. База строится только для стандартного
+поля (``engine.STANDARD``); позиции других вариантов игры в ней не ищутся.
+"""
+
+import math
+import mmap
+import struct
+import threading
+
+from engine import GRID_WIDTH, GRID_HEIGHT, NUM_CELLS, MIN_STONES, STANDARD
+
+TABLEBASE_FILE = "bolotudu.tb"  # Файл эндшпильной базы
+MIN_TABLE_STONES = MIN_STONES + 1  # Меньше камней - партия уже окончена
+MAX_TABLE_STONES = 4  # Таблица 5 на 5 - 7,6 млрд записей, ее не построить
+
+MAGIC = b"BLTB"
+VERSION = 2  # 1 - номера чужих камней среди всех клеток поля
+HEADER = struct.Struct("<4sBBBH")  # метка, версия, ширина, высота, число таблиц
+TABLE_ENTRY = struct.Struct("<BBQQ")  # камни ходящего, камни соперника, смещение, размер
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# Биномиальные коэффициенты C(n, k) для номеров наборов клеток
+BINOMIAL = [[math.comb(n, k) for k in range(MAX_TABLE_STONES + 2)] for n in range(NUM_CELLS + 1)]
+
+
+def mask_rank(mask):
+    """Номер набора клеток среди наборов того же размера (колексикографический)"""
+    rank = 0
+    i = 1
+    while mask:
+        low = mask & -mask
+        rank += BINOMIAL[low.bit_length() - 1][i]
+        i += 1
+        mask ^= low
+    return rank
+
+
+def squeeze(opp, own):
+    """Маска opp после удаления клеток own: номера клеток выше каждой из них сдвигаются на 1"""
+    cells = []
+    while own:
+        low = own & -own
+        cells.append(low)
+        own ^= low
+    for low in reversed(cells):
+        below = low - 1
+        opp = (opp & below) | ((opp >> 1) & ~below)
+    return opp
+
+
+def table_size(mover_stones, opponent_stones):
+    return BINOMIAL[NUM_CELLS][mover_stones] * BINOMIAL[NUM_CELLS - mover_stones][opponent_stones]
+
+
+def table_index(own, opp, mover_stones, opponent_stones):
+    return (mask_rank(own) * BINOMIAL[NUM_CELLS - mover_stones][opponent_stones]
+            + mask_rank(squeeze(opp, own)))
+
+
+def decode_value(value):
+    """(результат, полуходов до конца) по байту таблицы"""
+    if value == 0:
+        return DRAW, 0
+    plies = value - 1
+    return (WIN if plies % 2 else LOSS), plies
+
+
+def write_tablebase(path, tables):
+    """Записывает таблицы {(a, b): bytes-подобный массив} в файл базы"""
+    keys = sorted(tables)
+    offset = HEADER.size + TABLE_ENTRY.size * len(keys)
+    directory = []
+    for key in keys:
+        size = len(tables[key])
+        directory.append(TABLE_ENTRY.pack(key[0], key[1], offset, size))
+        offset += size
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, GRID_WIDTH, GRID_HEIGHT, len(keys)))
+        for entry in directory:
+            file.write(entry)
+        for key in keys:
+            file.write(memoryview(tables[key]).cast("B"))
+
+
+class Tablebase:
+    """Эндшпильная база, отображенная в память"""
+
+    def __init__(self, path=TABLEBASE_FILE):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, height, count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Это не эндшпильная база Болотуду")
+        if (width, height) != (GRID_WIDTH, GRID_HEIGHT):
+            raise ValueError(f"База построена для поля {width}x{height}")
+        self.tables = {}
+        for number in range(count):
+            mover, opponent, offset, size = TABLE_ENTRY.unpack_from(
+                self.data, HEADER.size + number * TABLE_ENTRY.size)
+            if size != table_size(mover, opponent):
+                raise ValueError("Поврежденный каталог эндшпильной базы")
+            self.tables[(mover, opponent)] = offset
+        self.max_stones = max((max(key) for key in self.tables), default=0)
+        self.hits = 0
+
+    def covers(self, position):
+        """Есть ли позиция в базе (без вычисления номера)"""
+        player = position.current_player
+        return (position.stage == 2 and position.winner is None and position.geometry == STANDARD
+                and (position.stones_count[player], position.stones_count[1 - player]) in self.tables)
+
+    def probe(self, position):
+        """(результат, полуходов) для ходящего игрока или None, если позиции нет в базе"""
+        if position.stage != 2 or position.winner is not None or position.geometry != STANDARD:
+            return None
+        player = position.current_player
+        mover_stones = position.stones_count[player]
+        opponent_stones = position.stones_count[1 - player]
+        offset = self.tables.get((mover_stones, opponent_stones))
+        if offset is None:
+            return None
+        self.hits += 1
+        index = table_index(position.bb[player], position.bb[1 - player], mover_stones, opponent_stones)
+        return decode_value(self.data[offset + index])
+
+    def best_move(self, position):
+        """Лучший ход по базе: (ход, результат, полуходов) или None.
+
+        Выигрыш - кратчайший, проигрыш - самый долгий, иначе ход, сохраняющий ничью.
+        """
+        if not self.covers(position):
+            return None
+        best = None
+        best_key = None
+        for move in position.legal_moves():
+            position.make_move(move)
+            if position.winner is not None:
+                reply = (LOSS, 0)
+            else:
+                reply = self.probe(position)
+            position.unmake_move()
+            if reply is None:
+                return None
+            result, plies = -reply[0], reply[1] + 1
+            # Сортировка: выигрыш быстрее, потом ничья, потом проигрыш дольше
+            key = (-result, plies if result == WIN else -plies)
+            if best_key is None or key < best_key:
+                best_key = key
+                best = (move, result, plies if result != DRAW else 0)
+        return best
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+_tablebases = {}
+_tablebases_lock = threading.Lock()
+
+
+def get_tablebase(path=TABLEBASE_FILE):
+    """Общая для процесса база из файла path или None, если файла нет"""
+    with _tablebases_lock:
+        if path not in _tablebases:
+            try:
+                _tablebases[path] = Tablebase(path)
+            except FileNotFoundError:
+                _tablebases[path] = None
+        return _tablebases[path]
@@ -0,0 +1,397 @@
+"""Построение эндшпильной базы ретроградным анализом на нескольких процессах.
+
+Таблицы строятся от малого числа камней к большому: взятие переводит позицию
+в таблицу с меньшим числом камней, уже решенную раньше (или сразу выигрывает).
+Таблицы (a, b) и (b, a) решаются вместе - перемещение без взятия переводит
+одну в другую.
+
+Для каждой позиции сначала считаются ходы: сколько перемещений без взятия и
+что дают взятия. Дальше идет обход по уровням: уровень n - позиции, решенные
+ровно за n полуходов. Предшественники проигранных позиций уровня n выигрывают
+за n + 1; у предшественников выигранных уменьшается счетчик непроверенных
+ходов, и когда он доходит до нуля, позиция проиграна. Позиции, которые так и
+не решились, - ничьи.
+
+Позиции и их предшественники обрабатываются массивами NumPy, куски массивов
+раздаются пулу процессов. Уже решенные таблицы передаются процессам через
+временные файлы ``.npy`` с отображением в память.
+
+Пример: python tablebase_builder.py --max-stones 3
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import tempfile
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from engine import GRID_WIDTH, GRID_HEIGHT, NUM_CELLS, capture_target, find_line
+from tablebase import (TABLEBASE_FILE, MIN_TABLE_STONES, MAX_TABLE_STONES, BINOMIAL,
+                       mask_rank, table_size, write_tablebase)
+
+DEFAULT_MAX_STONES = 3  # Таблица 3 на 3 - около 12 млн записей
+CHUNK_SIZE = 1 << 20  # Позиций в одном задании процесса
+CHUNK_BITS = 10  # Номер набора клеток считается по кускам маски такой ширины
+BYTES_PER_POSITION = 5  # Массивы _Table: значение, счетчик ходов и три массива взятий
+MAX_PLIES = 254  # Больше полуходов в байт записи не помещается
+NO_LINE = -2  # В таблице взятий: по горизонтали линии нет, проверяется вертикаль
+
+# Все перемещения (откуда, куда) на соседнюю клетку
+MOVES = tuple((frm, to) for frm in range(NUM_CELLS) for to in range(NUM_CELLS)
+              if abs(frm // GRID_WIDTH - to // GRID_WIDTH) + abs(frm % GRID_WIDTH - to % GRID_WIDTH) == 1)
+
+
+@lru_cache(maxsize=None)
+def masks_by_rank(stones):
+    """Маски всех наборов из stones клеток, упорядоченные по номеру mask_rank"""
+    masks = np.zeros(BINOMIAL[NUM_CELLS][stones], dtype=np.int64)
+    for cells in itertools.combinations(range(NUM_CELLS), stones):
+        mask = sum(1 << cell for cell in cells)
+        masks[mask_rank(mask)] = mask
+    return masks
+
+
+@lru_cache(maxsize=None)
+def _rank_tables():
+    """Вклад куска маски в номер: [кусок][камней в младших кусках][значение куска]"""
+    chunks = (NUM_CELLS + CHUNK_BITS - 1) // CHUNK_BITS
+    popcount = np.array([bin(value).count("1") for value in range(1 << CHUNK_BITS)], dtype=np.int64)
+    tables = np.zeros((chunks, MAX_TABLE_STONES + 1, 1 << CHUNK_BITS), dtype=np.int64)
+    for chunk in range(chunks):
+        for below in range(MAX_TABLE_STONES + 1):
+            for value in range(1 << CHUNK_BITS):
+                rank = 0
+                i = below + 1
+                for bit in range(CHUNK_BITS):
+                    if value >> bit & 1:
+                        cell = chunk * CHUNK_BITS + bit
+                        if cell < NUM_CELLS and i <= MAX_TABLE_STONES + 1:
+                            rank += BINOMIAL[cell][i]
+                        i += 1
+                tables[chunk, below, value] = rank
+    return tables, popcount
+
+
+def ranks(masks):
+    """mask_rank для массива масок"""
+    tables, popcount = _rank_tables()
+    result = np.zeros(masks.shape, dtype=np.int64)
+    below = np.zeros(masks.shape, dtype=np.int64)
+    for chunk in range(tables.shape[0]):
+        value = (masks >> (chunk * CHUNK_BITS)) & ((1 << CHUNK_BITS) - 1)
+        result += tables[chunk][np.minimum(below, MAX_TABLE_STONES), value]
+        below += popcount[value]
+    return result
+
+
+@lru_cache(maxsize=None)
+def _capture_tables():
+    """Снимаемый камень по содержимому строки и столбца клетки, куда пришел камень.
+
+    horizontal[to, свои, чужие] - клетка, -1 (линия без взятия) или NO_LINE;
+    vertical[to, свои, чужие] - клетка или -1. Строятся функциями движка.
+    """
+    horizontal = np.full((NUM_CELLS, 1 << GRID_WIDTH, 1 << GRID_WIDTH), NO_LINE, dtype=np.int8)
+    vertical = np.full((NUM_CELLS, 1 << GRID_HEIGHT, 1 << GRID_HEIGHT), -1, dtype=np.int8)
+    for to in range(NUM_CELLS):
+        row, col = divmod(to, GRID_WIDTH)
+        for own_bits in range(1 << GRID_WIDTH):
+            if not own_bits >> col & 1:
+                continue
+            own = own_bits << (row * GRID_WIDTH)
+            if find_line(own, to) is None:
+                continue
+            for opp_bits in range(1 << GRID_WIDTH):
+                if opp_bits & own_bits:
+                    continue
+                horizontal[to, own_bits, opp_bits] = capture_target(own, opp_bits << (row * GRID_WIDTH), to)
+        for own_bits in range(1 << GRID_HEIGHT):
+            if not own_bits >> row & 1:
+                continue
+            own = sum(1 << (r * GRID_WIDTH + col) for r in range(GRID_HEIGHT) if own_bits >> r & 1)
+            if find_line(own, to) is None:
+                continue
+            for opp_bits in range(1 << GRID_HEIGHT):
+                if opp_bits & own_bits:
+                    continue
+                opp = sum(1 << (r * GRID_WIDTH + col) for r in range(GRID_HEIGHT) if opp_bits >> r & 1)
+                vertical[to, own_bits, opp_bits] = capture_target(own, opp, to)
+    return horizontal, vertical
+
+
+def _column_bits(masks, col):
+    bits = np.zeros(masks.shape, dtype=np.int64)
+    for row in range(GRID_HEIGHT):
+        bits |= ((masks >> (row * GRID_WIDTH + col)) & 1) << row
+    return bits
+
+
+def captures(own, opp, to):
+    """capture_target движка для массивов масок и одной клетки to"""
+    horizontal, vertical = _capture_tables()
+    row, col = divmod(to, GRID_WIDTH)
+    row_mask = (1 << GRID_WIDTH) - 1
+    target = horizontal[to, (own >> (row * GRID_WIDTH)) & row_mask,
+                        (opp >> (row * GRID_WIDTH)) & row_mask].astype(np.int64)
+    no_line = target == NO_LINE
+    if no_line.any():
+        target[no_line] = vertical[to, _column_bits(own[no_line], col), _column_bits(opp[no_line], col)]
+    return target
+
+
+def _own_cells(own, stones):
+    """Младшие биты масок own по порядку: stones массивов"""
+    cells = []
+    for _ in range(stones):
+        low = own & -own
+        cells.append(low)
+        own = own ^ low
+    return cells
+
+
+def squeeze(opp, own, stones):
+    """tablebase.squeeze для массивов масок: у own ровно stones камней"""
+    for low in reversed(_own_cells(own, stones)):
+        below = low - 1
+        opp = (opp & below) | ((opp >> 1) & ~below)
+    return opp
+
+
+def expand(opp, own, stones):
+    """Обратное к squeeze: на место клеток own вставляются пустые биты"""
+    for low in _own_cells(own, stones):
+        below = low - 1
+        opp = (opp & below) | ((opp & ~below) << 1)
+    return opp
+
+
+def decode_positions(indices, mover_stones, opponent_stones):
+    """Маски (ходящего, соперника) по номерам записей таблицы"""
+    size = BINOMIAL[NUM_CELLS - mover_stones][opponent_stones]
+    own = masks_by_rank(mover_stones)[indices // size]
+    return own, expand(masks_by_rank(opponent_stones)[indices % size], own, mover_stones)
+
+
+def encode_positions(own, opp, mover_stones, opponent_stones):
+    return (ranks(own) * BINOMIAL[NUM_CELLS - mover_stones][opponent_stones]
+            + ranks(squeeze(opp, own, mover_stones)))
+
+
+def _init_chunk(task):
+    """Ходы позиций куска таблицы: (счетчик ходов без взятия, выигрыш взятием,
+    проигрыш после всех взятий, есть ли взятие в ничью)"""
+    mover_stones, opponent_stones, start, stop, solved_paths = task
+    indices = np.arange(start, stop, dtype=np.int64)
+    own, opp = decode_positions(indices, mover_stones, opponent_stones)
+    remaining = np.zeros(len(indices), dtype=np.uint8)
+    capture_win = np.zeros(len(indices), dtype=np.uint8)  # 0 - нет выигрывающего взятия
+    capture_loss = np.zeros(len(indices), dtype=np.uint8)
+    capture_draw = np.zeros(len(indices), dtype=bool)
+    smaller = solved_paths.get((opponent_stones - 1, mover_stones))
+    smaller = np.load(smaller, mmap_mode="r") if smaller is not None else None
+    occupied = own | opp
+    for frm, to in MOVES:
+        movable = np.nonzero(((own >> frm) & 1 == 1) & ((occupied >> to) & 1 == 0))[0]
+        if not len(movable):
+            continue
+        moved = own[movable] ^ ((1 << frm) | (1 << to))
+        target = captures(moved, opp[movable], to)
+        quiet = target < 0
+        remaining[movable[quiet]] += 1
+        taking = movable[~quiet]
+        if not len(taking):
+            continue
+        if smaller is None:
+            # У соперника остается MIN_STONES камней - выигрыш сразу
+            capture_win[taking] = 1
+            continue
+        rest = opp[taking] ^ (np.int64(1) << target[~quiet])
+        value = np.asarray(smaller[encode_positions(rest, moved[~quiet], opponent_stones - 1, mover_stones)])
+        plies = value.astype(np.int64)  # Полуходов соперника + 1 = полуходов после взятия
+        loses = (value > 0) & (plies % 2 == 1)  # У соперника четное число полуходов - проигрыш
+        wins = (value > 0) & ~loses
+        best = capture_win[taking[loses]]
+        capture_win[taking[loses]] = np.where((best == 0) | (best > plies[loses]), plies[loses], best)
+        np.maximum.at(capture_loss, taking[wins], plies[wins].astype(np.uint8))
+        capture_draw[taking[value == 0]] = True
+    return start, remaining, capture_win, capture_loss, capture_draw
+
+
+def _predecessors_chunk(task):
+    """Номера позиций таблицы (b, a), из которых ход без взятия ведет в данные позиции (a, b)"""
+    mover_stones, opponent_stones, indices = task
+    own, opp = decode_positions(indices, mover_stones, opponent_stones)
+    occupied = own | opp
+    result = []
+    for frm, to in MOVES:
+        # Соперник только что пришел в to из пустой клетки frm и ничего не снял
+        moved = np.nonzero(((opp >> to) & 1 == 1) & ((occupied >> frm) & 1 == 0))[0]
+        if not len(moved):
+            continue
+        quiet = moved[captures(opp[moved], own[moved], to) < 0]
+        if not len(quiet):
+            continue
+        before = opp[quiet] ^ ((1 << frm) | (1 << to))
+        result.append(encode_positions(before, own[quiet], opponent_stones, mover_stones))
+    return np.concatenate(result) if result else np.zeros(0, dtype=np.int64)
+
+
+class _Table:
+    """Состояние решаемой таблицы"""
+
+    def __init__(self, mover_stones, opponent_stones):
+        self.key = (mover_stones, opponent_stones)
+        size = table_size(mover_stones, opponent_stones)
+        self.value = np.zeros(size, dtype=np.uint8)
+        self.remaining = np.zeros(size, dtype=np.uint8)
+        self.capture_win = np.zeros(size, dtype=np.uint8)
+        self.capture_loss = np.zeros(size, dtype=np.uint8)
+        self.capture_draw = np.zeros(size, dtype=bool)
+        self.frontier = {}  # уровень -> список массивов номеров
+
+
+def _split(indices):
+    return [indices[i:i + CHUNK_SIZE] for i in range(0, len(indices), CHUNK_SIZE)]
+
+
+def solve_pair(pool, tables, solved_paths, log):
+    """Решает таблицы (a, b) и (b, a) (или одну таблицу a == b)"""
+    by_key = {table.key: table for table in tables}
+    for table in tables:
+        size = len(table.value)
+        tasks = [(*table.key, start, min(start + CHUNK_SIZE, size), solved_paths)
+                 for start in range(0, size, CHUNK_SIZE)]
+        for start, remaining, win, loss, draw in pool.imap_unordered(_init_chunk, tasks):
+            stop = start + len(remaining)
+            table.remaining[start:stop] = remaining
+            table.capture_win[start:stop] = win
+            table.capture_loss[start:stop] = loss
+            table.capture_draw[start:stop] = draw
+        # Ходов без взятия нет, а взятия ведут только к выигрышу соперника
+        stuck = np.nonzero((table.remaining == 0) & (table.capture_win == 0) & ~table.capture_draw)[0]
+        levels = table.capture_loss[stuck]
+        for level in np.unique(levels):
+            table.frontier.setdefault(int(level), []).append(stuck[levels == level])
+            table.value[stuck[levels == level]] = level + 1
+        log(f"таблица {table.key}: {size} позиций")
+
+    level = 0
+    while level <= MAX_PLIES:
+        for table in tables:
+            # Выигрыш взятием ровно за level полуходов
+            won = np.nonzero((table.capture_win == level) & (table.value == 0))[0] if level else []
+            if len(won):
+                table.value[won] = level + 1
+                table.frontier.setdefault(level, []).append(won)
+        pending = any(table.frontier for table in tables) or any(
+            (table.capture_win > level).any() for table in tables)
+        if not pending:
+            break
+        for table in tables:
+            parts = table.frontier.pop(level, [])
+            if not parts:
+                continue
+            indices = np.concatenate(parts)
+            target = by_key[table.key[::-1]]
+            tasks = [(*table.key, chunk) for chunk in _split(indices)]
+            losses = level % 2 == 0
+            for predecessors in pool.imap_unordered(_predecessors_chunk, tasks):
+                if losses:
+                    # Ход в проигранную для соперника позицию - выигрыш
+                    fresh = np.unique(predecessors[target.value[predecessors] == 0])
+                    target.value[fresh] = level + 2
+                    target.frontier.setdefault(level + 1, []).append(fresh)
+                    continue
+                found, counts = np.unique(predecessors, return_counts=True)
+                open_ = found[target.value[found] == 0]
+                counts = counts[target.value[found] == 0]
+                target.remaining[open_] -= counts.astype(np.uint8)
+                lost = open_[(target.remaining[open_] == 0) & (target.capture_win[open_] == 0)
+                             & ~target.capture_draw[open_]]
+                # Проигрыш - после самого долгого из выигрышей соперника
+                lost_levels = np.maximum(level + 1, target.capture_loss[lost])
+                target.value[lost] = lost_levels + 1
+                for lost_level in np.unique(lost_levels):
+                    target.frontier.setdefault(int(lost_level), []).append(lost[lost_levels == lost_level])
+        level += 1
+    if level > MAX_PLIES:
+        raise ValueError(f"Партии длиннее {MAX_PLIES} полуходов не помещаются в базу")
+    for table in tables:
+        log(f"таблица {table.key}: выигрышей {int(((table.value % 2 == 0) & (table.value > 0)).sum())}, "
+            f"проигрышей {int((table.value % 2 == 1).sum())}, "
+            f"самая долгая партия {int(table.value.max()) - 1} полуходов")
+
+
+def table_pairs(max_stones):
+    """Пары (a, b), a <= b, в порядке решения: сначала с меньшим общим числом камней"""
+    return sorted({tuple(sorted(key)) for key in itertools.product(
+        range(MIN_TABLE_STONES, max_stones + 1), repeat=2)}, key=lambda pair: (sum(pair), pair))
+
+
+def memory_needed(max_stones):
+    """Оценка памяти на построение в байтах: решаемая пара таблиц и все уже решенные"""
+    solved = 0
+    peak = 0
+    for a, b in table_pairs(max_stones):
+        keys = {(a, b), (b, a)}
+        size = sum(table_size(*key) for key in keys)
+        peak = max(peak, solved + size * BYTES_PER_POSITION)
+        solved += size
+    return max(peak, solved)
+
+
+def physical_memory():
+    """Объем оперативной памяти в байтах или None, если система его не сообщает"""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def build_tablebase(max_stones=DEFAULT_MAX_STONES, path=TABLEBASE_FILE, workers=None, log=print):
+    """Строит таблицы для MIN_TABLE_STONES..max_stones камней у каждой стороны"""
+    if not MIN_TABLE_STONES <= max_stones <= MAX_TABLE_STONES:
+        raise ValueError(f"Число камней должно быть от {MIN_TABLE_STONES} до {MAX_TABLE_STONES}")
+    needed = memory_needed(max_stones)
+    available = physical_memory()
+    if available is not None and needed > available:
+        raise ValueError(f"Для {max_stones} камней нужно около {needed / 2 ** 30:.1f} ГБ памяти, "
+                         f"а в системе {available / 2 ** 30:.1f} ГБ")
+    log(f"нужно около {needed / 2 ** 30:.1f} ГБ памяти")
+    workers = workers or os.cpu_count() or 1
+    solved = {}
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory, multiprocessing.Pool(workers) as pool:
+        solved_paths = {}
+        # Сначала пары с меньшим общим числом камней: взятия ведут только в них
+        for a, b in table_pairs(max_stones):
+            tables = [_Table(a, b)] if a == b else [_Table(a, b), _Table(b, a)]
+            solve_pair(pool, tables, solved_paths, log)
+            for table in tables:
+                solved[table.key] = table.value
+                solved_paths[table.key] = os.path.join(directory, f"{table.key[0]}_{table.key[1]}.npy")
+                np.save(solved_paths[table.key], table.value)
+            log(f"готово {sorted(solved)} за {time.perf_counter() - start:.1f} с")
+    write_tablebase(path, solved)
+    return solved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Построение эндшпильной базы Болотуду")
+    parser.add_argument("--max-stones", type=int, default=DEFAULT_MAX_STONES,
+                        help=f"камней у каждой стороны, от {MIN_TABLE_STONES} до {MAX_TABLE_STONES}")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument("--output", default=TABLEBASE_FILE)
+    args = parser.parse_args(argv)
+    try:
+        build_tablebase(args.max_stones, args.output, args.workers)
+    except ValueError as error:
+        parser.error(str(error))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Проверки протокола сетевой игры: python -m unittest test_network"""
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from network import decode_line, encode_line
+from server import GameServer
+
+
+async def request(connection, *parts):
+    reader, writer = connection
+    writer.write(encode_line(*parts))
+    return decode_line(await reader.readline())
+
+
+def run_with_server(scenario):
+    """Запускает scenario(сервер) на сервере с временной базой и возвращает его результат"""
+    async def run(path):
+        game_server = GameServer(path)
+        await game_server.start("127.0.0.1", 0)
+        try:
+            return await scenario(game_server)
+        finally:
+            await game_server.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        return asyncio.run(run(os.path.join(directory, "test.db")))
+
+
+class ProtocolTest(unittest.TestCase):
+    def test_parts_with_spaces(self):
+        for text in ("Иван Петров", "пароль с пробелом", " a\tb\n", "100%", "%20", "%zz", "x"):
+            line = encode_line("LOGIN", text, "p w")
+            self.assertEqual(line.count(b"\n"), 1)
+            self.assertEqual(decode_line(line), ["LOGIN", text, "p w"])
+
+    def test_plain_parts_unchanged(self):
+        self.assertEqual(encode_line("MOVE", "12-13"), b"MOVE 12-13\n")
+        self.assertEqual(decode_line(b"START 1 0 alice\r\n"), ["START", "1", "0", "alice"])
+
+    def test_login_and_start_with_spaces(self):
+        async def scenario(game_server):
+            first = await asyncio.open_connection("127.0.0.1", game_server.port)
+            second = await asyncio.open_connection("127.0.0.1", game_server.port)
+            replies = [await request(first, "REGISTER", "Иван Петров", "мой пароль"),
+                       await request(first, "LOGIN", "Иван Петров", "мой пароль"),
+                       await request(first, "PLAY"),
+                       await request(second, "GUEST"),
+                       await request(second, "PLAY")]
+            for _, writer in (first, second):
+                writer.close()
+            return replies
+
+        replies = run_with_server(scenario)
+        self.assertEqual(replies[0], ["OK", "Иван Петров"])
+        self.assertEqual(replies[1], ["OK", "Иван Петров"])
+        self.assertEqual(replies[2], ["WAIT"])
+        self.assertEqual(replies[4], ["START", "1", "1", "Иван Петров"])
+
+    def test_second_login_rejected(self):
+        async def scenario(game_server):
+            first = await asyncio.open_connection("127.0.0.1", game_server.port)
+            second = await asyncio.open_connection("127.0.0.1", game_server.port)
+            replies = [await request(first, "REGISTER", "alice", "secret"),
+                       await request(second, "LOGIN", "alice", "secret"),
+                       await request(second, "PLAY"),
+                       await request(first, "GUEST")]
+            # Имя освободилось - теперь вход проходит
+            replies.append(await request(second, "LOGIN", "alice", "secret"))
+            for _, writer in (first, second):
+                writer.close()
+            return replies
+
+        replies = run_with_server(scenario)
+        self.assertEqual(replies[0], ["OK", "alice"])
+        self.assertEqual(replies[1][0], "ERR")
+        self.assertEqual(replies[2][0], "ERR")
+        self.assertEqual(replies[3], ["OK", "Гость"])
+        self.assertEqual(replies[4], ["OK", "alice"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+"""Эталонные числа perft: python -m unittest test_perft"""
+
+import unittest
+
+from perft import REFERENCE_COUNTS, verify
+
+MAX_NODES = 20000  # Неглубокие проверки: весь набор идет доли секунды
+
+
+class PerftTest(unittest.TestCase):
+    def test_reference_counts(self):
+        lines = []
+        failures = verify(max_nodes=MAX_NODES, out=lines.append)
+        self.assertEqual(failures, 0, "\n".join(lines))
+        checked = [key for key, (nodes, _, _) in REFERENCE_COUNTS.items() if nodes <= MAX_NODES]
+        self.assertEqual(len(lines), len(checked))
+        # Каждая позиция набора проверяется хотя бы на одной глубине
+        self.assertEqual({name for name, _ in checked}, {name for name, _ in REFERENCE_COUNTS})
+
+    def test_memo_matches(self):
+        self.assertEqual(verify(memo=True, max_nodes=MAX_NODES, out=lambda line: None), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
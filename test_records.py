@@ -0,0 +1,64 @@
+"""Проверки записи партий: python -m unittest test_records"""
+
+import random
+import unittest
+
+from engine import STANDARD, Position, get_geometry
+from records import (HEADER, GEOMETRY, RESULT_UNFINISHED, GameRecord, decode_header, encode_record,
+                     game_result, iter_moves, move_size)
+
+
+def random_moves(rng, geometry=STANDARD, max_plies=200):
+    """Ходы случайной партии и позиция после них"""
+    position = Position(geometry)
+    moves = []
+    while len(moves) < max_plies and not position.is_game_over() and not position.is_draw():
+        legal = position.legal_moves()
+        if not legal:
+            break
+        move = rng.choice(legal)
+        position.make_move(move)
+        moves.append(move)
+    return moves, position
+
+
+class RecordTest(unittest.TestCase):
+    def test_one_byte_moves(self):
+        self.assertEqual(move_size(STANDARD.num_cells), 1)
+        rng = random.Random(1)
+        for _ in range(50):
+            moves, position = random_moves(rng)
+            result = game_result(position)
+            data = encode_record(moves, result)
+            self.assertEqual(len(data), HEADER.size + len(moves))
+            header = decode_header(data)
+            self.assertEqual((header.result, header.plies, header.geometry), (result, len(moves), STANDARD))
+            self.assertEqual(list(iter_moves(data)), moves)
+            # Позиции восстанавливаются по записи без хранения снятых камней
+            record = GameRecord(1, "a", "b", result, len(moves), 0.0, data)
+            last = None
+            for last in record.positions():
+                pass
+            if moves:
+                self.assertEqual(last.bb, position.bb)
+                self.assertEqual(last.hash, position.hash)
+
+    def test_variant_round_trip(self):
+        rng = random.Random(2)
+        for geometry in (get_geometry(8, 8, 10, 4), get_geometry(20, 20, 40, 3)):
+            moves, _ = random_moves(rng, geometry)
+            data = encode_record(moves, RESULT_UNFINISHED, geometry)
+            self.assertEqual(len(data), HEADER.size + GEOMETRY.size + move_size(geometry.num_cells) * len(moves))
+            self.assertEqual(decode_header(data).geometry, geometry)
+            self.assertEqual(list(iter_moves(data)), moves)
+
+    def test_bad_header(self):
+        data = encode_record([], RESULT_UNFINISHED)
+        with self.assertRaises(ValueError):
+            decode_header(b"XX" + data[2:])
+        with self.assertRaises(ValueError):
+            decode_header(data[:2] + bytes([9]) + data[3:])
+
+
+if __name__ == "__main__":
+    unittest.main()
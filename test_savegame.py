@@ -0,0 +1,84 @@
+"""Проверки автосохранения: python -m unittest test_savegame"""
+
+import os
+import random
+import tempfile
+import unittest
+
+from engine import Position
+from savegame import (JOURNAL_HEADER, JOURNAL_MAGIC, FRAME_HEADER, ENTRY, encode_frame, encode_snapshot,
+                      load_game, read_journal)
+
+SETTINGS = {"vs_computer": True}
+SNAPSHOT_ID = 7
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.save_file = os.path.join(directory.name, "save.json")
+        self.journal_file = os.path.join(directory.name, "save.journal")
+        # Снимок после нескольких ходов и еще несколько ходов в журнале
+        rng = random.Random(3)
+        self.position = Position()
+        for _ in range(6):
+            self.position.make_move(rng.choice(self.position.legal_moves()))
+        with open(self.save_file, "wb") as file:
+            file.write(encode_snapshot(self.position, SNAPSHOT_ID, SETTINGS))
+        self.frames = []
+        for _ in range(5):
+            move = rng.choice(self.position.legal_moves())
+            self.frames.append(encode_frame(len(self.position.history), move))
+            self.position.make_move(move)
+
+    def write_journal(self, frames, snapshot_id=SNAPSHOT_ID):
+        with open(self.journal_file, "wb") as file:
+            file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, snapshot_id) + b"".join(frames))
+
+    def journal_entries(self):
+        with open(self.journal_file, "rb") as file:
+            return read_journal(file.read())
+
+    def load(self):
+        position, settings = load_game(self.save_file, self.journal_file)
+        self.assertEqual(settings, SETTINGS)
+        return position
+
+    def test_full_journal(self):
+        self.write_journal(self.frames)
+        position = self.load()
+        self.assertEqual(position.history, self.position.history)
+        self.assertEqual(position.bb, self.position.bb)
+        self.assertEqual(position.hash, self.position.hash)
+
+    def test_truncated_frame(self):
+        frames = self.frames[:-1] + [self.frames[-1][:FRAME_HEADER.size + ENTRY.size - 1]]
+        self.write_journal(frames)
+        self.assertEqual(len(self.journal_entries()[1]), 4)
+        self.assertEqual(self.load().history, self.position.history[:-1])
+
+    def test_bad_checksum(self):
+        frame = bytearray(self.frames[2])
+        frame[-1] ^= 0xFF
+        self.write_journal(self.frames[:2] + [bytes(frame)] + self.frames[3:])
+        # Ходы после испорченного кадра не доигрываются
+        self.assertEqual(self.load().history, self.position.history[:-3])
+
+    def test_journal_of_other_snapshot(self):
+        self.write_journal(self.frames, SNAPSHOT_ID + 1)
+        self.assertEqual(self.load().history, self.position.history[:-5])
+
+    def test_damaged_journal_header(self):
+        with open(self.journal_file, "wb") as file:
+            file.write(b"XXXX" + b"".join(self.frames))
+        self.assertEqual(self.journal_entries(), (None, []))
+        self.assertEqual(self.load().history, self.position.history[:-5])
+
+    def test_no_save(self):
+        os.remove(self.save_file)
+        self.assertIsNone(load_game(self.save_file, self.journal_file))
+
+
+if __name__ == "__main__":
+    unittest.main()
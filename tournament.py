@@ -0,0 +1,277 @@
+"""Турнир компьютерных игроков без окна на всех ядрах процессора.
+
+Каждый игрок задается строкой ``оценка/глубина`` (например ``mobility/3``) или
+``random``. Партии круговой системы раздаются пулу процессов; у каждой партии
+свое зерно, поэтому результат не зависит от числа процессов и порядка
+выполнения. Результаты приходят потоком, сразу учитываются в таблице и пачками
+записываются в ``bolotudu.db`` вместе с двоичными записями партий.
+
+Вариант игры задается размерами поля, числом пар и длиной линии (``--width``,
+``--height``, ``--stones``, ``--line``); по умолчанию - стандартное поле 5x6.
+
+Пример: python tournament.py mobility/3 material/3 random --games 40
+"""
+
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+
+from engine import GRID_WIDTH, GRID_HEIGHT, NUM_STONES, LINE_LENGTH, STANDARD, Position, get_geometry
+from ai import Searcher, material_evaluation, mobility_evaluation
+from records import encode_record
+from storage import DATABASE_FILE, Database
+
+EVALUATIONS = {"material": material_evaluation, "mobility": mobility_evaluation}
+RANDOM_PLAYER = "random"
+DRAW = 2  # Результат партии: 0 или 1 - победитель, 2 - ничья
+DB_BATCH_SIZE = 500  # Сколько партий записывать одной транзакцией
+ELO_BASE = 1500
+
+
+def parse_player(spec):
+    """Разбирает описание игрока: (функция оценки, глубина) или None для случайного"""
+    if spec == RANDOM_PLAYER:
+        return None
+    name, _, depth = spec.partition("/")
+    if name not in EVALUATIONS:
+        raise ValueError(f"Неизвестная функция оценки: {name}")
+    return EVALUATIONS[name], int(depth or 2)
+
+
+def check_players(players):
+    """Проверяет описания игроков: ValueError, если игрок неизвестен или повторяется.
+
+    Одинаковые игроки (в том числе ``mobility`` и ``mobility/2``) сыграли бы сами
+    с собой, а в таблице слились бы в одну строку.
+    """
+    if len(players) < 2:
+        raise ValueError("Нужны хотя бы два игрока")
+    seen = {}
+    for spec in players:
+        parsed = parse_player(spec)
+        if parsed in seen:
+            raise ValueError(f"Игрок {spec} повторяет {seen[parsed]}")
+        seen[parsed] = spec
+
+
+def play_game(task):
+    """Играет одну партию; выполняется в процессе пула"""
+    game_id, white, black, seed, random_plies, max_plies, board = task
+    rng = random.Random(seed)
+    players = []
+    for spec in (white, black):
+        parsed = parse_player(spec)
+        players.append(None if parsed is None else (Searcher(parsed[0]), parsed[1]))
+
+    geometry = get_geometry(*board)
+    position = Position(geometry)
+    start = time.perf_counter()
+    result = DRAW
+    while len(position.history) < max_plies:
+        winner = position.result()
+        if winner is not None:
+            result = winner
+            break
+        if position.is_draw():
+            break
+        player = players[position.current_player]
+        if player is None or len(position.history) < random_plies:
+            move = rng.choice(position.legal_moves())
+        else:
+            searcher, depth = player
+            move = searcher.search(position, time_limit=None, max_depth=depth).move
+        position.make_move(move)
+    moves = [delta.move for delta in position.history]
+    return (game_id, white, black, result, len(moves), seed,
+            time.perf_counter() - start, encode_record(moves, result, geometry))
+
+
+def round_robin(players, games_per_pair, seed, random_plies, max_plies, geometry=STANDARD):
+    """Генерирует задания круговой системы, меняя цвета в каждой паре"""
+    game_id = 0
+    for first, second in itertools.combinations(players, 2):
+        for game in range(games_per_pair):
+            white, black = (first, second) if game % 2 == 0 else (second, first)
+            yield (game_id, white, black, seed * 1000003 + game_id, random_plies, max_plies,
+                   geometry.key)
+            game_id += 1
+
+
+def _init_worker(seed):
+    # Глобальный генератор процесса тоже детерминирован
+    random.seed(seed)
+
+
+class Standings:
+    """Накопительная таблица результатов по парам игроков"""
+
+    def __init__(self, players):
+        self.players = list(players)
+        # score[a][b] - очки a против b (победа 1, ничья 0.5), games[a][b] - число партий
+        self.score = {a: {b: 0.0 for b in self.players} for a in self.players}
+        self.games = {a: {b: 0 for b in self.players} for a in self.players}
+        self.plies = 0
+        self.count = 0
+
+    def add(self, white, black, result, plies):
+        self.games[white][black] += 1
+        self.games[black][white] += 1
+        if result == DRAW:
+            self.score[white][black] += 0.5
+            self.score[black][white] += 0.5
+        elif result == 0:
+            self.score[white][black] += 1
+        else:
+            self.score[black][white] += 1
+        self.plies += plies
+        self.count += 1
+
+    def totals(self, player):
+        score = sum(self.score[player].values())
+        games = sum(self.games[player].values())
+        return score, games
+
+    def ratings(self, iterations=200):
+        """Рейтинги Эло по модели Брэдли-Терри (средний рейтинг = ELO_BASE)"""
+        strength = {p: 1.0 for p in self.players}
+        for _ in range(iterations):
+            updated = {}
+            for p in self.players:
+                score, _ = self.totals(p)
+                denominator = sum(self.games[p][q] / (strength[p] + strength[q])
+                                  for q in self.players if q != p and self.games[p][q])
+                # Виртуальная ничья с игроком силы 1 защищает от бесконечного
+                # рейтинга при 100% результате
+                updated[p] = (score + 0.5) / (denominator + 1.0 / (strength[p] + 1.0))
+            mean = math.exp(sum(math.log(v) for v in updated.values()) / len(updated))
+            strength = {p: v / mean for p, v in updated.items()}
+        return {p: ELO_BASE + 400 * math.log10(strength[p]) for p in self.players}
+
+    def table(self):
+        """Строки итоговой таблицы: рейтинг, 95% интервал, процент очков"""
+        ratings = self.ratings()
+        rows = []
+        for player in sorted(self.players, key=ratings.get, reverse=True):
+            score, games = self.totals(player)
+            rate = score / games if games else 0.0
+            margin = 1.96 * math.sqrt(max(rate * (1 - rate), 0.25 / max(games, 1)) / max(games, 1))
+            rows.append({
+                "player": player,
+                "elo": round(ratings[player]),
+                "elo_low": round(ratings[player] - _elo_margin(rate, margin)),
+                "elo_high": round(ratings[player] + _elo_margin(rate, margin)),
+                "games": games,
+                "score": score,
+                "win_rate": round(rate, 4),
+            })
+        return rows
+
+
+def _elo_difference(rate):
+    rate = min(max(rate, 0.001), 0.999)
+    return -400 * math.log10(1 / rate - 1)
+
+
+def _elo_margin(rate, margin):
+    """Половина ширины интервала Эло для доли очков rate +- margin"""
+    return (_elo_difference(rate + margin) - _elo_difference(rate - margin)) / 2
+
+
+def run_tournament(players, games_per_pair=10, seed=1, workers=None, random_plies=4,
+                   max_plies=300, database=DATABASE_FILE, progress=None, geometry=STANDARD):
+    """Проводит турнир и возвращает (номер турнира в базе, таблицу результатов)"""
+    check_players(players)
+    standings = Standings(players)
+    tasks = round_robin(players, games_per_pair, seed, random_plies, max_plies, geometry)
+    total = games_per_pair * len(players) * (len(players) - 1) // 2
+
+    db = Database(database)
+    settings = {"players": players, "games_per_pair": games_per_pair, "seed": seed,
+                "random_plies": random_plies, "max_plies": max_plies, "board": geometry.key}
+    tournament_id = db.create_tournament(time.time(), json.dumps(settings))
+
+    pending = []
+    records = []
+
+    def flush():
+        db.insert_tournament_games(pending)
+        db.insert_games(records)
+        pending.clear()
+        records.clear()
+
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(seed,)) as pool:
+        for game_id, white, black, result, plies, game_seed, _, record in pool.imap_unordered(
+                play_game, tasks, chunksize=4):
+            standings.add(white, black, result, plies)
+            pending.append((tournament_id, game_id, white, black, result, plies, game_seed))
+            records.append((white, black, result, plies, time.time(), record))
+            if len(pending) >= DB_BATCH_SIZE:
+                flush()
+            if progress is not None:
+                progress(standings.count, total, time.perf_counter() - start)
+    if pending:
+        flush()
+    db.close()
+    return tournament_id, standings
+
+
+def format_table(standings):
+    lines = [f"{'Игрок':<16}{'Эло':>6}{'95% интервал':>16}{'Партий':>8}{'Очки':>8}{'%':>7}"]
+    for row in standings.table():
+        interval = f"{row['elo_low']}..{row['elo_high']}"
+        lines.append(f"{row['player']:<16}{row['elo']:>6}{interval:>16}{row['games']:>8}"
+                     f"{row['score']:>8.1f}{100 * row['win_rate']:>7.1f}")
+    lines.append("")
+    lines.append("Доля очков (строка против столбца):")
+    players = standings.players
+    lines.append(" " * 16 + "".join(f"{p[:12]:>13}" for p in players))
+    for a in players:
+        cells = []
+        for b in players:
+            games = standings.games[a][b]
+            cells.append(f"{standings.score[a][b] / games:>13.2f}" if games else f"{'-':>13}")
+        lines.append(f"{a:<16}" + "".join(cells))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Турнир компьютерных игроков Болотуду")
+    parser.add_argument("players", nargs="+", help="игроки: оценка/глубина (mobility/3) или random")
+    parser.add_argument("--games", type=int, default=10, help="партий в каждой паре")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument("--random-plies", type=int, default=4, help="случайных ходов в начале партии")
+    parser.add_argument("--max-plies", type=int, default=300, help="после стольких ходов - ничья")
+    parser.add_argument("--database", default=DATABASE_FILE)
+    parser.add_argument("--width", type=int, default=GRID_WIDTH, help="ширина поля")
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT, help="высота поля")
+    parser.add_argument("--stones", type=int, default=NUM_STONES, help="пар камней у игрока")
+    parser.add_argument("--line", type=int, default=LINE_LENGTH, help="длина линии")
+    args = parser.parse_args(argv)
+    try:
+        check_players(args.players)
+        geometry = get_geometry(args.width, args.height, args.stones, args.line)
+    except ValueError as error:
+        parser.error(str(error))
+
+    def progress(done, total, elapsed):
+        print(f"\r{done}/{total} партий, {done / elapsed:.1f} партий/с", end="", flush=True)
+
+    tournament_id, standings = run_tournament(
+        args.players, args.games, args.seed, args.workers, args.random_plies, args.max_plies,
+        args.database, progress, geometry)
+    print()
+    print(f"Турнир #{tournament_id} ({geometry.describe()}), средняя длина партии "
+          f"{standings.plies / max(standings.count, 1):.1f} ходов")
+    print(format_table(standings))
+
+
+if __name__ == "__main__":
+    main()
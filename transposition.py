@@ -0,0 +1,63 @@
+"""Таблица транспозиций фиксированного размера.
+
+Каждая корзина хранит две записи: «по глубине» (заменяется только более
+глубоким результатом) и «всегда» (заменяется любой новой записью).
+Ключ записи - хеш Зобриста позиции (``Position.hash``).
+"""
+
+EXACT = 0  # Точная оценка
+LOWER = 1  # Оценка не меньше сохраненной (было отсечение)
+UPPER = 2  # Оценка не больше сохраненной (ни один ход не улучшил альфу)
+
+
+class TranspositionTable:
+    """Таблица транспозиций со счетчиками попаданий и промахов"""
+
+    def __init__(self, size_bits=16):
+        self.size = 1 << size_bits
+        self.mask = self.size - 1
+        self.clear()
+
+    def clear(self):
+        # Запись - кортеж (ключ, глубина, оценка, флаг, ход)
+        self.deep = [None] * self.size
+        self.recent = [None] * self.size
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def probe(self, key):
+        """Запись для позиции или None"""
+        index = key & self.mask
+        entry = self.deep[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        entry = self.recent[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        index = key & self.mask
+        entry = (key, depth, score, flag, move)
+        self.stores += 1
+        deep = self.deep[index]
+        if deep is None or deep[0] == key or depth >= deep[1]:
+            self.deep[index] = entry
+            if deep is not None and deep[0] != key:
+                # Вытесненная запись еще может пригодиться
+                self.recent[index] = deep
+        else:
+            self.recent[index] = entry
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {"size": self.size, "hits": self.hits, "misses": self.misses,
+                "stores": self.stores, "hit_rate": round(self.hit_rate, 4)}
@@ -0,0 +1,80 @@
+"""Фоновое выполнение медленных операций для окна Tk.
+
+Работа с базой, файлами сохранений и хешированием выполняется в пуле потоков.
+Готовые результаты складываются в очередь, а окно забирает их таймером
+``after`` и вызывает обработчики уже в своем потоке - трогать виджеты из
+фонового потока Tk не разрешает.
+
+Задачи с ``serial=True`` (запись сохранений) выполняются в отдельном потоке
+строго по очереди и не отменяются при закрытии окна: процесс дожидается их
+при выходе.
+"""
+
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_INTERVAL = 30  # Как часто окно проверяет очередь результатов (мс)
+
+
+class BackgroundExecutor:
+    """Пул потоков с доставкой результатов в поток окна"""
+
+    def __init__(self, widget, max_workers=2, poll_interval=POLL_INTERVAL):
+        self.widget = widget
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bolotudu-io")
+        self.serial_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bolotudu-serial")
+        self.results = queue.Queue()
+        self.poll_interval = poll_interval
+        self.pending = 0
+        self.polling = False
+
+    def submit(self, function, *args, on_done=None, on_error=None, serial=False):
+        """Выполняет function(*args) в фоне.
+
+        on_done(result) или on_error(exception) вызываются в потоке окна.
+        serial - выполнить после всех ранее поставленных задач с serial.
+        """
+        self.pending += 1
+        future = (self.serial_pool if serial else self.pool).submit(function, *args)
+        future.add_done_callback(lambda done: self.results.put((done, on_done, on_error)))
+        if not self.polling:
+            self.polling = True
+            self.widget.after(self.poll_interval, self._poll)
+        return future
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    future, on_done, on_error = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                self.pending -= 1
+                if future.cancelled():  # Пул остановлен при закрытии окна
+                    continue
+                # Ошибка обработчика сообщается как любая ошибка в обработчике
+                # Tk и не мешает доставке остальных результатов
+                try:
+                    error = future.exception()
+                    if error is not None:
+                        if on_error is None:
+                            raise error
+                        on_error(error)
+                    elif on_done is not None:
+                        on_done(future.result())
+                except Exception as callback_error:
+                    self.widget.report_callback_exception(type(callback_error), callback_error,
+                                                          callback_error.__traceback__)
+        finally:
+            if self.pending:
+                self.widget.after(self.poll_interval, self._poll)
+            else:
+                self.polling = False
+
+    @property
+    def busy(self):
+        return self.pending > 0
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.serial_pool.shutdown(wait=False)